@@ -0,0 +1,540 @@
+# Copyright (c) 2017, Intel Research and Development Ireland Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+In-process stand-ins for the HTTP APIs of the Landscaper, InfluxDB (Snap),
+Prometheus and CIMI, serving a SyntheticLandscape and its synthetic metric
+series. Every service has a configurable latency, knobs on the size of its
+payloads, and counts the requests and bytes it serves.
+"""
+
+__author__ = 'Giuliana Carullo'
+__copyright__ = "Copyright (c) 2017, Intel Research and Development Ireland Ltd."
+__license__ = "Apache 2.0"
+__maintainer__ = "Giuliana Carullo"
+__email__ = "giuliana.carullo@intel.com"
+__status__ = "Development"
+
+import ast
+import json
+import re
+import threading
+import time
+import uuid
+import urlparse
+import BaseHTTPServer
+import SocketServer
+
+import networkx as nx
+from networkx.readwrite import json_graph
+
+from analytics_engine import common
+from analytics_engine.benchmark import synthetic_landscape as synthetic
+
+LOG = common.LOG
+
+# Maximum number of points per series of a Prometheus query_range
+PROMETHEUS_TS_LIMIT = 11000
+
+SELECT_RE = re.compile(r'SELECT (\w+)\(value\) as value FROM "([^"]+)" '
+                       r'WHERE (.*?)(?: GROUP BY time\((\d+)s\).*)?$')
+TIME_RANGE_RE = re.compile(r'time >= (\d+)s AND time <= (\d+)s')
+TAG_RE = re.compile(r"\((\w+) = '([^']*)'\)")
+CREATE_DB_RE = re.compile(r'CREATE DATABASE "?(\w+)"?')
+SELECTOR_RE = re.compile(r'^(\w*)\{(.*)\}$')
+LABEL_RE = re.compile(r'(\w+)(=~|!=|=)"([^"]*)"')
+OVER_TIME_RE = re.compile(r'^(\w+)_over_time\((.*)\[(\d+)s\]\)$')
+
+
+class _ThreadingHTTPServer(SocketServer.ThreadingMixIn,
+                           BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    # keep-alive, so that clients reusing connections can be measured
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def _dispatch(self, method):
+        service = self.server.service
+        url = urlparse.urlparse(self.path)
+        params = dict(urlparse.parse_qsl(url.query, keep_blank_values=True))
+        length = int(self.headers.getheader('content-length') or 0)
+        body = self.rfile.read(length) if length else ''
+        if method != 'GET' and \
+                'x-www-form-urlencoded' in (self.headers.getheader(
+                    'content-type') or ''):
+            params.update(urlparse.parse_qsl(body, keep_blank_values=True))
+        if service.latency:
+            time.sleep(service.latency)
+        try:
+            status, content_type, content = service.handle(
+                method, url.path, params, body)
+        except Exception as e:
+            LOG.error('{} failed to serve {}'.format(
+                service.__class__.__name__, self.path))
+            LOG.error(e)
+            status, content_type, content = 500, 'text/plain', str(e)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+        service.count(len(self.path) + length, len(content))
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeService(object):
+    """
+    HTTP service running on a daemon thread of the current process.
+    Subclasses implement handle().
+
+    :param latency: seconds waited before serving each request
+    :param host: address to listen on
+    :param port: port to listen on, a free one if 0
+    """
+
+    def __init__(self, latency=0.0, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.host = host
+        self.port = port
+        self.server = None
+        self.requests = 0
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.lock = threading.Lock()
+
+    def start(self):
+        self.server = _ThreadingHTTPServer((self.host, self.port),
+                                           _RequestHandler)
+        self.server.service = self
+        self.port = self.server.server_address[1]
+        thread = threading.Thread(target=self.server.serve_forever,
+                                  name=self.__class__.__name__)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    @property
+    def url(self):
+        return 'http://{}:{}'.format(self.host, self.port)
+
+    def count(self, received, sent):
+        with self.lock:
+            self.requests += 1
+            self.bytes_received += received
+            self.bytes_sent += sent
+
+    def stats(self):
+        """
+        Returns the requests and bytes served since the last reset.
+        """
+        with self.lock:
+            return {'requests': self.requests,
+                    'bytes_received': self.bytes_received,
+                    'bytes_sent': self.bytes_sent}
+
+    def reset_stats(self):
+        with self.lock:
+            self.requests = 0
+            self.bytes_received = 0
+            self.bytes_sent = 0
+
+    def handle(self, method, path, params, body):
+        """
+        Serves a request.
+
+        :param method: HTTP method
+        :param path: path of the URL
+        :param params: dict of the query string (and form) parameters
+        :param body: request body
+        :return: (status, content type, content) tuple
+        """
+        raise NotImplementedError()
+
+    @staticmethod
+    def json_response(content, status=200):
+        return status, 'application/json', json.dumps(content)
+
+
+class FakeLandscaper(FakeService):
+    """
+    Serves the Landscaper API (graph, subgraph, node, nodes and
+    service_instances) from a SyntheticLandscape.
+
+    :param landscape: SyntheticLandscape
+    :param node_padding: bytes of filler added to every node, to inflate
+                         the payloads
+    """
+
+    def __init__(self, landscape, node_padding=0, **kwargs):
+        super(FakeLandscaper, self).__init__(**kwargs)
+        self.landscape = landscape
+        self.node_padding = node_padding
+        # serialized graphs, the landscape does not change
+        self.cache = dict()
+
+    def handle(self, method, path, params, body):
+        graph = self.landscape.graph
+        parts = path.strip('/').split('/', 1)
+        if parts[0] == 'graph':
+            return self._graph_response(path, graph.nodes())
+        if parts[0] in ['subgraph', 'node']:
+            node_id = urlparse.unquote(parts[1]) if len(parts) > 1 else ''
+            if node_id not in graph:
+                return 400, 'text/html', '<p>Node {} not found</p>'.format(
+                    node_id)
+            nodes = [node_id]
+            if parts[0] == 'subgraph':
+                nodes.extend(nx.descendants(graph, node_id))
+            return self._graph_response(path, nodes)
+        if parts[0] in ['nodes', 'service_instances']:
+            properties = ast.literal_eval(params.get('properties') or '[]')
+            active = parts[0] == 'nodes' and \
+                float(params.get('timeframe') or 0) >= 0
+            return self._graph_response(
+                None, self._match(properties, active))
+        return 404, 'text/html', '<p>Unknown path {}</p>'.format(path)
+
+    def _match(self, properties, active):
+        """
+        Returns the nodes having all the given properties. Inactive service
+        instances are skipped when active is True.
+        """
+        res = list()
+        now = self.landscape.now
+        for node, attrs in self.landscape.graph.nodes(data=True):
+            if active and attrs.get('to') and attrs['to'] < now:
+                continue
+            matched = True
+            for prop in properties:
+                value = str(attrs.get(prop[0]))
+                operator = prop[2] if len(prop) > 2 else '='
+                if (value == str(prop[1])) != (operator == '='):
+                    matched = False
+                    break
+            if matched:
+                res.append(node)
+        return res
+
+    def _graph_response(self, key, nodes):
+        content = self.cache.get(key) if key else None
+        if content is None:
+            data = json_graph.node_link_data(
+                self.landscape.graph.subgraph(nodes))
+            if self.node_padding:
+                padding = 'x' * self.node_padding
+                for node in data['nodes']:
+                    node['padding'] = padding
+            content = json.dumps(data)
+            if key:
+                self.cache[key] = content
+        return 200, 'application/json', content
+
+
+class FakeInfluxDB(FakeService):
+    """
+    Serves the InfluxDB API used by Snap, the Extract client and the
+    InfluxSink: SELECT mean/spread statements, grouped by time or not,
+    SHOW MEASUREMENTS, SHOW/CREATE DATABASE and writes.
+
+    :param interval: seconds between two points of the stored series; the
+                     smaller, the larger the payloads
+    """
+
+    def __init__(self, interval=10, **kwargs):
+        super(FakeInfluxDB, self).__init__(**kwargs)
+        self.interval = interval
+        self.databases = set(['snap'])
+        self.points_written = 0
+        self.measurements = sorted(set(
+            [measurement
+             for measurements in synthetic.SNAP_MEASUREMENTS.values()
+             for measurement in measurements]))
+
+    def handle(self, method, path, params, body):
+        if path == '/ping':
+            return 204, 'application/json', ''
+        if path == '/write':
+            with self.lock:
+                self.points_written += len(
+                    [line for line in body.splitlines() if line.strip()])
+            return 204, 'application/json', ''
+        if path != '/query':
+            return 404, 'application/json', json.dumps(
+                {'error': 'unknown path {}'.format(path)})
+        statements = [statement.strip()
+                      for statement in params.get('q', '').split(';')
+                      if statement.strip()]
+        results = [self._statement(i, statement, params.get('epoch'))
+                   for i, statement in enumerate(statements)]
+        return self.json_response({'results': results})
+
+    def _statement(self, statement_id, statement, epoch):
+        result = {'statement_id': statement_id}
+        if statement.startswith('SHOW MEASUREMENTS'):
+            result['series'] = [{'name': 'measurements', 'columns': ['name'],
+                                 'values': [[measurement] for measurement
+                                            in self.measurements]}]
+        elif statement.startswith('SHOW DATABASES'):
+            result['series'] = [{'name': 'databases', 'columns': ['name'],
+                                 'values': [[database] for database
+                                            in sorted(self.databases)]}]
+        elif statement.startswith('CREATE DATABASE'):
+            match = CREATE_DB_RE.match(statement)
+            if match:
+                self.databases.add(match.group(1))
+        else:
+            match = SELECT_RE.match(statement)
+            if match:
+                series = self._select(match, epoch)
+                if series:
+                    result['series'] = [series]
+        return result
+
+    def _select(self, match, epoch):
+        aggregate, measurement, clauses, group = match.groups()
+        time_range = TIME_RANGE_RE.search(clauses)
+        if not time_range:
+            return None
+        ts_from, ts_to = [int(ts) for ts in time_range.groups()]
+        tags = dict(TAG_RE.findall(clauses))
+        if group:
+            timestamps = synthetic.series_timestamps(
+                ts_from, ts_to, max(int(group), self.interval))
+            values = synthetic.metric_values(measurement, tags, timestamps)
+        else:
+            timestamps = [ts_from]
+            values = [synthetic.metric_aggregate(
+                measurement, tags, ts_from, ts_to, self.interval,
+                aggregate.lower())]
+        if not epoch:
+            timestamps = [time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(ts))
+                          for ts in timestamps]
+        return {'name': measurement, 'columns': ['time', 'value'],
+                'values': [list(point) for point in zip(timestamps, values)]}
+
+
+class FakePrometheus(FakeService):
+    """
+    Serves the Prometheus query_range and instant query APIs, for
+    selectors and <aggregation>_over_time expressions.
+
+    :param interval: seconds between two points of the stored series; the
+                     smaller, the larger the payloads
+    :param max_points: maximum points per series of a query_range
+    """
+
+    def __init__(self, interval=15, max_points=PROMETHEUS_TS_LIMIT,
+                 **kwargs):
+        super(FakePrometheus, self).__init__(**kwargs)
+        self.interval = interval
+        self.max_points = max_points
+
+    def handle(self, method, path, params, body):
+        try:
+            if path == '/api/v1/query_range':
+                return self._success('matrix', self._query_range(params))
+            if path == '/api/v1/query':
+                return self._success('vector', self._query(params))
+        except ValueError as e:
+            return self.json_response({'status': 'error',
+                                       'errorType': 'bad_data',
+                                       'error': str(e)}, status=400)
+        return 404, 'text/plain', '404 page not found'
+
+    def _success(self, result_type, result):
+        return self.json_response({'status': 'success',
+                                   'data': {'resultType': result_type,
+                                            'result': result}})
+
+    def _query_range(self, params):
+        ts_from = int(float(params['start']))
+        ts_to = int(float(params['end']))
+        step = max(int(float(params.get('step', '1').rstrip('s'))),
+                   self.interval)
+        # points are aligned to the start of the range
+        timestamps = range(ts_from, ts_to + 1, step)
+        if len(timestamps) > self.max_points:
+            raise ValueError('exceeded maximum resolution of {} points per '
+                             'timeseries'.format(self.max_points))
+        result = list()
+        for labels in self._series(params['query']):
+            values = synthetic.metric_values(labels['__name__'], labels,
+                                             timestamps)
+            result.append({'metric': labels,
+                           'values': [[ts, str(value)] for ts, value
+                                      in zip(timestamps, values)]})
+        return result
+
+    def _query(self, params):
+        ts = int(float(params.get('time') or time.time()))
+        query = params['query']
+        over_time = OVER_TIME_RE.match(query)
+        result = list()
+        if over_time:
+            aggregate, selector, window = over_time.groups()
+            for labels in self._series(selector):
+                value = synthetic.metric_aggregate(
+                    labels['__name__'], labels, ts - int(window), ts,
+                    self.interval, 'mean' if aggregate == 'avg'
+                    else aggregate)
+                # functions drop the metric name
+                labels.pop('__name__')
+                result.append({'metric': labels, 'value': [ts, str(value)]})
+        else:
+            for labels in self._series(query):
+                value = synthetic.metric_values(labels['__name__'], labels,
+                                                [ts])[0]
+                result.append({'metric': labels, 'value': [ts, str(value)]})
+        return result
+
+    @staticmethod
+    def _series(selector):
+        """
+        Returns the labels of the series matching a selector, one per
+        metric name. Regular expressions on labels other than the name are
+        resolved to a single value.
+        """
+        match = SELECTOR_RE.match(selector.strip())
+        if not match:
+            raise ValueError('parse error: {}'.format(selector))
+        names = [match.group(1)] if match.group(1) else []
+        labels = dict()
+        for label, operator, value in LABEL_RE.findall(match.group(2)):
+            if label == '__name__':
+                names = value.split('|') if operator == '=~' else [value]
+            elif operator == '=':
+                labels[label] = value
+            elif operator == '=~':
+                labels[label] = value.split('|')[0].replace('.*', '9100')
+        res = list()
+        for name in names:
+            series = dict(labels)
+            series['__name__'] = name
+            res.append(series)
+        return res
+
+
+class FakeCimi(FakeService):
+    """
+    Serves the CIMI service resources: services are created on demand, the
+    first time they are looked up by name.
+    """
+
+    def __init__(self, **kwargs):
+        super(FakeCimi, self).__init__(**kwargs)
+        self.services = dict()
+        self.updates = 0
+
+    def handle(self, method, path, params, body):
+        if '/service' not in path:
+            return self.json_response({'message': 'not found'}, status=404)
+        service_id = path.split('/service', 1)[1].strip('/')
+        if method == 'PUT':
+            with self.lock:
+                self.updates += 1
+            return self.json_response({'status': 200, 'resource-id':
+                                       'service/{}'.format(service_id)})
+        if service_id:
+            return self.json_response(
+                self._service(self.services.get(service_id, service_id)))
+        name = re.search(r'name="([^"]*)"', params.get('$filter', ''))
+        if name:
+            services = [self._service(name.group(1))]
+        else:
+            services = [self._service(service_name)
+                        for service_name in set(self.services.values())]
+        return self.json_response({'count': len(services),
+                                   'services': services})
+
+    def _service(self, name):
+        service_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, str(name)))
+        self.services[service_id] = name
+        return {'id': 'service/{}'.format(service_id), 'name': name}
+
+
+class FakeServices(object):
+    """
+    Starts and stops a fake of every external service of the engine,
+    serving the same synthetic landscape.
+
+    :param landscape: SyntheticLandscape
+    :param latency: seconds waited by each service before serving a request
+    :param node_padding: see FakeLandscaper
+    :param interval: seconds between two points of the synthetic series
+    """
+
+    def __init__(self, landscape, latency=0.0, node_padding=0, interval=10):
+        self.landscape = landscape
+        self.landscaper = FakeLandscaper(landscape, node_padding=node_padding,
+                                         latency=latency)
+        self.influxdb = FakeInfluxDB(interval=interval, latency=latency)
+        self.prometheus = FakePrometheus(interval=interval, latency=latency)
+        self.cimi = FakeCimi(latency=latency)
+        self.services = {'landscaper': self.landscaper,
+                         'influxdb': self.influxdb,
+                         'prometheus': self.prometheus,
+                         'cimi': self.cimi}
+
+    def start(self):
+        for service in self.services.values():
+            service.start()
+        return self
+
+    def stop(self):
+        for service in self.services.values():
+            service.stop()
+
+    def stats(self):
+        return dict([(name, service.stats())
+                     for name, service in self.services.items()])
+
+    def reset_stats(self):
+        for service in self.services.values():
+            service.reset_stats()
+
+    def config(self):
+        """
+        Returns the config sections and options pointing the engine to the
+        fake services, as {section: {option: value}}.
+        """
+        return {'LANDSCAPE': {'host': self.landscaper.host,
+                              'port': str(self.landscaper.port)},
+                'SNAP': {'host': self.influxdb.host,
+                         'port': str(self.influxdb.port),
+                         'dbname': 'snap'},
+                'INFLUXDB': {'INFLUX_IP': self.influxdb.host,
+                             'INFLUX_PORT': str(self.influxdb.port)},
+                'PROMETHEUS': {'PROMETHEUS_HOST': self.prometheus.host,
+                               'PROMETHEUS_PORT': str(self.prometheus.port)},
+                'CIMI': {'url': '{}/api'.format(self.cimi.url)}}
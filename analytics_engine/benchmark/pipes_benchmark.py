@@ -0,0 +1,324 @@
+# Copyright (c) 2017, Intel Research and Development Ireland Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+End to end benchmark of OptimalPipe, AnalysePipe and AnalyseServiceHistPipe
+against the fake services, for several landscape sizes and time windows.
+
+    python -m analytics_engine.benchmark.pipes_benchmark \
+        --hosts 10 100 1000 --windows 600 3600 --output results.json
+
+The fake services run in this process, while every pipe run happens in a
+child process, so that its peak RSS is not affected by the other runs.
+For each run the wall time of every stage (filters and sinks), the peak
+RSS and the requests and bytes served by each fake service are written to
+the JSON output, to be compared between commits.
+"""
+
+__author__ = 'Giuliana Carullo'
+__copyright__ = "Copyright (c) 2017, Intel Research and Development Ireland Ltd."
+__license__ = "Apache 2.0"
+__maintainer__ = "Giuliana Carullo"
+__email__ = "giuliana.carullo@intel.com"
+__status__ = "Development"
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from collections import OrderedDict
+from ConfigParser import SafeConfigParser
+
+# analytics_engine.common reads the configuration when imported, so the
+# engine modules are only imported once the benchmark config is in place.
+from analytics_engine.infrastructure_manager.config_helper import ConfigHelper
+
+MODULE = 'analytics_engine.benchmark.pipes_benchmark'
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+PIPES = ['optimal', 'analyse', 'analyse_service_hist']
+HOSTS = [10, 100, 1000]
+WINDOWS = [600, 3600]
+# past instances of each service, analysed by AnalyseServiceHistPipe
+HISTORY = 3
+
+
+class StageTimer(object):
+    """
+    Accumulates the wall time spent in methods of the engine classes,
+    each one being a stage of the pipes. Times include the nested stages,
+    e.g. AnalyseAndRefineRecipeFilter includes OptimalFilter.
+    """
+
+    def __init__(self):
+        self.stages = OrderedDict()
+
+    def instrument(self, cls, method='run', stage=None):
+        """
+        Wraps a method of a class, timing all its calls.
+
+        :param cls: class to be instrumented
+        :param method: name of the method
+        :param stage: name of the stage, the class name by default
+        """
+        original = getattr(cls, method)
+        stage = stage or cls.__name__
+        timer = self
+
+        def timed(*args, **kwargs):
+            start = time.time()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                timer.add(stage, time.time() - start)
+        setattr(cls, method, timed)
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+
+def write_config(path, overrides):
+    """
+    Writes the engine config, overriding some options of the default one.
+
+    :param path: config file to be written
+    :param overrides: {section: {option: value}}
+    """
+    config = SafeConfigParser()
+    base = os.path.join(REPO_DIR, 'analytics_engine.conf')
+    config.read(base if os.path.isfile(base)
+                else ConfigHelper.CONF_FILE_LOCATION)
+    for section, options in overrides.items():
+        if section != 'DEFAULT' and not config.has_section(section):
+            config.add_section(section)
+        for option, value in options.items():
+            config.set(section, option, str(value))
+    with open(path, 'w') as config_file:
+        config.write(config_file)
+
+
+def use_config(path):
+    ConfigHelper.CONF_FILE_LOCATION = path
+    ConfigHelper._CONFIG = None
+
+
+def run_child(args):
+    """
+    Runs a single pipe, in the child process, and writes its measures.
+    """
+    use_config(args.config)
+    from analytics_engine import common
+    # sinks export their results under the install directory
+    common.INSTALL_BASE_DIR = args.workdir
+
+    from analytics_engine.heuristics.beans.workload import Workload
+    from analytics_engine.heuristics.beans.mf2c.recipe import Recipe
+    from analytics_engine.heuristics.filters.graph_filter import GraphFilter
+    from analytics_engine.heuristics.filters.subgraph_filter import SubgraphFilter
+    from analytics_engine.heuristics.filters.subgraph_annotated_filter import SubgraphAnnotatedFilter
+    from analytics_engine.heuristics.filters.optimal_filter import OptimalFilter
+    from analytics_engine.heuristics.filters.cimi_filter import CimiFilter
+    from analytics_engine.heuristics.filters.mf2c.analyse_and_refine_recipe_filter import AnalyseAndRefineRecipeFilter
+    from analytics_engine.heuristics.filters.fiveg_essence.service_hist_subgraph_filter import ServiceHistorySubgraphFilter
+    from analytics_engine.heuristics.filters.fiveg_essence.analyse_service_hist_filter import AnalyseServiceHistoryFilter
+    from analytics_engine.heuristics.sinks.file_sink import FileSink
+    from analytics_engine.heuristics.sinks.mf2c.influx_sink import InfluxSink
+    from analytics_engine.heuristics.pipes.optimal_pipe import OptimalPipe
+    from analytics_engine.heuristics.pipes.mf2c.analyse_pipe import AnalysePipe
+    from analytics_engine.heuristics.pipes.fiveg_essence.analyse_service_hist_pipe import AnalyseServiceHistPipe
+
+    timer = StageTimer()
+    for cls in [GraphFilter, SubgraphFilter, SubgraphAnnotatedFilter,
+                OptimalFilter, CimiFilter, AnalyseAndRefineRecipeFilter,
+                ServiceHistorySubgraphFilter, AnalyseServiceHistoryFilter]:
+        timer.instrument(cls)
+    timer.instrument(FileSink, 'save')
+    timer.instrument(InfluxSink, '__init__', 'InfluxSink.connect')
+    timer.instrument(InfluxSink, 'save')
+
+    recipe = Recipe()
+    recipe.from_json({'name': args.service})
+    recipe_time = int("{}{}".format(int(round(time.time())), '000000000'))
+    ts_to = int(time.time())
+    error = None
+    start = time.time()
+    try:
+        if args.pipe == 'optimal':
+            workload = Workload('optimal_{}'.format(ts_to),
+                                workload_config={'telemetry_filter': False})
+            workload.add_recipe(recipe_time, recipe)
+            OptimalPipe().run(workload, 'machine')
+        elif args.pipe == 'analyse':
+            workload = Workload(args.service, ts_to - args.window, ts_to)
+            workload.add_recipe(recipe_time, recipe)
+            AnalysePipe().run(workload)
+        else:
+            workload = Workload(args.service)
+            workload.add_recipe(recipe_time, recipe)
+            AnalyseServiceHistPipe().run(workload, 'stack')
+    except BaseException as e:
+        # filters exit() on errors
+        error = '{}: {}'.format(e.__class__.__name__, e)
+        traceback.print_exc()
+    wall_time = time.time() - start
+
+    # ru_maxrss is in KB on Linux
+    result = {'wall_time': wall_time,
+              'stages': timer.stages,
+              'peak_rss_kb': resource.getrusage(
+                  resource.RUSAGE_SELF).ru_maxrss,
+              'error': error}
+    with open(args.result, 'w') as result_file:
+        json.dump(result, result_file)
+
+
+def run_pipe(pipe, service, window, config, workdir):
+    """
+    Runs a pipe in a child process and returns its measures.
+    """
+    result_path = os.path.join(workdir, 'result.json')
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [REPO_DIR] + [path for path in [env.get('PYTHONPATH')] if path])
+    with open(os.path.join(workdir, 'child.log'), 'a') as log:
+        subprocess.call([sys.executable, '-m', MODULE, '--child', '--pipe', pipe, '--service', service,
+            '--window', str(window), '--config', config,
+            '--workdir', workdir, '--result', result_path],
+            env=env, stdout=log, stderr=subprocess.STDOUT)
+    if not os.path.isfile(result_path):
+        return {'error': 'Run failed, see {}'.format(log.name)}
+    with open(result_path) as result_file:
+        result = json.load(result_file)
+    os.remove(result_path)
+    return result
+
+
+def run_benchmark(args):
+    """
+    Runs every pipe for each landscape size and time window, returning the
+    benchmark results.
+    """
+    workdir = tempfile.mkdtemp(prefix='analytics_engine_benchmark_')
+    config = os.path.join(workdir, 'analytics_engine.conf')
+    write_config(config, {'General': {'debug': 'false'}})
+    use_config(config)
+    from analytics_engine.benchmark.synthetic_landscape import SyntheticLandscape
+    from analytics_engine.benchmark.fake_services import FakeServices
+
+    results = list()
+    try:
+        for hosts in args.hosts:
+            for i, window in enumerate(args.windows):
+                landscape = SyntheticLandscape(hosts=hosts, history=HISTORY,
+                                               window=window)
+                services = FakeServices(landscape, latency=args.latency,
+                                        node_padding=args.node_padding,
+                                        interval=args.interval).start()
+                overrides = services.config()
+                overrides['General'] = {'debug': 'false'}
+                overrides['DEFAULT'] = {'telemetry': args.telemetry}
+                write_config(config, overrides)
+                service = landscape.service_name(0)
+                for pipe in args.pipes:
+                    # the optimal pipe always looks at the latest telemetry
+                    if pipe == 'optimal' and i > 0:
+                        continue
+                    for run in range(args.repeat):
+                        services.reset_stats()
+                        result = run_pipe(pipe, service, window, config,
+                                          workdir)
+                        result.update({'pipe': pipe, 'hosts': hosts,
+                                       'nodes': landscape.graph.
+                                       number_of_nodes(),
+                                       'window': None if pipe == 'optimal'
+                                       else window,
+                                       'run': run,
+                                       'requests': services.stats()})
+                        print('{} hosts={} window={}: {}s'.format(
+                            pipe, hosts, window, result.get('wall_time')))
+                        results.append(result)
+                services.stop()
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def _commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       cwd=REPO_DIR).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the pipes '
+                                                 'against fake services')
+    parser.add_argument('--hosts', type=int, nargs='+', default=HOSTS)
+    parser.add_argument('--windows', type=int, nargs='+', default=WINDOWS,
+                        help='seconds of telemetry analysed')
+    parser.add_argument('--pipes', nargs='+', choices=PIPES, default=PIPES)
+    parser.add_argument('--telemetry', choices=['snap', 'prometheus'],
+                        default='snap')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds added to every request')
+    parser.add_argument('--node-padding', type=int, default=0,
+                        help='bytes added to every landscape node')
+    parser.add_argument('--interval', type=int, default=10,
+                        help='seconds between two points of the series')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--keep', action='store_true',
+                        help='keep the working directory')
+    # options of the child process running a single pipe
+    parser.add_argument('--child', action='store_true',
+                        help=argparse.SUPPRESS)
+    parser.add_argument('--pipe', help=argparse.SUPPRESS)
+    parser.add_argument('--service', help=argparse.SUPPRESS)
+    parser.add_argument('--window', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--config', help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    report = OrderedDict()
+    report['timestamp'] = int(time.time())
+    report['commit'] = _commit()
+    report['python'] = platform.python_version()
+    report['parameters'] = {'telemetry': args.telemetry,
+                            'latency': args.latency,
+                            'node_padding': args.node_padding,
+                            'interval': args.interval,
+                            'history': HISTORY}
+    report['results'] = run_benchmark(args)
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2)
+    print('Results written to {}'.format(args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+# Copyright (c) 2017, Intel Research and Development Ireland Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Synthetic landscapes and metric series, served by the fake services used to
+benchmark the engine without a Landscaper or a telemetry backend.
+"""
+
+__author__ = 'Giuliana Carullo'
+__copyright__ = "Copyright (c) 2017, Intel Research and Development Ireland Ltd."
+__license__ = "Apache 2.0"
+__maintainer__ = "Giuliana Carullo"
+__email__ = "giuliana.carullo@intel.com"
+__status__ = "Development"
+
+import math
+import time
+import zlib
+
+import networkx as nx
+
+from analytics_engine.heuristics.beans.infograph import InfoGraphNodeType as NODE_TYPE
+from analytics_engine.heuristics.beans.infograph import InfoGraphNodeLayer as GRAPH_LAYER
+from analytics_engine.heuristics.beans.infograph import InfoGraphNodeCategory as CATEGORY
+from analytics_engine.heuristics.infrastructure.telemetry.snap_telemetry import metric_conf as snap_metric_conf
+
+DOCKER_NODE = 'docker_node'
+
+# Measurements stored in the synthetic snap db, by node type
+SNAP_MEASUREMENTS = {
+    NODE_TYPE.PHYSICAL_MACHINE: ["intel/procfs/meminfo/mem_available",
+                                 "intel/procfs/meminfo/mem_free",
+                                 "intel/procfs/meminfo/mem_used",
+                                 "intel/procfs/meminfo/mem_used_perc",
+                                 "intel/procfs/meminfo/mem_total",
+                                 "intel/procfs/memory/utilization_percentage",
+                                 "intel/use/compute/utilization",
+                                 "intel/use/compute/saturation",
+                                 "intel/use/memory/utilization",
+                                 "intel/use/memory/saturation"],
+    NODE_TYPE.PHYSICAL_PU: ["intel/procfs/cpu/utilization_percentage",
+                            "intel/procfs/cpu/active_percentage",
+                            "intel/procfs/cpu/idle_percentage"],
+    NODE_TYPE.PHYSICAL_NIC: ["intel/psutil/net/bytes_recv",
+                             "intel/psutil/net/bytes_sent",
+                             "intel/use/network/utilization",
+                             "intel/use/network/saturation"],
+    NODE_TYPE.PHYSICAL_DISK: ["intel/procfs/disk/io_time",
+                              "intel/procfs/disk/utilization_percentage",
+                              "intel/use/disk/utilization",
+                              "intel/use/disk/saturation"],
+    NODE_TYPE.DOCKER_CONTAINER: [
+        "intel/docker/stats/cgroups/cpu_stats/cpu_usage/total",
+        "intel/docker/stats/cgroups/memory_stats/usage/usage",
+        "intel/docker/stats/network/tx_bytes",
+        "intel/docker/stats/network/rx_bytes",
+        "intel/docker/stats/cgroups/blkio_stats/io_time_recursive/value"]}
+
+# Rate per second of the synthetic counters
+COUNTER_RATE = 1000000.0
+# Period in seconds of the synthetic gauges
+GAUGE_PERIOD = 3600.0
+
+
+def is_counter(metric):
+    """
+    True if the metric is a monotonic counter, in snap or in prometheus.
+    """
+    return metric in snap_metric_conf.COUNTER_METRICS or \
+        metric.endswith('_total')
+
+
+def metric_values(metric, labels, timestamps):
+    """
+    Returns the values of a synthetic series at the given timestamps.
+    Series are deterministic: the same metric and labels always return the
+    same values. Counters grow linearly, gauges oscillate between 0 and 100.
+
+    :param metric: metric name
+    :param labels: dict of the labels/tags identifying the series
+    :param timestamps: list of timestamps in seconds from epoch
+    :return: list of float values
+    """
+    seed = zlib.crc32('{}{}'.format(metric, sorted(labels.items()))) & 0xffff
+    if is_counter(metric):
+        rate = COUNTER_RATE * (1 + seed % 100) / 100.0
+        return [rate * ts for ts in timestamps]
+    phase = 2 * math.pi * seed / 0xffff
+    base = 20 + seed % 50
+    return [base + 20 * math.sin(2 * math.pi * ts / GAUGE_PERIOD + phase)
+            for ts in timestamps]
+
+
+def metric_aggregate(metric, labels, ts_from, ts_to, interval, aggregate):
+    """
+    Returns the aggregate of a synthetic series over a time window.
+
+    :param aggregate: 'mean' or 'spread'
+    """
+    timestamps = series_timestamps(ts_from, ts_to, interval)
+    values = metric_values(metric, labels, timestamps)
+    if not values:
+        return None
+    if aggregate == 'spread':
+        return max(values) - min(values)
+    return sum(values) / len(values)
+
+
+def series_timestamps(ts_from, ts_to, step):
+    """
+    Returns the timestamps aligned to step between ts_from and ts_to.
+    """
+    step = max(1, int(step))
+    start = int(math.ceil(float(ts_from) / step)) * step
+    return range(start, int(ts_to) + 1, step)
+
+
+class SyntheticLandscape(object):
+    """
+    Generates a landscape of hosts with their PUs, NICs and disks, running
+    VMs and docker containers which belong to a set of services.
+
+    Edges go from the service layer down to the physical layer, as in the
+    Landscaper: service -> vm -> machine, service -> container ->
+    docker node -> machine, machine -> pu/nic/disk, nic -> switch.
+    Services have 'history' instances, each 'window' seconds long: the
+    active one ends now, the others in the past.
+    """
+
+    def __init__(self, hosts=10, pus=4, nics=2, disks=2, vms=2,
+                 containers=2, services=None, history=1, window=600,
+                 now=None):
+        self.hosts = hosts
+        self.pus = pus
+        self.nics = nics
+        self.disks = disks
+        self.vms = vms
+        self.containers = containers
+        self.services = services or max(1, hosts / 2)
+        self.history = max(1, history)
+        self.window = window
+        self.now = int(now or time.time())
+        self.graph = nx.DiGraph()
+        self._build()
+
+    def host_name(self, index):
+        # no underscores, PU names are split on them to get the machine
+        return 'host{:04d}'.format(index)
+
+    def service_name(self, index):
+        return 'service{:04d}'.format(index)
+
+    def service_nodes(self, name=None, active=True):
+        """
+        Returns the names of the service instance nodes.
+
+        :param name: stack/service name, all services if None
+        :param active: if True only the active instances are returned
+        """
+        res = list()
+        for node, attrs in self.graph.nodes(data=True):
+            if attrs['layer'] != GRAPH_LAYER.SERVICE:
+                continue
+            if name and attrs['stack_name'] != name:
+                continue
+            if active and attrs['to'] < self.now:
+                continue
+            res.append(node)
+        return res
+
+    def machines(self):
+        return [self.host_name(i) for i in range(self.hosts)]
+
+    def _add_node(self, name, layer, node_type, category, **attributes):
+        attributes['name'] = name
+        self.graph.add_node(name, layer=layer, type=node_type,
+                            category=category, **attributes)
+
+    def _build(self):
+        self._add_node('switch0', GRAPH_LAYER.PHYSICAL,
+                       NODE_TYPE.PHYSICAL_SWITCH, CATEGORY.NETWORK)
+        workloads = list()
+        for i in range(self.hosts):
+            host = self.host_name(i)
+            self._add_node(host, GRAPH_LAYER.PHYSICAL,
+                           NODE_TYPE.PHYSICAL_MACHINE, CATEGORY.COMPUTE,
+                           allocation=host, nicspeedmbps='1000')
+            for j in range(self.pus):
+                pu = '{}_pu_{}'.format(host, j)
+                self._add_node(pu, GRAPH_LAYER.PHYSICAL,
+                               NODE_TYPE.PHYSICAL_PU, CATEGORY.COMPUTE,
+                               allocation=host, os_index=str(j))
+                self.graph.add_edge(host, pu)
+            for j in range(self.nics):
+                nic = '{}_eno{}'.format(host, j + 1)
+                self._add_node(nic, GRAPH_LAYER.PHYSICAL,
+                               NODE_TYPE.PHYSICAL_NIC, CATEGORY.NETWORK,
+                               allocation=host,
+                               address='02:00:{:02x}:{:02x}:{:02x}:{:02x}'
+                               .format(i >> 8 & 0xff, i & 0xff, j, 1),
+                               **{'osdev_network-name': 'eno{}'.format(j + 1)})
+                self.graph.add_edge(host, nic)
+                self.graph.add_edge(nic, 'switch0')
+            for j in range(self.disks):
+                disk = '{}_sd{}'.format(host, chr(ord('a') + j % 26))
+                self._add_node(disk, GRAPH_LAYER.PHYSICAL,
+                               NODE_TYPE.PHYSICAL_DISK, CATEGORY.STORAGE,
+                               allocation=host,
+                               **{'osdev_storage-name':
+                                  'sd{}'.format(chr(ord('a') + j % 26))})
+                self.graph.add_edge(host, disk)
+            for j in range(self.vms):
+                vm = '{}_vm_{}'.format(host, j)
+                self._add_node(vm, GRAPH_LAYER.VIRTUAL,
+                               NODE_TYPE.VIRTUAL_MACHINE, CATEGORY.COMPUTE,
+                               vm_name=vm)
+                self.graph.add_edge(vm, host)
+                workloads.append(vm)
+            if self.containers:
+                docker_node = '{}_docker'.format(host)
+                self._add_node(docker_node, GRAPH_LAYER.VIRTUAL, DOCKER_NODE,
+                               CATEGORY.COMPUTE)
+                self.graph.add_edge(docker_node, host)
+            for j in range(self.containers):
+                # docker ids are 12 hex digits
+                container = '{:08x}{:04x}'.format(i, j)
+                self._add_node(container, GRAPH_LAYER.VIRTUAL,
+                               NODE_TYPE.DOCKER_CONTAINER, CATEGORY.COMPUTE)
+                self.graph.add_edge(container, docker_node)
+                workloads.append(container)
+
+        for s in range(self.services):
+            name = self.service_name(s)
+            for h in range(self.history):
+                ts_to = self.now - h * self.window
+                instance = name if h == 0 else '{}_{}'.format(name, h)
+                self._add_node(instance, GRAPH_LAYER.SERVICE,
+                               NODE_TYPE.SERVICE_COMPUTE, CATEGORY.COMPUTE,
+                               stack_name=name, service_name=name,
+                               template='Properties:\n  name: {}\n'.format(
+                                   name),
+                               **{'from': ts_to - self.window,
+                                  'to': ts_to})
+                for workload in workloads[s::self.services]:
+                    self.graph.add_edge(instance, workload)
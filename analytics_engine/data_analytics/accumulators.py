@@ -0,0 +1,227 @@
+# Copyright (c) 2017, Intel Research and Development Ireland Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Online accumulators of series statistics. Values are added in one or more
+chunks and accumulators of different series can be merged, so that the
+statistics of several series do not need them concatenated.
+"""
+
+__author__ = 'Giuliana Carullo'
+__copyright__ = "Copyright (c) 2017, Intel Research and Development Ireland Ltd."
+__license__ = "Apache 2.0"
+__maintainer__ = "Giuliana Carullo"
+__email__ = "giuliana.carullo@intel.com"
+__status__ = "Development"
+
+import math
+
+import numpy
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+# values closer than this to 0 are counted as 0 by the sketch
+MIN_INDEXABLE_VALUE = 1e-9
+
+
+class QuantileSketch(object):
+    """
+    Quantile sketch with relative accuracy guarantees, as DDSketch.
+    Values are counted in logarithmic buckets, so the returned quantiles
+    are within relative_accuracy of the exact ones, and the size of the
+    sketch depends on the range of the values, not on their number.
+    """
+
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("Relative accuracy must be in the range 0-1")
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._positive = dict()
+        self._negative = dict()
+        self._zeros = 0
+        self.count = 0
+
+    def add(self, values):
+        """
+        Adds a chunk of values, non finite values are skipped.
+
+        :param values: array like of numbers
+        """
+        values = numpy.asarray(values, dtype=numpy.float64).ravel()
+        values = values[numpy.isfinite(values)]
+        self.count += values.size
+        self._add_buckets(self._positive,
+                          values[values > MIN_INDEXABLE_VALUE])
+        self._add_buckets(self._negative,
+                          -values[values < -MIN_INDEXABLE_VALUE])
+        self._zeros += int(numpy.count_nonzero(
+            numpy.abs(values) <= MIN_INDEXABLE_VALUE))
+        return self
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Sketches with different accuracy")
+        for buckets, other_buckets in [(self._positive, other._positive),
+                                       (self._negative, other._negative)]:
+            for key, count in other_buckets.items():
+                buckets[key] = buckets.get(key, 0) + count
+        self._zeros += other._zeros
+        self.count += other.count
+        return self
+
+    def quantile(self, q):
+        """
+        Returns the approximate q-quantile, nan if no value was added.
+
+        :param q: float in the range 0-1
+        """
+        if not 0 <= q <= 1:
+            raise ValueError("Quantile must be in the range 0-1")
+        if not self.count:
+            return numpy.nan
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self._negative, reverse=True):
+            seen += self._negative[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self._zeros
+        if seen > rank:
+            return 0.0
+        key = None
+        for key in sorted(self._positive):
+            seen += self._positive[key]
+            if seen > rank:
+                break
+        return self._value(key)
+
+    def _add_buckets(self, buckets, values):
+        if not values.size:
+            return
+        keys = numpy.ceil(numpy.log(values) / self._log_gamma)
+        keys, counts = numpy.unique(keys.astype(numpy.int64),
+                                    return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            buckets[key] = buckets.get(key, 0) + count
+
+    def _value(self, key):
+        return 2 * self._gamma ** key / (self._gamma + 1)
+
+
+class Accumulator(object):
+    """
+    Count, sum, sum of squares, min and max of a series, plus a quantile
+    sketch for the median. Like pandas, nan values are skipped.
+    Sums are taken from the first value, to keep the variance accurate
+    for counters with large values.
+    """
+
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+        self.count = 0
+        self.min = numpy.nan
+        self.max = numpy.nan
+        self.sketch = QuantileSketch(relative_accuracy)
+        self._shift = None
+        self._sum = 0.0
+        self._sumsq = 0.0
+
+    def add(self, values):
+        """
+        Adds a chunk of the series.
+
+        :param values: array like of numbers
+        """
+        values = numpy.asarray(values, dtype=numpy.float64).ravel()
+        values = values[~numpy.isnan(values)]
+        if not values.size:
+            return self
+        if self._shift is None:
+            self._shift = values[0]
+        shifted = values - self._shift
+        self._sum += shifted.sum()
+        self._sumsq += numpy.dot(shifted, shifted)
+        self.min = numpy.fmin(self.min, values.min())
+        self.max = numpy.fmax(self.max, values.max())
+        self.count += values.size
+        self.sketch.add(values)
+        return self
+
+    def merge(self, other):
+        """
+        Adds all the values accumulated by other.
+        """
+        if not other.count:
+            return self
+        if self._shift is None:
+            self._shift = other._shift
+        # moves the sums of other to the shift of self
+        delta = other._shift - self._shift
+        self._sumsq += other._sumsq + 2 * delta * other._sum + \
+            other.count * delta * delta
+        self._sum += other._sum + other.count * delta
+        self.min = numpy.fmin(self.min, other.min)
+        self.max = numpy.fmax(self.max, other.max)
+        self.count += other.count
+        self.sketch.merge(other.sketch)
+        return self
+
+    @property
+    def sum(self):
+        if not self.count:
+            return 0.0
+        return self._sum + self.count * self._shift
+
+    @property
+    def mean(self):
+        if not self.count:
+            return numpy.nan
+        return self._shift + self._sum / self.count
+
+    @property
+    def var(self):
+        """
+        Sample variance, as pandas computes it.
+        """
+        if self.count < 2:
+            return numpy.nan
+        var = (self._sumsq - self._sum * self._sum / self.count) / \
+            (self.count - 1)
+        return max(var, 0.0)
+
+    @property
+    def std_dev(self):
+        return math.sqrt(self.var)
+
+    @property
+    def median(self):
+        return self.quantile(0.5)
+
+    def quantile(self, q):
+        return self.sketch.quantile(q)
+
+    def statistics(self):
+        """
+        Returns mean, median, min, max, var and std_dev, all 0 if the
+        series is empty.
+        """
+        if not self.count:
+            return {'mean': 0, 'median': 0, 'min': 0, 'max': 0, 'var': 0,
+                    'std_dev': 0}
+        return {'mean': self.mean,
+                'median': self.median,
+                'min': self.min,
+                'max': self.max,
+                'var': self.var,
+                'std_dev': self.std_dev}
@@ -21,10 +21,16 @@ __status__ = "Development"
 
 
 from analytics_engine.heuristics.beans.infograph import InfoGraphNode, InfoGraphNodeType, \
-    InfoGraphNodeCategory, InfoGraphNodeLayer
+    InfoGraphNodeCategory, InfoGraphNodeLayer, InfoGraphNodeProperty
+from analytics_engine.data_analytics.accumulators import Accumulator
 import pandas
 import math
 
+UTILIZATION_KINDS = [InfoGraphNodeProperty.UTILIZATION_COMPUTE,
+                     InfoGraphNodeProperty.UTILIZATION_MEMORY,
+                     InfoGraphNodeProperty.UTILIZATION_DISK,
+                     InfoGraphNodeProperty.UTILIZATION_NETWORK]
+
 
 class Fingerprint(object):
 
@@ -70,11 +76,11 @@ class Fingerprint(object):
             counter[category] = 0
 
         # calculation of the fingerprint on top of the virtual resources
-        local_subgraph = annotated_subgraph.copy()
-        local_subgraph.filter_nodes('layer', "physical")
-        local_subgraph.filter_nodes('layer', "service")
-
-        for node in local_subgraph.nodes(data=True):
+        # only the nodes are read: the graph is neither copied nor filtered
+        for node in annotated_subgraph.nodes(data=True):
+            if InfoGraphNode.get_layer(node) in [InfoGraphNodeLayer.PHYSICAL,
+                                                 InfoGraphNodeLayer.SERVICE]:
+                continue
             # if Fingerprint._node_is_nic_on_management_net(
             #         node, annotated_subgraph, mng_net_name):
             #     continue
@@ -114,12 +120,14 @@ class Fingerprint(object):
             counter[category] = 0
 
         # calculation of the fingerprint on top of the virtual resources
-        local_subgraph = annotated_subgraph.copy()
-        local_subgraph.filter_nodes('layer', "virtual")
-        local_subgraph.filter_nodes('layer', "service")
-        local_subgraph.filter_nodes('type', 'machine')
-
-        for node in local_subgraph.nodes(data=True):
+        # only the nodes are read: the graph is neither copied nor filtered
+        for node in annotated_subgraph.nodes(data=True):
+            if InfoGraphNode.get_layer(node) in [InfoGraphNodeLayer.VIRTUAL,
+                                                 InfoGraphNodeLayer.SERVICE]:
+                continue
+            if InfoGraphNode.get_type(node) == \
+                    InfoGraphNodeType.PHYSICAL_MACHINE:
+                continue
             # if Fingerprint._node_is_nic_on_management_net(
             #         node, annotated_subgraph, mng_net_name):
             #     continue
@@ -141,30 +149,27 @@ class Fingerprint(object):
         return fingerprint
 
     @staticmethod
-    def compute_node(annotated_subgraph, hostname=None):
+    def compute_node(annotated_subgraph, hostname=None, keep_data=True):
         """
-        This is a type of fingerprint from the infrastructure perspective
+        This is a type of fingerprint from the infrastructure perspective.
+        Statistics are merged from the ones accumulated for each node, so
+        with keep_data False the utilization series are not concatenated
+        and the returned data is empty. The median is approximated within
+        1%.
         """
         # TODO: Validate graph
         data = dict()
         statistics = dict()
-        compute = InfoGraphNodeCategory.COMPUTE
-        data[compute] = pandas.DataFrame()
-        statistics[compute] = {'mean': 0, 'median': 0, 'min': 0, 'max': 0, 'var': 0, 'std_dev': 0}
-        network = InfoGraphNodeCategory.NETWORK
-        data[network] = pandas.DataFrame()
-        statistics[network] = {'mean': 0, 'median': 0, 'min': 0, 'max': 0, 'var': 0, 'std_dev': 0}
-        storage = InfoGraphNodeCategory.STORAGE
-        data[storage] = pandas.DataFrame()
-        statistics[storage] = {'mean': 0, 'median': 0, 'min': 0, 'max': 0, 'var': 0, 'std_dev': 0}
-        memory = InfoGraphNodeCategory.MEMORY
-        data[memory] = pandas.DataFrame()
-        statistics[memory] = {'mean': 0, 'median': 0, 'min': 0, 'max': 0, 'var': 0, 'std_dev': 0}
+        accumulators = dict()
+        for category in [InfoGraphNodeCategory.COMPUTE,
+                         InfoGraphNodeCategory.NETWORK,
+                         InfoGraphNodeCategory.STORAGE,
+                         InfoGraphNodeCategory.MEMORY]:
+            data[category] = pandas.DataFrame()
+            accumulators[category] = Accumulator()
 
         # Calculation of the fingerprint on top of the virtual resources
-        local_subgraph = annotated_subgraph.copy()
-
-        for node in local_subgraph.nodes(data=True):
+        for node in annotated_subgraph.nodes(data=True):
             layer = InfoGraphNode.get_layer(node)
             is_machine = InfoGraphNode.node_is_machine(node)
             if is_machine:
@@ -182,35 +187,20 @@ class Fingerprint(object):
                 continue
 
             category = InfoGraphNode.get_category(node)
-            utilization = InfoGraphNode.get_utilization(node)
-            try:
-                utilization = utilization.drop('timestamp', 1)
-            except ValueError:
+            for kind in UTILIZATION_KINDS:
+                summary = InfoGraphNode.get_summary(node, kind, 'utilization')
+                if summary is not None:
+                    accumulators[category].merge(summary)
+            if keep_data:
                 utilization = InfoGraphNode.get_utilization(node)
-            data[category] = pandas.concat([data[category], utilization])
+                try:
+                    utilization = utilization.drop('timestamp', 1)
+                except ValueError:
+                    utilization = InfoGraphNode.get_utilization(node)
+                data[category] = pandas.concat([data[category], utilization])
 
-        for category in statistics:
-            if not data[category].empty:
-                mean = data[category]['utilization'].mean()
-                median = (data[category]['utilization']).median()
-                min = data[category]['utilization'].min()
-                maximum = data[category]['utilization'].max()
-                var = data[category]['utilization'].var()
-                std_dev = math.sqrt(var)
-            else:
-                mean = 0
-                median = 0
-                min = 0
-                maximum = 0
-                var = 0
-                std_dev = 0
-            statistics[category] = \
-                {'mean': mean,
-                 'median': median,
-                 'min': min,
-                 'max': maximum,
-                 'var': var,
-                 'std_dev': std_dev}
+        for category in accumulators:
+            statistics[category] = accumulators[category].statistics()
 
         return [data, statistics]
 
@@ -224,9 +214,7 @@ class Fingerprint(object):
         statistics = dict()
 
         # Calculation of the fingerprint on top of the virtual resources
-        local_subgraph = annotated_subgraph.copy()
-
-        for node in local_subgraph.nodes(data=True):
+        for node in annotated_subgraph.nodes(data=True):
             layer = InfoGraphNode.get_layer(node)
             if layer == InfoGraphNodeLayer.VIRTUAL:
                 continue
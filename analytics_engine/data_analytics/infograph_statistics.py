@@ -22,6 +22,7 @@ __status__ = "Development"
 
 import pandas
 from analytics_engine.heuristics.beans.infograph import InfoGraphNode
+from analytics_engine.heuristics.beans.infograph import InfoGraphNodeProperty
 
 
 class InfoGraphStatistics():
@@ -38,12 +39,14 @@ class InfoGraphStatistics():
         if metric_a == 'utilization':
             telemetry_a = InfoGraphNode.get_utilization(node_a)
         else:
-            telemetry_a = InfoGraphNode.get_telemetry_data(node_a)
+            telemetry_a = InfoGraphNode.get_frame_view(
+                node_a, InfoGraphNodeProperty.TELEMETRY_DATA)
 
         if metric_b == 'utilization':
             telemetry_b = InfoGraphNode.get_utilization(node_b)
         else:
-            telemetry_b = InfoGraphNode.get_telemetry_data(node_b)
+            telemetry_b = InfoGraphNode.get_frame_view(
+                node_b, InfoGraphNodeProperty.TELEMETRY_DATA)
 
         if metric_a not in telemetry_a.columns.values:
             raise ValueError("Metric {} is not in Telemetry data of Node {}".
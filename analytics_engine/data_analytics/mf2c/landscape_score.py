@@ -19,14 +19,47 @@ __maintainer__ = "Giuliana Carullo"
 __email__ = "giuliana.carullo@intel.com"
 __status__ = "Development"
 
+import warnings
+import numpy
 import pandas
 import analytics_engine.common as common
 from analytics_engine.heuristics.beans.infograph import InfoGraphNode, InfoGraphNodeType
+from analytics_engine.heuristics.beans.infograph import InfoGraphNodeProperty
 
 # from lib_analytics
 
 LOG = common.LOG
 
+SCORE_FIELDS = ['compute', 'memory', 'disk', 'network']
+SCORES_DTYPE = [('node_name', object)] + \
+    [(field, numpy.float64) for field in SCORE_FIELDS]
+
+UTILIZATION_KINDS = {'compute': InfoGraphNodeProperty.UTILIZATION_COMPUTE,
+                     'memory': InfoGraphNodeProperty.UTILIZATION_MEMORY,
+                     'disk': InfoGraphNodeProperty.UTILIZATION_DISK,
+                     'network': InfoGraphNodeProperty.UTILIZATION_NETWORK}
+
+# scored metrics, by preference
+UTILIZATION_METRICS = {
+    'compute': ['intel/use/compute/utilization',
+                'intel/procfs/cpu/utilization_percentage'],
+    'memory': ['intel/use/memory/utilization',
+               'intel/procfs/memory/utilization_percentage'],
+    'disk': ['intel/use/disk/utilization',
+             'intel/procfs/disk/utilization_percentage'],
+    'network': ['intel/use/network/utilization',
+                'intel/psutil/net/utilization_percentage']}
+
+DOCKER_UTILIZATION_METRICS = {
+    'compute': 'intel/docker/stats/cgroups/cpu_stats/cpu_usage/percentage',
+    'memory': 'intel/docker/stats/cgroups/memory_stats/usage/percentage',
+    'disk': 'intel/docker/stats/cgroups/blkio_stats/io_time_recursive/'
+            'percentage',
+    'network': 'intel/docker/stats/network/utilization_percentage'}
+
+# machines are scored over all their PUs, disks and NICs
+MACHINE_DEVICE_FIELDS = ['compute', 'disk', 'network']
+
 
 class LandscapeScore(object):
 
@@ -40,84 +73,106 @@ class LandscapeScore(object):
         :return: dict[node_name] = score
         """
         res = dict()
-        for node in graph.nodes(data=True):
-            node_name = InfoGraphNode.get_name(node)
-            res[node_name] = dict()
-            util = InfoGraphNode.get_utilization(node)
-            import analytics_engine.common as common
-            LOG = common.LOG
+        for row in LandscapeScore.utilization_table(graph):
+            res[row['node_name']] = dict((field, float(row[field]))
+                                         for field in SCORE_FIELDS)
+        return res
 
-            res[node_name]['compute'] = 0
-            res[node_name]['disk'] = 0
-            res[node_name]['network'] = 0
-            res[node_name]['memory'] = 0
-            if (isinstance(util, pandas.DataFrame) and
-                    util.empty) or \
-                    (not isinstance(util, pandas.DataFrame) and
-                             util==None):
-                continue
+    @staticmethod
+    def utilization_table(graph):
+        """
+        Returns the utilization scores of all the nodes of the graph, as a
+        structured array with a row per node. Docker containers also have
+        a row named after their docker id.
+        Machines are scored in batches, averaging over all their PUs, disks
+        and NICs.
 
-            # intel/use/
-            if 'intel/use/compute/utilization' in util:
-                res[node_name]['compute'] = (util.get('intel/use/compute/utilization').mean()) / 100.0
-            elif 'intel/procfs/cpu/utilization_percentage' in util:
-                    res[node_name]['compute'] = (util.get('intel/procfs/cpu/utilization_percentage').mean()) / 100.0
-            if 'intel/use/memory/utilization' in util:
-                res[node_name]['memory'] = (util.get('intel/use/memory/utilization').mean()) / 100.0
-            elif 'intel/procfs/memory/utilization_percentage' in util:
-                res[node_name]['memory'] = (util.get('intel/procfs/memory/utilization_percentage').mean()) / 100.0
-            if 'intel/use/disk/utilization' in util:
-                res[node_name]['disk'] = (util.get('intel/use/disk/utilization').mean()) / 100.0
-            elif 'intel/procfs/disk/utilization_percentage' in util:
-                res[node_name]['disk'] = (util.get('intel/procfs/disk/utilization_percentage').mean()) / 100.0
-            if 'intel/use/network/utilization' in util:
-                res[node_name]['network'] = (util.get('intel/use/network/utilization').mean()) / 100.0
-            elif 'intel/psutil/net/utilization_percentage' in util:
-                res[node_name]['network'] = (util.get('intel/psutil/net/utilization_percentage').mean()) / 100.0
-
-            # special handling of cpu, disk & network utilization if node is a machine
+        :param graph: InfoGraph
+        :return: numpy structured array of SCORES_DTYPE
+        """
+        rows = list()
+        machines = list()
+        for node in graph.nodes(data=True):
+            scores = [0.0] * len(SCORE_FIELDS)
+            # column names are enough to pick the metrics to score
+            columns = dict((kind, InfoGraphNode.get_frame_columns(
+                node, UTILIZATION_KINDS[kind])) for kind in SCORE_FIELDS)
+            rows.append((InfoGraphNode.get_name(node), scores))
+            if not any(columns.values()):
+                continue
+            for pos, kind in enumerate(SCORE_FIELDS):
+                for metric in UTILIZATION_METRICS[kind]:
+                    if metric in columns[kind]:
+                        scores[pos] = LandscapeScore._mean(
+                            node, kind, metric) / 100.0
+                        break
+            # cpu, disk & network of machines are averaged over the devices
             if InfoGraphNode.node_is_machine(node):
-                # mean from all cpu columns
-                cpu_util = InfoGraphNode.get_compute_utilization(node)
-                cpu_util['total'] = [sum(row) / len(row) for index, row in cpu_util.iterrows()]
-                res[node_name]['compute'] = cpu_util['total'].mean() / 100
-                # mean from all disk columns
-                disk_util = InfoGraphNode.get_disk_utilization(node)
-                if disk_util.empty:
-                    res[node_name]['disk'] = 0.0
-                else:
-                    disk_util['total'] = [sum(row) / len(row) for index, row in disk_util.iterrows()]
-                    res[node_name]['disk'] = disk_util['total'].mean() / 100
-                # mean from all nic columns
-                net_util = InfoGraphNode.get_network_utilization(node)
-                if net_util.empty:
-                    res[node_name]['network'] = 0.0
-                else:
-                    net_util['total'] = [sum(row) / len(row) for index, row in net_util.iterrows()]
-                    res[node_name]['network'] = net_util['total'].mean() / 100
-                # custom metric
-
-            if InfoGraphNode.get_type(node)==InfoGraphNodeType.DOCKER_CONTAINER:
-                node_name = InfoGraphNode.get_docker_id(node)
-                res[node_name] = {}
-                if 'intel/docker/stats/cgroups/cpu_stats/cpu_usage/percentage' in util.columns:
-                    res[node_name]['compute'] = util['intel/docker/stats/cgroups/cpu_stats/cpu_usage/percentage'].mean() / 100
-                else:
-                    res[node_name]['compute'] = 0
-                if 'intel/docker/stats/cgroups/memory_stats/usage/percentage' in util.columns:
-                    res[node_name]['memory'] = util['intel/docker/stats/cgroups/memory_stats/usage/percentage'].mean() / 100
-                else:
-                    res[node_name]['memory'] = 0
-                if 'intel/docker/stats/network/utilization_percentage' in util.columns:
-                    res[node_name]['network'] = util['intel/docker/stats/network/utilization_percentage'].mean() / 100
-                else:
-                    res[node_name]['network'] = 0
-                if 'intel/docker/stats/cgroups/blkio_stats/io_time_recursive/percentage' in util.columns:
-                    res[node_name]['disk'] = util['intel/docker/stats/cgroups/blkio_stats/io_time_recursive/percentage'].mean() / 100
-                else:
-                    res[node_name]['disk'] = 0
+                machines.append((scores, dict(
+                    (kind, InfoGraphNode.get_frame_view(
+                        node, UTILIZATION_KINDS[kind]))
+                    for kind in MACHINE_DEVICE_FIELDS)))
+            if InfoGraphNode.get_type(node) == \
+                    InfoGraphNodeType.DOCKER_CONTAINER:
+                docker_scores = [0.0] * len(SCORE_FIELDS)
+                for pos, kind in enumerate(SCORE_FIELDS):
+                    metric = DOCKER_UTILIZATION_METRICS[kind]
+                    if metric in columns[kind]:
+                        docker_scores[pos] = LandscapeScore._mean(
+                            node, kind, metric) / 100.0
+                rows.append((InfoGraphNode.get_docker_id(node),
+                             docker_scores))
+
+        for kind in MACHINE_DEVICE_FIELDS:
+            pos = SCORE_FIELDS.index(kind)
+            values = [frames[kind].values for _, frames in machines]
+            for (scores, frames), score in \
+                    zip(machines, LandscapeScore._row_mean_scores(values)):
+                # no devices: no compute score, no disk or network load
+                if frames[kind].empty and kind != 'compute':
+                    score = 0.0
+                scores[pos] = score / 100.0
+
+        res = numpy.empty(len(rows), dtype=SCORES_DTYPE)
+        res['node_name'] = [name for name, _ in rows]
+        for pos, field in enumerate(SCORE_FIELDS):
+            res[field] = [scores[pos] for _, scores in rows]
+        return res
+
+    @staticmethod
+    def _row_mean_scores(values):
+        """
+        Returns, for each matrix, the mean over time of the mean of its
+        columns. Matrices of the same shape are reduced together.
+
+        :param values: list of 2D arrays, time by devices
+        :return: list of float, nan for empty matrices
+        """
+        res = [numpy.nan] * len(values)
+        shapes = dict()
+        for pos, matrix in enumerate(values):
+            if matrix.size:
+                shapes.setdefault(matrix.shape, list()).append(pos)
+        for positions in shapes.values():
+            stacked = numpy.array([values[pos] for pos in positions],
+                                  dtype=numpy.float64)
+            with warnings.catch_warnings():
+                # all nan series score nan, as with pandas
+                warnings.simplefilter('ignore', RuntimeWarning)
+                scores = numpy.nanmean(stacked.mean(axis=2), axis=1)
+            for pos, score in zip(positions, scores):
+                res[pos] = score
         return res
 
+    @staticmethod
+    def _mean(node, kind, metric):
+        """
+        Mean of the utilization metric, from its accumulated statistics.
+        """
+        summary = InfoGraphNode.get_summary(node, UTILIZATION_KINDS[kind],
+                                            metric)
+        return summary.mean if summary is not None else numpy.nan
+
     @staticmethod
     def saturation_scores(graph):
         """
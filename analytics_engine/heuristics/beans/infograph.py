@@ -26,6 +26,10 @@ import copy
 import yaml
 import pandas
 from analytics_engine import common
+from analytics_engine.infrastructure_manager import graphs
+from analytics_engine.utilities import misc
+from analytics_engine.heuristics.beans.telemetry_store import TelemetryStore
+from analytics_engine.data_analytics.accumulators import Accumulator
 
 LOG = common.LOG
 
@@ -85,6 +89,7 @@ class InfoGraphNodeProperty():
     # ATTRIBUTES = 'attributes'
     QUERIES = 'queries'
     TELEMETRY_DATA = 'telemetry_data'
+    TELEMETRY_STATUS = 'telemetry_status'
     UTILIZATION = 'utilization'
     UTILIZATION_COMPUTE = 'utilization_compute'
     UTILIZATION_MEMORY = 'utilization_memory'
@@ -94,6 +99,165 @@ class InfoGraphNodeProperty():
     SATURATION_MEMORY = 'saturation_memory'
     SATURATION_DISK = 'saturation_disk'
     SATURATION_NETWORK = 'saturation_network'
+    TELEMETRY_STORE = 'telemetry_store'
+    # attributes of the node as returned by InfoGraphNode.get_attributes
+    ATTRIBUTES_VIEW = 'attributes_view'
+    # kept in the telemetry store of the graph, if any
+    TELEMETRY_FRAMES = [TELEMETRY_DATA, UTILIZATION,
+                        UTILIZATION_COMPUTE, UTILIZATION_MEMORY,
+                        UTILIZATION_DISK, UTILIZATION_NETWORK,
+                        SATURATION_COMPUTE, SATURATION_MEMORY,
+                        SATURATION_DISK, SATURATION_NETWORK]
+
+
+class InfoGraphTelemetryStatus():
+    # all the metrics of the node have been retrieved
+    COMPLETE = 'complete'
+    # some metrics have no data
+    PARTIAL = 'partial'
+    # telemetry failed or was not retrieved within the latency budget
+    MISSING = 'missing'
+
+
+_MISSING = object()
+
+
+class InfoGraphNodeAttributes(dict):
+    """
+    Read only attributes of a node, as returned by
+    InfoGraphNode.get_attributes. Values set on the node are shared with
+    it, values parsed from string attributes are frozen: copy them with
+    dict() to modify them.
+    """
+
+    # dictionaries of the node the attributes were built from, with the
+    # items they had then
+    _sources = ()
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("Node attributes are read only, "
+                        "use dict() to get a copy")
+
+    __setitem__ = _read_only
+    __delitem__ = _read_only
+    clear = _read_only
+    pop = _read_only
+    popitem = _read_only
+    setdefault = _read_only
+    update = _read_only
+
+    def copy(self):
+        return dict(self)
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(dict(self), memo)
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+    @staticmethod
+    def build(properties):
+        """
+        Merges the nested attributes set by the Landscaper into the
+        properties of the node, the outer ones winning.
+
+        :param properties: (dict) properties of the node
+        :return: InfoGraphNodeAttributes
+        """
+        levels = [properties]
+        sources = [properties]
+        nested = properties.get('attributes')
+        while nested:
+            if isinstance(nested, dict):
+                sources.append(nested)
+            else:
+                nested = _freeze(
+                    InfoGraphUtilities.parse_attributes(nested))
+                if not isinstance(nested, dict):
+                    break
+            levels.append(nested)
+            nested = nested.get('attributes')
+        values = dict()
+        for attrs in reversed(levels):
+            values.update(attrs)
+        for key in [InfoGraphNodeProperty.CATEGORY,
+                    InfoGraphNodeProperty.LAYER,
+                    InfoGraphNodeProperty.TELEMETRY_STORE,
+                    InfoGraphNodeProperty.ATTRIBUTES_VIEW]:
+            values.pop(key, None)
+        if len(levels) > 1 and not nested:
+            values.pop('attributes', None)
+        res = InfoGraphNodeAttributes(values)
+        view = InfoGraphNodeProperty.ATTRIBUTES_VIEW
+        res._sources = [(source, [item for item in source.items()
+                                  if item[0] != view])
+                        for source in sources]
+        return res
+
+    def is_current(self):
+        """
+        True if the dictionaries the attributes were built from have not
+        changed since.
+        """
+        for source, items in self._sources:
+            size = len(source)
+            if InfoGraphNodeProperty.ATTRIBUTES_VIEW in source:
+                size -= 1
+            if size != len(items):
+                return False
+            for key, value in items:
+                if source.get(key, _MISSING) is not value:
+                    return False
+        return True
+
+
+class _AttributeList(list):
+    """
+    Read only list parsed from the attributes of a node.
+    """
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("Node attributes are read only, "
+                        "use list() to get a copy")
+
+    __setitem__ = _read_only
+    __delitem__ = _read_only
+    __setslice__ = _read_only
+    __delslice__ = _read_only
+    __iadd__ = _read_only
+    __imul__ = _read_only
+    append = _read_only
+    extend = _read_only
+    insert = _read_only
+    pop = _read_only
+    remove = _read_only
+    reverse = _read_only
+    sort = _read_only
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(list(self), memo)
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+
+def _freeze(value):
+    """
+    Read only copy of parsed attributes, nested dictionaries and lists
+    included.
+    """
+    if isinstance(value, dict):
+        return InfoGraphNodeAttributes(
+            (key, _freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return _AttributeList(_freeze(item) for item in value)
+    return value
 
 
 class InfoGraphNode(object):
@@ -153,11 +317,22 @@ class InfoGraphNode(object):
 
     @staticmethod
     def get_attributes(node):
+        """
+        Returns the properties of the node but its layer and category.
+        Nested attributes set by the Landscaper are merged in, the outer
+        ones winning. They are built once and kept on the node until its
+        properties change.
+
+        :param node: Node of InfoGraph
+        :return: (InfoGraphNodeAttributes) read only attributes
+        """
         if len(node) == 2:
-            attrs = copy.deepcopy(node[1])
-            attrs.pop("category")
-            attrs.pop("layer")
-            res = InfoGraphUtilities.str_to_dict(attrs)
+            res = node[1].get(InfoGraphNodeProperty.ATTRIBUTES_VIEW)
+            # copies of the graph hold plain dictionaries
+            if not isinstance(res, InfoGraphNodeAttributes) or \
+                    not res.is_current():
+                res = InfoGraphNodeAttributes.build(node[1])
+                node[1][InfoGraphNodeProperty.ATTRIBUTES_VIEW] = res
             return res
         return None
 
@@ -187,10 +362,15 @@ class InfoGraphNode(object):
         # if len(node) == 2 and InfoGraphNodeProperty.UTILIZATION in node[1]:
         #     return node[1][InfoGraphNodeProperty.UTILIZATION]
         # return pandas.DataFrame()
-        node_utilization_compute = InfoGraphNode.get_compute_utilization(node)
-        node_utilization_memory = InfoGraphNode.get_memory_utilization(node)
-        node_utilization_disk = InfoGraphNode.get_disk_utilization(node)
-        node_utilization_network = InfoGraphNode.get_network_utilization(node)
+        # appending copies the frames, views are enough
+        node_utilization_compute = InfoGraphNode.get_frame_view(
+            node, InfoGraphNodeProperty.UTILIZATION_COMPUTE)
+        node_utilization_memory = InfoGraphNode.get_frame_view(
+            node, InfoGraphNodeProperty.UTILIZATION_MEMORY)
+        node_utilization_disk = InfoGraphNode.get_frame_view(
+            node, InfoGraphNodeProperty.UTILIZATION_DISK)
+        node_utilization_network = InfoGraphNode.get_frame_view(
+            node, InfoGraphNodeProperty.UTILIZATION_NETWORK)
         util = node_utilization_compute.append(node_utilization_memory).append(node_utilization_disk).append(
                 node_utilization_network)
         return util
@@ -198,113 +378,93 @@ class InfoGraphNode(object):
 
     @staticmethod
     def get_compute_utilization(node):
-        if len(node) == 2 and InfoGraphNodeProperty.UTILIZATION_COMPUTE in node[1]:
-            return node[1][InfoGraphNodeProperty.UTILIZATION_COMPUTE]
-        return pandas.DataFrame()
+        return InfoGraphNode._get_frame(node, InfoGraphNodeProperty.UTILIZATION_COMPUTE)
 
     @staticmethod
     def get_memory_utilization(node):
-        if len(node) == 2 and InfoGraphNodeProperty.UTILIZATION_MEMORY in node[1]:
-            return node[1][InfoGraphNodeProperty.UTILIZATION_MEMORY]
-        return pandas.DataFrame()
+        return InfoGraphNode._get_frame(node, InfoGraphNodeProperty.UTILIZATION_MEMORY)
 
     @staticmethod
     def get_network_utilization(node):
-        if len(node) == 2 and InfoGraphNodeProperty.UTILIZATION_NETWORK in node[1]:
-            return node[1][InfoGraphNodeProperty.UTILIZATION_NETWORK]
-        return pandas.DataFrame()
+        return InfoGraphNode._get_frame(node, InfoGraphNodeProperty.UTILIZATION_NETWORK)
 
     @staticmethod
     def get_disk_utilization(node):
-        if len(node) == 2 and InfoGraphNodeProperty.UTILIZATION_DISK in node[1]:
-            return node[1][InfoGraphNodeProperty.UTILIZATION_DISK]
-        return pandas.DataFrame()
+        return InfoGraphNode._get_frame(node, InfoGraphNodeProperty.UTILIZATION_DISK)
 
     @staticmethod
     def set_utilization(node, utilization):
-        if not len(node) == 2:
-            raise ValueError("Node format is not correct.")
-        node[1][InfoGraphNodeProperty.UTILIZATION] = utilization.fillna(0)
+        InfoGraphNode._set_frame(node, InfoGraphNodeProperty.UTILIZATION,
+                                 utilization.fillna(0))
 
     @staticmethod
     def set_compute_utilization(node, utilization):
-        if not len(node) == 2:
-            raise ValueError("Node format is not correct.")
-        node[1][InfoGraphNodeProperty.UTILIZATION_COMPUTE] = utilization.fillna(0)
+        InfoGraphNode._set_frame(node, InfoGraphNodeProperty.UTILIZATION_COMPUTE,
+                                 utilization.fillna(0))
 
     @staticmethod
     def set_memory_utilization(node, utilization):
-        if not len(node) == 2:
-            raise ValueError("Node format is not correct.")
-        node[1][InfoGraphNodeProperty.UTILIZATION_MEMORY] = utilization.fillna(0)
+        InfoGraphNode._set_frame(node, InfoGraphNodeProperty.UTILIZATION_MEMORY,
+                                 utilization.fillna(0))
 
     @staticmethod
     def set_disk_utilization(node, utilization):
-        if not len(node) == 2:
-            raise ValueError("Node format is not correct.")
-        node[1][InfoGraphNodeProperty.UTILIZATION_DISK] = utilization.fillna(0)
+        InfoGraphNode._set_frame(node, InfoGraphNodeProperty.UTILIZATION_DISK,
+                                 utilization.fillna(0))
 
     @staticmethod
     def set_network_utilization(node, utilization):
-        if not len(node) == 2:
-            raise ValueError("Node format is not correct.")
-        node[1][InfoGraphNodeProperty.UTILIZATION_NETWORK] = utilization.fillna(0)
+        InfoGraphNode._set_frame(node, InfoGraphNodeProperty.UTILIZATION_NETWORK,
+                                 utilization.fillna(0))
 
     ####### saturation ########
     @staticmethod
     def set_compute_saturation(node, saturation):
-        if not len(node) == 2:
-            raise ValueError("Node format is not correct.")
-        node[1][InfoGraphNodeProperty.SATURATION_COMPUTE] = saturation
+        InfoGraphNode._set_frame(node, InfoGraphNodeProperty.SATURATION_COMPUTE,
+                                 saturation)
 
     @staticmethod
     def set_memory_saturation(node, saturation):
-        if not len(node) == 2:
-            raise ValueError("Node format is not correct.")
-        node[1][InfoGraphNodeProperty.SATURATION_MEMORY] = saturation
+        InfoGraphNode._set_frame(node, InfoGraphNodeProperty.SATURATION_MEMORY,
+                                 saturation)
 
     @staticmethod
     def set_disk_saturation(node, saturation):
-        if not len(node) == 2:
-            raise ValueError("Node format is not correct.")
-        node[1][InfoGraphNodeProperty.SATURATION_DISK] = saturation
+        InfoGraphNode._set_frame(node, InfoGraphNodeProperty.SATURATION_DISK,
+                                 saturation)
 
     @staticmethod
     def set_network_saturation(node, saturation):
-        if not len(node) == 2:
-            raise ValueError("Node format is not correct.")
-        node[1][InfoGraphNodeProperty.SATURATION_NETWORK] = saturation
+        InfoGraphNode._set_frame(node, InfoGraphNodeProperty.SATURATION_NETWORK,
+                                 saturation)
 
     @staticmethod
     def get_disk_saturation(node):
-        if len(node) == 2 and InfoGraphNodeProperty.SATURATION_DISK in node[1]:
-            return node[1][InfoGraphNodeProperty.SATURATION_DISK]
-        return pandas.DataFrame()
+        return InfoGraphNode._get_frame(node, InfoGraphNodeProperty.SATURATION_DISK)
 
     @staticmethod
     def get_compute_saturation(node):
-        if len(node) == 2 and InfoGraphNodeProperty.SATURATION_COMPUTE in node[1]:
-            return node[1][InfoGraphNodeProperty.SATURATION_COMPUTE]
-        return pandas.DataFrame()
+        return InfoGraphNode._get_frame(node, InfoGraphNodeProperty.SATURATION_COMPUTE)
 
     @staticmethod
     def get_memory_saturation(node):
-        if len(node) == 2 and InfoGraphNodeProperty.SATURATION_MEMORY in node[1]:
-            return node[1][InfoGraphNodeProperty.SATURATION_MEMORY]
-        return pandas.DataFrame()
+        return InfoGraphNode._get_frame(node, InfoGraphNodeProperty.SATURATION_MEMORY)
 
     @staticmethod
     def get_network_saturation(node):
-        if len(node) == 2 and InfoGraphNodeProperty.SATURATION_NETWORK in node[1]:
-            return node[1][InfoGraphNodeProperty.SATURATION_NETWORK]
-        return pandas.DataFrame()
+        return InfoGraphNode._get_frame(node, InfoGraphNodeProperty.SATURATION_NETWORK)
 
     @staticmethod
     def get_saturation(node):
-        node_saturation_compute = InfoGraphNode.get_compute_saturation(node)
-        node_saturation_memory = InfoGraphNode.get_memory_saturation(node)
-        node_saturation_disk = InfoGraphNode.get_disk_saturation(node)
-        node_saturation_network = InfoGraphNode.get_network_saturation(node)
+        # appending copies the frames, views are enough
+        node_saturation_compute = InfoGraphNode.get_frame_view(
+            node, InfoGraphNodeProperty.SATURATION_COMPUTE)
+        node_saturation_memory = InfoGraphNode.get_frame_view(
+            node, InfoGraphNodeProperty.SATURATION_MEMORY)
+        node_saturation_disk = InfoGraphNode.get_frame_view(
+            node, InfoGraphNodeProperty.SATURATION_DISK)
+        node_saturation_network = InfoGraphNode.get_frame_view(
+            node, InfoGraphNodeProperty.SATURATION_NETWORK)
         sat = node_saturation_compute.append(node_saturation_memory).append(node_saturation_disk).append(
             node_saturation_network)
         return sat
@@ -313,7 +473,7 @@ class InfoGraphNode(object):
     def set_attribute(node, key, value):
         if not len(node) == 2:
             raise ValueError("Node format is not correct.")
-        if not isinstance(InfoGraphNode.get_attributes(node), dict):
+        if not isinstance(node[1].get('attributes'), dict):
             raise ValueError("Node has no attributes.")
         node[1]['attributes'][key] = value
 
@@ -329,16 +489,141 @@ class InfoGraphNode(object):
 
     @staticmethod
     def set_telemetry_data(node, data):
+        InfoGraphNode._set_frame(node, InfoGraphNodeProperty.TELEMETRY_DATA,
+                                 data)
+
+    @staticmethod
+    def get_telemetry_data(node):
+        return InfoGraphNode._get_frame(node, InfoGraphNodeProperty.TELEMETRY_DATA)
+
+    @staticmethod
+    def has_telemetry_data(node):
+        """
+        True if the node has been annotated with telemetry data.
+        """
+        if not len(node) == 2:
+            return False
+        kind = InfoGraphNodeProperty.TELEMETRY_DATA
+        store = node[1].get(InfoGraphNodeProperty.TELEMETRY_STORE)
+        if store is not None:
+            return store.has(InfoGraphNode.get_name(node), kind)
+        return node[1].get(kind) is not None
+
+    @staticmethod
+    def get_summary(node, kind, metric):
+        """
+        Returns the statistics of a metric of the node telemetry.
+
+        :param kind: InfoGraphNodeProperty, e.g. UTILIZATION_COMPUTE
+        :param metric: (str) column of the frame
+        :return: Accumulator, None if the node has no such metric
+        """
+        if not len(node) == 2:
+            return None
+        store = node[1].get(InfoGraphNodeProperty.TELEMETRY_STORE)
+        if store is not None:
+            return store.summary(InfoGraphNode.get_name(node), kind, metric)
+        frame = node[1].get(kind)
+        if isinstance(frame, pandas.DataFrame) and metric in frame:
+            return Accumulator().add(frame[metric].values)
+        return None
+
+    @staticmethod
+    def get_frame_view(node, kind):
+        """
+        Returns the telemetry frame of the given kind without copying it
+        out of the telemetry store. The frame must not be changed: use the
+        get_* accessors for frames to be modified and set back.
+
+        :param kind: InfoGraphNodeProperty, e.g. UTILIZATION_COMPUTE
+        """
+        if len(node) == 2:
+            store = node[1].get(InfoGraphNodeProperty.TELEMETRY_STORE)
+            if store is not None:
+                name = InfoGraphNode.get_name(node)
+                if (name, kind) in store:
+                    return store.view(name, kind)
+                return pandas.DataFrame()
+        return InfoGraphNode._get_frame(node, kind)
+
+    @staticmethod
+    def get_frame_columns(node, kind):
+        """
+        Returns the columns of the telemetry frame of the given kind,
+        without building the frame when the node has a telemetry store.
+        """
+        if len(node) == 2:
+            store = node[1].get(InfoGraphNodeProperty.TELEMETRY_STORE)
+            if store is not None:
+                return store.columns(InfoGraphNode.get_name(node), kind)
+        return list(InfoGraphNode._get_frame(node, kind).columns)
+
+    @staticmethod
+    def set_utilization_column(node, kind, column, utilization):
+        """
+        Adds or replaces a column of a utilization frame of the node. Rows
+        are aligned to the frame index and missing values are set to 0, as
+        the utilization setters do.
+
+        :param kind: InfoGraphNodeProperty, e.g. UTILIZATION_COMPUTE
+        :param column: (str) name of the column
+        :param utilization: pandas.Series
+        """
         if not len(node) == 2:
             raise ValueError("Node format is not correct.")
-        node[1][InfoGraphNodeProperty.TELEMETRY_DATA] = data
+        store = node[1].get(InfoGraphNodeProperty.TELEMETRY_STORE)
+        if store is not None and store.set_column(
+                InfoGraphNode.get_name(node), kind, column,
+                utilization.fillna(0), fill_value=0):
+            return
+        frame = InfoGraphNode._get_frame(node, kind)
+        frame[column] = utilization
+        InfoGraphNode._set_frame(node, kind, frame.fillna(0))
 
     @staticmethod
-    def get_telemetry_data(node):
-        if len(node) == 2 and InfoGraphNodeProperty.TELEMETRY_DATA in node[1]:
-            return node[1][InfoGraphNodeProperty.TELEMETRY_DATA]
+    def _get_frame(node, kind):
+        """
+        Returns the telemetry frame of the given kind, from the telemetry
+        store of the graph if the node has one.
+        """
+        if len(node) == 2:
+            store = node[1].get(InfoGraphNodeProperty.TELEMETRY_STORE)
+            if store is not None:
+                name = InfoGraphNode.get_name(node)
+                if (name, kind) in store:
+                    return store.get(name, kind)
+            elif kind in node[1]:
+                return node[1][kind]
         return pandas.DataFrame()
 
+    @staticmethod
+    def _set_frame(node, kind, data):
+        if not len(node) == 2:
+            raise ValueError("Node format is not correct.")
+        store = node[1].get(InfoGraphNodeProperty.TELEMETRY_STORE)
+        if store is not None:
+            store.set(InfoGraphNode.get_name(node), kind, data)
+        else:
+            node[1][kind] = data
+
+    @staticmethod
+    def set_telemetry_status(node, status):
+        """
+        Store whether the telemetry of the node has been retrieved.
+
+        :param node:
+        :param status: (str) one of InfoGraphTelemetryStatus
+        """
+        if not len(node) == 2:
+            raise ValueError("Node format is not correct.")
+        node[1][InfoGraphNodeProperty.TELEMETRY_STATUS] = status
+
+    @staticmethod
+    def get_telemetry_status(node):
+        if len(node) == 2 and InfoGraphNodeProperty.TELEMETRY_STATUS in node[1]:
+            return node[1][InfoGraphNodeProperty.TELEMETRY_STATUS]
+        return None
+
     @staticmethod
     def get_core_index(node):
         # TODO - Refer to the PU instead of cores
@@ -435,7 +720,7 @@ class InfoGraphNode(object):
         :return: (str)
         """
         res = ['', '']
-        ungraph = graph.to_undirected()
+        ungraph = graphs.undirected_view(graph)
 
         node_layer = InfoGraphNode.get_layer(node)
         heat_template = None
@@ -510,6 +795,32 @@ class InfoGraphUtilities():
                 res_name = "{}-{}".format(stack, vm)
                 InfoGraphNode.set_attribute(node, 'resource_name', res_name)
 
+    @staticmethod
+    def add_telemetry_store(graph):
+        """
+        Keeps the telemetry of all the nodes of the graph in a single
+        columnar store, moving there the telemetry already annotated.
+        Copies of the graph share the store instead of copying the data.
+
+        :param graph: (InfoGraph) graph
+        :return: TelemetryStore
+        """
+        store = TelemetryStore()
+        for node in graph.nodes(data=True):
+            frames = dict()
+            for kind in InfoGraphNodeProperty.TELEMETRY_FRAMES:
+                current = node[1].get(InfoGraphNodeProperty.TELEMETRY_STORE)
+                if current is not None:
+                    data = current.get(InfoGraphNode.get_name(node), kind)
+                else:
+                    data = node[1].pop(kind, None)
+                if data is not None:
+                    frames[kind] = data
+            node[1][InfoGraphNodeProperty.TELEMETRY_STORE] = store
+            for kind, data in frames.items():
+                InfoGraphNode._set_frame(node, kind, data)
+        return store
+
     @staticmethod
     def get_physical_nodes(graph):
         """
@@ -518,10 +829,8 @@ class InfoGraphUtilities():
         :return:
         """
         res = dict()
-        for node in graph.nodes(data=True):
-            node_layer = InfoGraphNode.get_layer(node)
-            if not node_layer == InfoGraphNodeLayer.PHYSICAL:
-                continue
+        for node in InfoGraphUtilities.filter_by_layer(
+                graph, InfoGraphNodeLayer.PHYSICAL):
             allocation = InfoGraphNode.get_attributes(node)['allocation']
             if allocation not in res:
                 res[allocation] = list()
@@ -542,6 +851,10 @@ class InfoGraphUtilities():
                             this layer
         :return: (list of InfoGraphNodes)
         """
+        if hasattr(graph, 'get_nodes_by_layer'):
+            # indexed InfoGraph
+            return [(node, graph.node[node])
+                    for node in graph.get_nodes_by_layer(layer)]
         res = list()
         for node in graph.nodes(data=True):
             node_layer = InfoGraphNode.get_layer(node)
@@ -562,7 +875,7 @@ class InfoGraphUtilities():
         """
         node_name = InfoGraphNode.get_name(node)
         node_layer = InfoGraphNode.get_layer(node)
-        ungraph = graph.to_undirected()
+        ungraph = graphs.undirected_view(graph)
         neighbors = ungraph.neighbors(node_name)
         for neigh in neighbors:
             neighbor = InfoGraphNode.get_node(ungraph, neigh)
@@ -588,6 +901,27 @@ class InfoGraphUtilities():
             res = string
         return res
 
+    @staticmethod
+    def parse_attributes(attributes):
+        """
+        Returns the attributes as a dictionary, parsing them if they are
+        a string, either a python literal or JSON.
+
+        :param attributes: (str or dict) attributes of a node
+        :return: (dict) None if the string cannot be parsed
+        """
+        if not isinstance(attributes, basestring):
+            return attributes
+        try:
+            return InfoGraphUtilities.str_to_dict(attributes)
+        except (ValueError, SyntaxError):
+            try:
+                return misc.convert_unicode_dict_to_string(
+                    json.loads(attributes))
+            except ValueError:
+                LOG.debug("Attributes not parsed: {}".format(attributes))
+                return None
+
     @staticmethod
     def graph_attrs_from_dict_to_str(dictionary):
         return json.dumps(dictionary)
@@ -629,8 +963,8 @@ class InfoGraphUtilities():
         """
         res = dict()
 
-        # Creates a copy of the graph which is undirected
-        undirected_graph = graph.to_undirected()
+        # Undirected view of the graph, not a copy
+        undirected_graph = graphs.undirected_view(graph)
 
         # Group by hostname
         for hostname in hostnames:
@@ -0,0 +1,348 @@
+# Copyright (c) 2017, Intel Research and Development Ireland Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = 'Giuliana Carullo'
+__copyright__ = "Copyright (c) 2017, Intel Research and Development Ireland Ltd."
+__license__ = "Apache 2.0"
+__maintainer__ = "Giuliana Carullo"
+__email__ = "giuliana.carullo@intel.com"
+__status__ = "Development"
+
+import threading
+from collections import namedtuple
+
+import numpy
+import pandas
+
+import analytics_engine.common as common
+from analytics_engine.data_analytics.accumulators import Accumulator
+
+LOG = common.LOG
+
+TIMESTAMP = 'timestamp'
+
+_MISSING = object()
+
+# Telemetry of a node, stored by columns:
+# axis: id of the shared (index, timestamps) axis
+# timestamp_pos: position of the timestamp column, None if missing
+# metrics: ids of the metric columns
+# values: float matrix, one column per metric
+# casts: (column, dtype) of the metrics which are not float
+# buffer: _Buffer whose first columns are the values, None if not appendable
+_Columns = namedtuple('_Columns',
+                      'axis timestamp_pos metrics values casts buffer')
+
+
+class _Buffer(object):
+    """
+    Matrix with spare columns, so that columns are appended without
+    copying the values. Entries are views of its first columns: only the
+    entry as wide as the used columns may append in place, the others
+    copy the values in a new buffer.
+    """
+
+    def __init__(self, values, capacity):
+        self.data = numpy.empty((values.shape[0], capacity))
+        self.data[:, :values.shape[1]] = values
+        self.used = values.shape[1]
+
+
+class TelemetryStore(object):
+    """
+    Columnar store of the telemetry of all the nodes of an InfoGraph.
+
+    Every frame (telemetry data, utilization, saturation) of a node is
+    kept as a float matrix indexed by (node, kind) whose columns are metric
+    ids. Frames of the same window share one index and timestamp axis.
+    Frames returned by get are copies, so callers can modify them freely;
+    view returns read-only frames without copying the data, and
+    set_column changes a single column without rebuilding the frame.
+
+    Copies of the graph share the store: it is copied on write, and only
+    the table of the entries is duplicated, never the data.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # axes and metrics are only appended, so copies share them
+        self._axes = list()
+        self._axis_ids = dict()
+        self._metrics = list()
+        self._metric_ids = dict()
+        self._entries = dict()
+        self._owns_entries = True
+        # (node, kind, metric): (entry, Accumulator)
+        self._summaries = dict()
+
+    def __deepcopy__(self, memo):
+        with self._lock:
+            res = TelemetryStore.__new__(TelemetryStore)
+            res._lock = self._lock
+            res._axes = self._axes
+            res._axis_ids = self._axis_ids
+            res._metrics = self._metrics
+            res._metric_ids = self._metric_ids
+            res._entries = self._entries
+            res._owns_entries = False
+            res._summaries = self._summaries
+            self._owns_entries = False
+        return res
+
+    def __getstate__(self):
+        # pipes pickle the annotated graphs
+        state = dict(self.__dict__)
+        state.pop('_lock')
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        """
+        :param key: (node name, kind)
+        """
+        return key in self._entries
+
+    def has(self, node_name, kind):
+        """
+        True if a value other than None is stored for the node.
+        """
+        return self._entries.get((node_name, kind)) is not None
+
+    def get(self, node_name, kind, default=None):
+        """
+        Returns the frame of the given kind of the node. The frame is a
+        copy: callers can change it and set it back.
+
+        :param node_name: name of the node
+        :param kind: InfoGraphNodeProperty, e.g. TELEMETRY_DATA
+        :param default: returned if nothing is stored
+        :return: pandas.DataFrame, or the stored value if it is not a frame
+        """
+        return self._frame(node_name, kind, default, True)
+
+    def view(self, node_name, kind, default=None):
+        """
+        Returns the frame of the given kind of the node, built on the
+        stored arrays without copying them. The arrays are read-only:
+        writing to them in place raises a ValueError, use get to change
+        the frame.
+        """
+        return self._frame(node_name, kind, default, False)
+
+    def _frame(self, node_name, kind, default, copy):
+        entry = self._entries.get((node_name, kind), _MISSING)
+        if entry is _MISSING:
+            return default
+        if not isinstance(entry, _Columns):
+            return entry
+        index, timestamps = self._axes[entry.axis]
+        values = entry.values.copy() if copy else _read_only(entry.values)
+        # the index is shared by the frames of the window: its name could
+        # be changed in place, its values can not
+        res = pandas.DataFrame(values, index=index.copy(),
+                               columns=[self._metrics[metric]
+                                        for metric in entry.metrics],
+                               copy=False)
+        for column, dtype in entry.casts:
+            res[column] = res[column].astype(dtype)
+        if entry.timestamp_pos is not None:
+            res.insert(entry.timestamp_pos, TIMESTAMP,
+                       timestamps.copy() if copy else _read_only(timestamps))
+        return res
+
+    def columns(self, node_name, kind):
+        """
+        Returns the names of the columns of the frame of the node, without
+        building the frame.
+        """
+        entry = self._entries.get((node_name, kind))
+        if isinstance(entry, _Columns):
+            res = [self._metrics[metric] for metric in entry.metrics]
+            if entry.timestamp_pos is not None:
+                res.insert(entry.timestamp_pos, TIMESTAMP)
+            return res
+        if isinstance(entry, pandas.DataFrame):
+            return list(entry.columns)
+        return list()
+
+    def summary(self, node_name, kind, metric):
+        """
+        Returns the statistics of a metric of the node, accumulated once
+        for each frame stored.
+
+        :return: Accumulator, None if the metric is not stored
+        """
+        entry = self._entries.get((node_name, kind))
+        key = (node_name, kind, metric)
+        with self._lock:
+            cached = self._summaries.get(key)
+        if cached is not None and cached[0] is entry:
+            return cached[1]
+        if isinstance(entry, _Columns):
+            metric_id = self._metric_ids.get(metric)
+            if metric_id is None:
+                return None
+            columns = numpy.flatnonzero(entry.metrics == metric_id)
+            if not columns.size:
+                return None
+            values = entry.values[:, columns[0]]
+        elif isinstance(entry, pandas.DataFrame) and metric in entry:
+            values = entry[metric].values
+        else:
+            return None
+        res = Accumulator().add(values)
+        with self._lock:
+            self._summaries[key] = (entry, res)
+        return res
+
+    def set(self, node_name, kind, data):
+        """
+        Stores the frame of the given kind of the node. Frames with non
+        numeric columns, and values which are not frames, are stored as
+        they are.
+        """
+        entry = data
+        if isinstance(data, pandas.DataFrame):
+            entry = self._columns(data)
+        with self._lock:
+            self._own_entries()
+            self._entries[(node_name, kind)] = entry
+
+    def set_column(self, node_name, kind, column, values, fill_value=numpy.nan):
+        """
+        Adds or replaces a column of the frame of the node. Appended
+        columns usually fill spare room of the matrix, so adding the columns
+        of a frame one at a time does not copy the whole frame every time.
+
+        :param column: name of the column
+        :param values: pandas.Series, aligned to the index of the frame
+        :param fill_value: value of the rows missing from values
+        :return: False, storing nothing, if the node has no numeric frame
+                 of the given kind
+        """
+        entry = self._entries.get((node_name, kind))
+        if not isinstance(entry, _Columns) or column == TIMESTAMP:
+            return False
+        index = self._axes[entry.axis][0]
+        values = values.reindex(index, fill_value=fill_value).values
+        with self._lock:
+            if self._entries.get((node_name, kind)) is not entry:
+                return False
+            metric = self._metric(column)
+            positions = numpy.flatnonzero(entry.metrics == metric)
+            if positions.size:
+                matrix = entry.values.copy()
+                matrix[:, positions[0]] = values
+                casts = tuple([cast for cast in entry.casts
+                               if cast[0] != column])
+                entry = entry._replace(values=matrix, casts=casts,
+                                       buffer=None)
+            else:
+                entry = TelemetryStore._append(entry, metric, values)
+            self._own_entries()
+            self._entries[(node_name, kind)] = entry
+        return True
+
+    def remove(self, node_name, kind=None):
+        """
+        Removes the frames of the node, only the given kind if not None.
+        """
+        with self._lock:
+            keys = [key for key in self._entries
+                    if key[0] == node_name and (kind is None or
+                                                key[1] == kind)]
+            if not keys:
+                return
+            self._own_entries()
+            for key in keys:
+                self._entries.pop(key)
+
+    def _own_entries(self):
+        if not self._owns_entries:
+            self._entries = dict(self._entries)
+            self._owns_entries = True
+
+    @staticmethod
+    def _append(entry, metric, values):
+        width = entry.values.shape[1]
+        buf = entry.buffer
+        if buf is None or buf.used != width or buf.data.shape[1] == width:
+            buf = _Buffer(entry.values, max(4, 2 * width))
+        buf.data[:, width] = values
+        buf.used = width + 1
+        return entry._replace(metrics=numpy.append(entry.metrics, metric),
+                              values=buf.data[:, :width + 1], buffer=buf)
+
+    def _columns(self, frame):
+        if isinstance(frame.columns, pandas.MultiIndex) or \
+                not frame.columns.is_unique:
+            return frame
+        timestamp_pos = None
+        timestamps = None
+        metrics = list()
+        casts = list()
+        for pos, (column, dtype) in enumerate(frame.dtypes.iteritems()):
+            if column == TIMESTAMP:
+                timestamp_pos = pos
+                timestamps = frame[column].values
+            elif dtype.kind in 'fiub':
+                metrics.append(column)
+                if dtype != numpy.float64:
+                    casts.append((column, dtype))
+            else:
+                # e.g. strings, kept as a frame
+                return frame
+        values = frame[metrics].values.astype(numpy.float64, copy=False) \
+            if metrics else numpy.empty((len(frame), 0))
+        with self._lock:
+            axis = self._axis(frame.index, timestamps)
+            metric_ids = numpy.array([self._metric(metric)
+                                      for metric in metrics], dtype=int)
+        return _Columns(axis, timestamp_pos, metric_ids, values,
+                        tuple(casts), None)
+
+    def _axis(self, index, timestamps):
+        key = (_array_key(index), index.name,
+               None if timestamps is None else _array_key(timestamps))
+        if key not in self._axis_ids:
+            self._axis_ids[key] = len(self._axes)
+            self._axes.append((index, None if timestamps is None
+                               else timestamps.copy()))
+        return self._axis_ids[key]
+
+    def _metric(self, metric):
+        if metric not in self._metric_ids:
+            self._metric_ids[metric] = len(self._metrics)
+            self._metrics.append(metric)
+        return self._metric_ids[metric]
+
+
+def _read_only(values):
+    # a view of the array which can not be written
+    res = values.view()
+    res.flags.writeable = False
+    return res
+
+
+def _array_key(values):
+    values = numpy.asarray(values)
+    if values.dtype.kind in 'fiubmM':
+        return values.dtype.str, values.tostring()
+    return values.dtype.str, tuple(values)
@@ -35,13 +35,17 @@ class Workload(object):
     # TODO: set ts_to default to max
     def __init__(self, workload_name, ts_from=0, ts_to=0,
                  workload_config=None, workload_config_type=None,
-                 discard=True):
+                 discard=True, resolution=None, latency_budget=None):
         """
 
         :param workload_name: (string) name of the workload
         :param ts_from: start of the workload
         :param ts_to: end of the workload
         :param discard: (bool) optional value, if true stores only the last computation results.
+        :param resolution: (int) seconds between two telemetry points. If None
+                           it is chosen automatically from the time window.
+        :param latency_budget: (int) seconds allowed to retrieve telemetry. If
+                               None telemetry of every node is waited for.
         """
         self._workload_name = workload_name
         self._workload_config = workload_config
@@ -49,6 +53,8 @@ class Workload(object):
         self._recipe = {}
         self._ts_from = ts_from
         self._ts_to = ts_to
+        self._resolution = resolution
+        self._latency_budget = latency_budget
         self._discard = discard
         self._graph = None
         self._results={}
@@ -85,6 +91,20 @@ class Workload(object):
         """
         return self._ts_to
 
+    def get_resolution(self):
+        """
+        Returns the telemetry resolution of the workload
+        :return: seconds between two points, None if automatic
+        """
+        return self._resolution
+
+    def get_latency_budget(self):
+        """
+        Returns the seconds allowed to retrieve telemetry
+        :return: latency budget, None if unbounded
+        """
+        return self._latency_budget
+
     def get_configuration(self):
         """Returns the configuration being used"""
         if self._workload_config:
@@ -19,6 +19,8 @@ __maintainer__ = "Giuliana Carullo"
 __email__ = "giuliana.carullo@intel.com"
 __status__ = "Development"
 
+import numpy
+
 from analytics_engine import common
 from analytics_engine.data_analytics.mf2c.landscape_score import LandscapeScore
 from base import Filter
@@ -63,20 +65,8 @@ class AvgHeuristicFilter(Filter):
         """
         This is a type of fingerprint from the infrastructure perspective
         """
-        avg_compute = 0
-        avg_disk=0
-        avg_network = 0
-        avg_memory = 0
-        count = 0
         stats = dict()
-        for entry in nodes.itervalues():
-            count = count + 1
-            avg_compute = avg_compute + entry['compute']
-            avg_disk = avg_disk + entry['disk']
-            avg_network = avg_network + entry['network']
-            avg_memory = avg_memory + entry['memory']
-        stats['disk'] = avg_disk/count
-        stats['compute'] = avg_compute/count
-        stats['memory'] = avg_memory/count
-        stats['network'] = avg_network/count
+        for field in ['compute', 'disk', 'memory', 'network']:
+            stats[field] = numpy.nanmean(
+                [entry[field] for entry in nodes.itervalues()])
         return stats
@@ -19,6 +19,8 @@ __maintainer__ = "Giuliana Carullo"
 __email__ = "giuliana.carullo@intel.com"
 __status__ = "Development"
 
+import heapq
+from collections import OrderedDict
 from analytics_engine import common
 from analytics_engine.data_analytics.mf2c.landscape_score import LandscapeScore
 from analytics_engine.heuristics.beans.infograph import InfoGraphNode
@@ -27,6 +29,12 @@ from analytics_engine.heuristics.filters.base import Filter
 
 LOG = common.LOG
 
+RESULT_COLUMNS = ['node_name', 'type', 'ipaddress',
+                  'compute utilization', 'compute saturation',
+                  'memory utilization', 'memory saturation',
+                  'network utilization', 'network saturation',
+                  'disk utilization', 'disk saturation']
+
 
 class OptimalFilter(Filter):
 
@@ -35,6 +43,8 @@ class OptimalFilter(Filter):
     def run(self, workload, optimal_node_type='machine'):
         """
         Ranks machines by CPU utilization.
+        If the workload configuration has a 'top_k', only the best top_k
+        nodes are returned.
 
         :param workload: Contains workload related info and results.
 
@@ -45,21 +55,23 @@ class OptimalFilter(Filter):
         if not graph:
             raise KeyError('No graph to be processed.')
 
-        scores = LandscapeScore.utilization_scores(graph)
+        utilization = LandscapeScore.utilization_table(graph)
+        scores = dict(zip(utilization['node_name'], utilization))
         scores_sat = LandscapeScore.saturation_scores(graph)
-        heuristic_results = pd.DataFrame(columns=['node_name', 'type', 'ipaddress', 
-                                                  'compute utilization', 'compute saturation',
-                                                  'memory utilization', 'memory saturation',
-                                                  'network utilization', 'network saturation',
-                                                  'disk utilization', 'disk saturation',
-                                                  ])
-        heuristic_results_nt = heuristic_results.copy()
+        columns = list(RESULT_COLUMNS)
+        # with a latency budget some nodes may have partial telemetry
+        report_status = workload.get_latency_budget() is not None
+        if report_status:
+            columns.append('telemetry status')
         device_id_col_name = None
         project = None
         if workload_config.get('project'):
             project = workload_config['project']
             device_id_col_name = workload_config['project']+'_device_id'
-            heuristic_results[device_id_col_name] = None
+            columns.append(device_id_col_name)
+        # rows are collected by column, frames are built once at the end
+        results = OrderedDict((column, list()) for column in columns)
+        results_nt = OrderedDict((column, list()) for column in columns)
 
         telemetry_filter = workload_config.get('telemetry_filter')
         for node in graph.nodes(data=True):
@@ -72,43 +84,39 @@ class OptimalFilter(Filter):
                     if vm_name:
                         list_node_name = vm_name
                 data = {'node_name': list_node_name,
-                                                    'type': node_type,
-                                                    'ipaddress': InfoGraphNode.get_attributes(node).get('ipaddress'),
-                                                    'compute utilization': scores[node_name]['compute'],
-                                                    'compute saturation': scores_sat[node_name]['compute'],
-                                                    'memory utilization': scores[node_name]['memory'],
-                                                    'memory saturation': scores_sat[node_name]['memory'],
-                                                    'network utilization': scores[node_name]['network'],
-                                                    'network saturation': scores_sat[node_name]['network'],
-                                                    'disk utilization': scores[node_name]['disk'],
-                                                    'disk saturation': scores_sat[node_name]['disk']}
+                        'type': node_type,
+                        'ipaddress': InfoGraphNode.get_attributes(node).get('ipaddress'),
+                        'compute utilization': scores[node_name]['compute'],
+                        'compute saturation': scores_sat[node_name]['compute'],
+                        'memory utilization': scores[node_name]['memory'],
+                        'memory saturation': scores_sat[node_name]['memory'],
+                        'network utilization': scores[node_name]['network'],
+                        'network saturation': scores_sat[node_name]['network'],
+                        'disk utilization': scores[node_name]['disk'],
+                        'disk saturation': scores_sat[node_name]['disk']}
                 if device_id_col_name:
                     dev_id = InfoGraphNode.get_properties(node).get(device_id_col_name)
                     if project == 'mf2c':
                         dev_id = dev_id.replace('_', '-')
                     data[device_id_col_name] = dev_id
-                if InfoGraphNode.get_properties(node).get("telemetry_data") is not None:
-                    heuristic_results = heuristic_results.append(data,
-                                                        ignore_index=True)
+                if report_status:
+                    data['telemetry status'] = \
+                        InfoGraphNode.get_telemetry_status(node)
+                if InfoGraphNode.has_telemetry_data(node):
+                    OptimalFilter._add_row(results, data)
                 elif not telemetry_filter:
-                    heuristic_results_nt = heuristic_results.append(data,
-                                                        ignore_index=True)
+                    OptimalFilter._add_row(results_nt, data)
 
             if not workload.get_workload_name().startswith('optimal_'):
                 if InfoGraphNode.get_type(node) == "docker_container" and optimal_node_type == 'machine':
                     node_name = InfoGraphNode.get_docker_id(node)
-                    heuristic_results = heuristic_results.append({'node_name': node_name,
-                                                    'type': node_type,
-                                                    'ipaddress': None,
-                                                    'compute utilization': scores[node_name]['compute'],
-                                                    'compute saturation': None,
-                                                    'memory utilization': scores[node_name]['memory'],
-                                                    'memory saturation': None,
-                                                    'network utilization': scores[node_name]['network'],
-                                                    'network saturation': None,
-                                                    'disk utilization': scores[node_name]['disk'],
-                                                    'disk saturation': None},
-                                                    ignore_index=True)
+                    OptimalFilter._add_row(results, {
+                        'node_name': node_name,
+                        'type': node_type,
+                        'compute utilization': scores[node_name]['compute'],
+                        'memory utilization': scores[node_name]['memory'],
+                        'network utilization': scores[node_name]['network'],
+                        'disk utilization': scores[node_name]['disk']})
         sort_fields = ['compute utilization']
         sort_order = workload_config.get('sort_order')
         if sort_order:
@@ -122,13 +130,42 @@ class OptimalFilter(Filter):
                     sort_fields.append('network utilization')
                 if val == 'disk':
                     sort_fields.append('disk utilization')
+        top_k = workload_config.get('top_k')
+        if top_k is not None:
+            top_k = int(top_k)
+            results = OptimalFilter._top_k(results, sort_fields, top_k)
+            results_nt = OrderedDict(
+                (column, values[:max(0, top_k - len(results['node_name']))])
+                for column, values in results_nt.items())
+        heuristic_results_nt = pd.DataFrame(results_nt, columns=columns)
         heuristic_results_nt = heuristic_results_nt.replace([0], [None])
-        heuristic_results = heuristic_results.sort_values(by=sort_fields, ascending=True)
+        heuristic_results = pd.DataFrame(results, columns=columns)
+        if top_k is None:
+            heuristic_results = heuristic_results.sort_values(by=sort_fields, ascending=True)
         heuristic_results = heuristic_results.append(heuristic_results_nt, ignore_index=True)
         workload.append_metadata(self.__filter_name__, heuristic_results)
         LOG.info('AVG: {}'.format(heuristic_results))
         return heuristic_results
 
+    @staticmethod
+    def _add_row(results, data):
+        for column, values in results.items():
+            values.append(data.get(column))
 
+    @staticmethod
+    def _top_k(results, sort_fields, top_k):
+        """
+        Returns the top_k rows with the lowest sort fields, sorted, as
+        sort_values does: nan values go last and ties keep their order.
 
-
+        :param results: dict of the columns
+        :return: dict of the selected columns
+        """
+        keys = zip(*[results[field] for field in sort_fields])
+
+        def sort_key(row):
+            return [(True, 0) if value is None or value != value
+                    else (False, value) for value in keys[row]]
+        rows = heapq.nsmallest(top_k, range(len(keys)), key=sort_key)
+        return OrderedDict((column, [values[row] for row in rows])
+                           for column, values in results.items())
@@ -36,13 +36,14 @@ class SubgraphAnnotatedFilter(Filter):
     """
     __filter_name__ = 'subgraph_annotated_filter'
 
-    def run(self, workload, telemetry_type = "snap"):
+    def run(self, workload, telemetry_type = "snap", aggregate=False):
         """
         Annotates subgraph present in metadata with telemetry
 
          Add the output of the calculation to the metadata as output
 
         :param workload: Contains workload related info and results.
+        :param aggregate: if True only time window aggregates are retrieved
         :return: subgraph
         """
         
@@ -50,7 +51,9 @@ class SubgraphAnnotatedFilter(Filter):
         if not graph:
             raise KeyError()
         subgraph = SubgraphUtilities.graph_telemetry_annotation(
-                        graph, workload.get_ts_from(), workload.get_ts_to(), telemetry_type)
+                        graph, workload.get_ts_from(), workload.get_ts_to(), telemetry_type,
+                        aggregate, workload.get_resolution(),
+                        workload.get_latency_budget())
 
         workload.save_results(self.__filter_name__, subgraph)
         return subgraph
@@ -22,13 +22,11 @@ __status__ = "Development"
 from analytics_engine import common
 # from analytics.info_core import InfoGraph
 from analytics_engine.heuristics.filters.telemetry_annotation import TelemetryAnnotation as TA
-from analytics_engine.heuristics.filters.parallelized_telemetry_annotation import TelemetryAnnotation as PTA
 from analytics_engine.heuristics.infrastructure.topology.lib_analytics import SubgraphUtilities
 from base import Filter
 
 LOG = common.LOG
 
-PARALLEL = True
 class SubgraphFilteredTelemetryFilter(Filter):
 
     __filter_name__ = 'subgraph_filtered_telemetry_filter'
@@ -19,13 +19,16 @@ __maintainer__ = "Giuliana Carullo"
 __email__ = "giuliana.carullo@intel.com"
 __status__ = "Development"
 
+import numpy
 import pandas
 from analytics_engine import common
 from analytics_engine.heuristics.beans.infograph import \
-    InfoGraphNode, InfoGraphUtilities, InfoGraphNodeType, InfoGraphNodeLayer
+    InfoGraphNode, InfoGraphUtilities, InfoGraphNodeType, InfoGraphNodeLayer, \
+    InfoGraphNodeProperty
 from analytics_engine.heuristics.infrastructure.telemetry.snap_telemetry.snap_graph_telemetry import SnapAnnotation
 from analytics_engine.heuristics.infrastructure.telemetry.prometheus.prometheus_annotation import PrometheusAnnotation
 from analytics_engine.heuristics.infrastructure.telemetry.snap_telemetry.snap_utils import SnapUtils
+import analytics_engine.heuristics.infrastructure.telemetry.utils as tm_utils
 from analytics_engine.utilities import misc
 
 LOG = common.LOG
@@ -70,25 +73,21 @@ class TelemetryAnnotation(object):
         TelemetryAnnotation._get_annotated_graph_input_validation(
             graph, ts_from, ts_to)
         internal_graph = graph.copy()
+        InfoGraphUtilities.add_telemetry_store(internal_graph)
         self.internal_graph = internal_graph
+        if self.telemetry:
+            self.telemetry.reset()
+        if isinstance(self.telemetry, SnapAnnotation):
+            self._plan_snap_queries(internal_graph, ts_from, ts_to)
         for node in internal_graph.nodes(data=True):
             if isinstance(self.telemetry, SnapAnnotation):
-                queries = list()
-                try:
-                    queries = self.telemetry.get_queries(internal_graph, node, ts_from, ts_to)
-                    # queries = self.telemetry.get_queries(graph, node, ts_from, ts_to)
-                except Exception as e:
-                    LOG.error("Exception: {}".format(e))
-                    LOG.error(e)
-                    import traceback
-                    traceback.print_exc()
+                queries = InfoGraphNode.get_queries(node) or list()
                 if len(queries) != 0:
-                    InfoGraphNode.set_queries(node, queries)
-
                     telemetry_data = self.telemetry.get_data(node)
                     InfoGraphNode.set_telemetry_data(node, telemetry_data)
                     if utilization and not telemetry_data.empty:
-                        SnapUtils.utilization(internal_graph, node, self.telemetry)
+                        SnapUtils.utilization(internal_graph, node, self.telemetry,
+                                              telemetry_data)
                         # if only procfs is available, results needs to be
                         # propagated at machine level
                         if InfoGraphNode.get_type(node) == InfoGraphNodeType.PHYSICAL_PU:
@@ -98,7 +97,8 @@ class TelemetryAnnotation(object):
                         if InfoGraphNode.node_is_nic(node):
                             SnapUtils.annotate_machine_network_util(internal_graph, node)
                     if saturation:
-                        SnapUtils.saturation(internal_graph, node, self.telemetry)
+                        SnapUtils.saturation(internal_graph, node, self.telemetry,
+                                             telemetry_data)
             elif isinstance(self.telemetry, PrometheusAnnotation):
                 queries = list()
                 try:
@@ -130,16 +130,19 @@ class TelemetryAnnotation(object):
                 telemetry_data = self.telemetry.get_data(node)
                 InfoGraphNode.set_telemetry_data(node, telemetry_data)
                 if utilization and not telemetry_data.empty:
-                    SnapUtils.utilization(internal_graph, node, self.telemetry)
+                    SnapUtils.utilization(internal_graph, node, self.telemetry,
+                                          telemetry_data)
                     # if only procfs is available, results needs to be
                     # propagated at machine level
                     if InfoGraphNode.get_type(node) == InfoGraphNodeType.PHYSICAL_PU:
                         source = InfoGraphNode.get_machine_name_of_pu(node)
                         machine = InfoGraphNode.get_node(internal_graph, source)
-                        machine_util = InfoGraphNode.get_compute_utilization(machine)
+                        machine_util = InfoGraphNode.get_frame_view(
+                            machine, InfoGraphNodeProperty.UTILIZATION_COMPUTE)
                         if '/intel/use/compute/utilization' not in machine_util.columns:
                             sum_util = None
-                            pu_util = InfoGraphNode.get_compute_utilization(node)[
+                            pu_util = InfoGraphNode.get_frame_view(
+                                node, InfoGraphNodeProperty.UTILIZATION_COMPUTE)[
                                     'intel/procfs/cpu/utilization_percentage']
                             pu_util = pu_util.fillna(0)
                             if 'intel/procfs/cpu/utilization_percentage' in machine_util.columns:
@@ -159,6 +162,26 @@ class TelemetryAnnotation(object):
                     self._saturation(internal_graph, node, self.telemetry)
         return internal_graph
 
+    def _plan_snap_queries(self, internal_graph, ts_from, ts_to):
+        """
+        Sets the queries on every node of the graph and prefetches their
+        data, merging duplicated queries and querying each source host once.
+        """
+        graph_queries = list()
+        for node in internal_graph.nodes(data=True):
+            queries = list()
+            try:
+                queries = self.telemetry.get_queries(internal_graph, node, ts_from, ts_to)
+            except Exception as e:
+                LOG.error("Exception: {}".format(e))
+                LOG.error(e)
+                import traceback
+                traceback.print_exc()
+            if len(queries) != 0:
+                InfoGraphNode.set_queries(node, queries)
+                graph_queries.extend(queries)
+        self.telemetry.prefetch(graph_queries)
+
     @staticmethod
     def get_pandas_df_from_graph(graph, metrics='all'):
         return TelemetryAnnotation._create_pandas_data_frame_from_graph(
@@ -189,14 +212,16 @@ class TelemetryAnnotation(object):
     @staticmethod
     def _create_pandas_data_frame_from_graph(graph, metrics='all'):
         """
-        Save on csv files the data in the graph.
-        Stores one csv per node of the graph
+        Returns a data frame with the telemetry of all the nodes of the
+        graph, aligned on the timestamps. Columns are named as
+        node@layer@type@metric.
 
-        :param graph: (NetworkX Graph) Graph to be annotated with data
-        :param directory: (str) directory where to store csv files
-        :return: NetworkX Graph annotated with telemetry data
+        :param graph: (NetworkX Graph) Graph annotated with telemetry data
+        :param metrics: metric type to be considered. default = all
+        :return: pandas.DataFrame
         """
-        result = pandas.DataFrame()
+        names = list()
+        series = list()
         for node in graph.nodes(data=True):
             node_name = InfoGraphNode.get_name(node)
             node_layer = InfoGraphNode.get_layer(node)
@@ -209,51 +234,34 @@ class TelemetryAnnotation(object):
             # This method supports export of either normal metrics coming
             #  from telemetry agent or utilization type of metrics.
             if metrics == 'all':
-                node_telemetry_data = InfoGraphNode.get_telemetry_data(node)
+                node_telemetry_data = InfoGraphNode.get_frame_view(
+                    node, InfoGraphNodeProperty.TELEMETRY_DATA)
             else:
                 node_telemetry_data = InfoGraphNode.get_utilization(node)
-            # df = node_telemetry_data.copy()
 
-            # LOG.info("Node Name: {} -- Telemetry: {}".format(
-            #     InfoGraphNode.get_name(node),
-            #     InfoGraphNode.get_telemetry_data(node).columns.values
-            # ))
             if isinstance(node_telemetry_data, pandas.DataFrame):
                 if node_telemetry_data.empty:
                     continue
                 node_telemetry_data = node_telemetry_data.reset_index()
             else:
                 continue
-            node_telemetry_data['timestamp'] = node_telemetry_data['timestamp'].astype(
-                float)
-            node_telemetry_data['timestamp'] = node_telemetry_data['timestamp'].round()
-            node_telemetry_data['timestamp'] = node_telemetry_data['timestamp'].astype(
-                int)
-            renames = {}
-            for metric_name in node_telemetry_data.columns.values:
-                if metric_name == 'timestamp':
-                    continue
-                col_name = "{}@{}@{}@{}".\
-                    format(node_name, node_layer, node_type, metric_name)
-                col_name = col_name.replace(".", "_")
-                renames[metric_name] = col_name
-            node_telemetry_data = node_telemetry_data.rename(
-                columns=renames)
-
-                # LOG.info("TELEMETRIA: {}".format(node_telemetry_data.columns.values))
-
-            if node_telemetry_data.empty or len(node_telemetry_data.columns) <= 1:
+            metric_names = [metric_name for metric_name
+                            in node_telemetry_data.columns.values
+                            if metric_name != 'timestamp']
+            if not metric_names:
                 continue
-            if result.empty:
-                result = node_telemetry_data.copy()
-            else:
-                node_telemetry_data = \
-                    node_telemetry_data.drop_duplicates(subset='timestamp')
-                result = pandas.merge(result, node_telemetry_data, how='outer',
-                                      on='timestamp')
-            # TODO: Try with this removed
-            # result.set_index(['timestamp'])
-        return result
+            timestamps = numpy.round(
+                node_telemetry_data['timestamp'].values.astype(float)).\
+                astype(numpy.int64)
+            names.extend(["{}@{}@{}@{}".
+                          format(node_name, node_layer, node_type,
+                                 metric_name).replace(".", "_")
+                          for metric_name in metric_names])
+            series.append((timestamps,
+                           node_telemetry_data[metric_names].values))
+        if not series:
+            return pandas.DataFrame()
+        return tm_utils.aligned_dataframe(series, names)
 
     @staticmethod
     def get_metrics(graph, metrics='all'):
@@ -271,7 +279,8 @@ class TelemetryAnnotation(object):
             # This method supports export of either normal metrics coming
             #  from telemetry agent or utilization type of metrics.
             if metrics == 'all':
-                node_telemetry_data = InfoGraphNode.get_telemetry_data(node)
+                node_telemetry_data = InfoGraphNode.get_frame_view(
+                    node, InfoGraphNodeProperty.TELEMETRY_DATA)
             else:
                 node_telemetry_data = InfoGraphNode.get_utilization(node)
 
@@ -318,21 +327,23 @@ class TelemetryAnnotation(object):
                 str(misc.convert_unicode_dict_to_string(node[1]['attributes'])).\
                     replace("'", '"')
 
+        to_filter = list()
         for node in res.nodes(data=True):
             node_name = InfoGraphNode.get_name(node)
-            telemetry = InfoGraphNode.get_telemetry_data(node)
+            columns = InfoGraphNode.get_frame_columns(
+                node, InfoGraphNodeProperty.TELEMETRY_DATA)
             layer = InfoGraphNode.get_layer(node)
             # if len(telemetry.columns.values) <= 1:
 
-            if len(telemetry.columns) <= 1 and \
+            if len(columns) <= 1 and \
                     not layer == InfoGraphNodeLayer.SERVICE:
                 InfoGraphNode.set_telemetry_data(node, dict())
-                res.filter_nodes('node_name', node_name)
+                to_filter.append(node_name)
+        res.contract_nodes(res.select_nodes_in('node_name', to_filter))
 
         # Convert attributes back to dict()
         for node in res.nodes(data=True):
-            string = InfoGraphNode.get_attributes(node)
-            attrs = InfoGraphUtilities.str_to_dict(string)
+            attrs = dict(InfoGraphNode.get_attributes(node))
             if InfoGraphNode.get_type(node) == \
                     InfoGraphNodeType.SERVICE_COMPUTE:
                 attrs['template'] = \
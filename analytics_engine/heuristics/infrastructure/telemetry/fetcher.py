@@ -0,0 +1,241 @@
+# Copyright (c) 2017, Intel Research and Development Ireland Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Bounded concurrency fetch engine for the telemetry backends.
+"""
+
+__author__ = 'Giuliana Carullo'
+__copyright__ = "Copyright (c) 2017, Intel Research and Development Ireland Ltd."
+__license__ = "Apache 2.0"
+__maintainer__ = "Giuliana Carullo"
+__email__ = "giuliana.carullo@intel.com"
+__status__ = "Development"
+
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+from analytics_engine import common
+from analytics_engine.infrastructure_manager.config_helper import ConfigHelper
+
+LOG = common.LOG
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_TIMEOUT = 30
+
+# Config sections of the supported backends
+BACKEND_SECTIONS = {'snap': 'SNAP', 'prometheus': 'PROMETHEUS'}
+
+_POOLS = dict()
+_POOLS_LOCK = threading.Lock()
+
+
+class _Pool(object):
+    """
+    Thread pool of a backend, with the number of its requests in flight:
+    requests are only submitted when a thread is free, so requests given
+    up by an annotation never queue ahead of the following ones.
+    """
+
+    def __init__(self, concurrency):
+        self.threads = ThreadPool(concurrency)
+        self.limit = concurrency
+        self.in_flight = 0
+        # notified whenever a request starts or finishes
+        self.changed = threading.Condition()
+
+
+class _Request(object):
+    """
+    Single attempt of a request, run at most once by the pool. Cancelled
+    requests which did not start yet are skipped.
+    """
+
+    def __init__(self, pool, func, item):
+        self.pool = pool
+        self.func = func
+        self.item = item
+        self.cancelled = False
+        self.started = None
+        self.finished = False
+        self.result = None
+        self.error = None
+
+    @property
+    def successful(self):
+        return self.finished and self.started is not None and \
+            self.error is None
+
+    def run(self):
+        try:
+            with self.pool.changed:
+                if self.cancelled:
+                    return
+                self.started = time.time()
+                self.pool.changed.notify_all()
+            try:
+                self.result = self.func(self.item)
+            except Exception as e:
+                self.error = e
+        finally:
+            with self.pool.changed:
+                self.finished = True
+                self.pool.in_flight -= 1
+                self.pool.changed.notify_all()
+
+
+class TelemetryFetcher(object):
+    """
+    Runs telemetry requests on a work queue served by a thread pool shared
+    by all the annotations using the same backend. The size of the pool
+    bounds the number of requests in flight to the backend, and every
+    request has its own deadline, so a slow node does not hold back others.
+    Requests issued from within a pool task must use a differently named
+    pool, as waiting on the same pool could exhaust its threads.
+    """
+
+    def __init__(self, backend, name=None):
+        self.backend = backend
+        self.name = name
+        self.concurrency = TelemetryFetcher._get_conf(
+            backend, 'concurrency', DEFAULT_CONCURRENCY)
+        self.timeout = TelemetryFetcher._get_conf(
+            backend, 'request_timeout', DEFAULT_TIMEOUT)
+        self.pool = TelemetryFetcher._get_pool((backend, name),
+                                              self.concurrency)
+
+    def map(self, func, items, timeout=None, deadline=None, hedge_after=None):
+        """
+        Applies func to every item using the backend pool.
+
+        :param func: function to be applied
+        :param items: list of arguments, one per request
+        :param timeout: seconds a request is allowed to run; defaults to the
+                        request_timeout of the backend
+        :param deadline: epoch time by which all the results are due.
+                         Requests not done by the deadline are given up.
+        :param hedge_after: seconds after which a duplicate of a request
+                            still running is sent, if a thread is free; the
+                            first answer is used
+        :return: list of results, in the same order as the items. The result
+                 is None when the request failed or missed its deadline.
+        """
+        timeout = timeout or self.timeout
+        pool = self.pool
+        # attempts of every item, more than one when hedged
+        attempts = [list() for _ in items]
+        results = [None] * len(items)
+        waiting = list(reversed(range(len(items))))
+        pending = set(range(len(items)))
+        with pool.changed:
+            while pending:
+                now = time.time()
+                while waiting and pool.in_flight < pool.limit:
+                    i = waiting.pop()
+                    attempts[i].append(self._submit(func, items[i]))
+                for i in list(pending):
+                    state = self._check(items[i], attempts[i], now, timeout,
+                                        deadline)
+                    if state is None:
+                        if hedge_after and len(attempts[i]) == 1 and \
+                                attempts[i][0].started and \
+                                now - attempts[i][0].started > hedge_after \
+                                and pool.in_flight < pool.limit:
+                            LOG.debug('Hedging {} request for {}'.format(
+                                self.backend, items[i]))
+                            attempts[i].append(self._submit(func, items[i]))
+                        continue
+                    pending.discard(i)
+                    if i in waiting:
+                        waiting.remove(i)
+                    results[i] = state[0]
+                    # the losing or abandoned attempts are not started
+                    for request in attempts[i]:
+                        request.cancelled = True
+                if pending:
+                    pool.changed.wait(self._wait_time(
+                        [attempts[i] for i in pending], now, timeout,
+                        deadline, hedge_after))
+        return results
+
+    def _submit(self, func, item):
+        """
+        Submits an attempt, the lock of the pool must be held.
+        """
+        request = _Request(self.pool, func, item)
+        self.pool.in_flight += 1
+        self.pool.threads.apply_async(request.run)
+        return request
+
+    def _check(self, item, attempts, now, timeout, deadline):
+        """
+        Returns a (result,) tuple once the item is settled, None if it is
+        still waiting for one of its attempts.
+        """
+        for request in attempts:
+            if request.successful:
+                return request.result,
+        running = [request for request in attempts if not request.finished]
+        if attempts and not running:
+            LOG.error('{} request for {} failed'.format(self.backend, item))
+            LOG.error(attempts[0].error)
+            return None,
+        if deadline and now > deadline:
+            LOG.error('{} request for {} missed the deadline'.format(
+                self.backend, item))
+            return None,
+        # The threads cannot be stopped: they will be released by the
+        # timeout of the underlying client.
+        if running and all([request.started and
+                            now - request.started > timeout
+                            for request in running]):
+            LOG.error('{} request for {} missed its deadline of {}s'.
+                      format(self.backend, item, timeout))
+            return None,
+        return None
+
+    @staticmethod
+    def _wait_time(pending_attempts, now, timeout, deadline, hedge_after):
+        """
+        Returns the seconds until the next timeout, deadline or hedge of the
+        pending requests, None if only their completion is awaited.
+        """
+        events = [deadline] if deadline else list()
+        for attempts in pending_attempts:
+            for request in attempts:
+                if request.started and not request.finished:
+                    events.append(request.started + timeout)
+                    if hedge_after and len(attempts) == 1:
+                        events.append(request.started + hedge_after)
+        # past events, e.g. hedges waiting for a free thread, wait for
+        # the next change of the pool
+        events = [event for event in events if event > now]
+        if not events:
+            return None
+        return min(events) - now
+
+    @staticmethod
+    def _get_pool(key, concurrency):
+        with _POOLS_LOCK:
+            if key not in _POOLS:
+                _POOLS[key] = _Pool(concurrency)
+            return _POOLS[key]
+
+    @staticmethod
+    def _get_conf(backend, attribute, default):
+        try:
+            return int(ConfigHelper.get(BACKEND_SECTIONS[backend], attribute))
+        except Exception:
+            return default
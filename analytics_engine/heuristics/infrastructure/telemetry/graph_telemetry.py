@@ -26,13 +26,15 @@ class GraphTelemetry(object):
     telemetry system.
     """
 
-    def get_queries(self, graph, node, ts_from, ts_to):
+    def get_queries(self, graph, node, ts_from, ts_to, resolution=None):
         """
         Returns a list of queries to get telemetry data related to the node
 
         :param node: InfoGraph node
         :param ts_from: (str) epoch representing start time
         :param ts_to: (str) epoch representing stop time
+        :param resolution: (int) seconds between two points. If None it is
+                           chosen to cap the number of points per series.
         :return: (str)
         """
         raise NotImplementedError()
@@ -46,3 +48,10 @@ class GraphTelemetry(object):
         :return: pandas.DataFrame
         """
         raise NotImplementedError()
+
+    def reset(self):
+        """
+        Drops the data memoized for the nodes during the previous
+        annotation run.
+        """
+        self.node_data = dict()
@@ -19,29 +19,35 @@ __maintainer__ = "Giuliana Carullo"
 __email__ = "giuliana.carullo@intel.com"
 __status__ = "Development"
 
+import math
 import traceback
 import sys
+from collections import OrderedDict
 #from IPy import IP
 import pandas
 import requests
 from analytics_engine import common
 from analytics_engine.infrastructure_manager.config_helper import ConfigHelper
+from analytics_engine.infrastructure_manager import clients
 from analytics_engine.heuristics.beans.infograph import InfoGraphNode
 from analytics_engine.heuristics.beans.infograph import InfoGraphNodeLayer
 from analytics_engine.heuristics.beans.infograph import InfoGraphNodeLayer as GRAPH_LAYER
 from analytics_engine.heuristics.beans.infograph import InfoGraphNodeType as NODE_TYPE
 from analytics_engine.heuristics.infrastructure.telemetry.graph_telemetry import GraphTelemetry
 import analytics_engine.heuristics.infrastructure.telemetry.utils as tm_utils
+from analytics_engine.heuristics.infrastructure.telemetry.fetcher import TelemetryFetcher
+from analytics_engine.heuristics.infrastructure.telemetry.series_cache import get_series_cache
 from metric_conf import NODE_TO_METRIC_TAGS
 from metric_conf import NODE_METRICS
 
+# maximum number of points per series Prometheus returns in a request
 PROMETHEUS_TS_LIMIT = 11000
 
 LOG = common.LOG
 
 class PrometheusAnnotation(GraphTelemetry):
 
-    def __init__(self):
+    def __init__(self, aggregate=False):
         PROMETHEUS_HOST = ConfigHelper.get("PROMETHEUS", "PROMETHEUS_HOST")
         PROMETHEUS_PORT = ConfigHelper.get("PROMETHEUS", "PROMETHEUS_PORT")
         PrometheusAnnotation._validateIPAddress(PROMETHEUS_HOST)
@@ -49,13 +55,32 @@ class PrometheusAnnotation(GraphTelemetry):
         self.tsdb_ip = PROMETHEUS_HOST
         self.tsdb_port = PROMETHEUS_PORT
         self.metrics = {}
+        self.node_data = {}
+        try:
+            self.max_points = int(ConfigHelper.get("PROMETHEUS", "max_points"))
+        except Exception:
+            self.max_points = PROMETHEUS_TS_LIMIT
+        # if True only the window average of each metric is retrieved
+        self.aggregate = aggregate
+        # sub-requests are issued from within the annotation pool
+        self.subrequest_fetcher = TelemetryFetcher('prometheus',
+                                                   name='subrequests')
+        self.timeout = self.subrequest_fetcher.timeout
+        self.session = clients.get_session('prometheus')
 
     def get_data(self, node):
         """
-        Return telemetry data for the specified node
+        Return telemetry data for the specified node. Data is fetched once
+        per annotation run and memoized.
         :param node: InfoGraph node
         :return: pandas.DataFrame
         """
+        name = InfoGraphNode.get_name(node)
+        if name not in self.node_data:
+            self.node_data[name] = self._get_node_data(node)
+        return self.node_data[name]
+
+    def _get_node_data(self, node):
         queries = InfoGraphNode.get_queries(node)
         ret_val = pandas.DataFrame()
         try:
@@ -70,13 +95,19 @@ class PrometheusAnnotation(GraphTelemetry):
 
         return ret_val
 
-    def get_queries(self, graph, node, ts_from, ts_to):
+    def get_queries(self, graph, node, ts_from, ts_to, resolution=None):
         """
-        :param graph:
-        :param node:
-        :param ts_from:
-        :param ts_to:
-        :return:
+        Returns the queries retrieving the telemetry of a node. Metrics
+        sharing the same label selectors are requested together, so a node
+        usually needs a single query.
+
+        :param graph: InfoGraph
+        :param node: InfoGraph node
+        :param ts_from: (int) epoch start time
+        :param ts_to: (int) epoch end time
+        :param resolution: (int) query step in seconds. If None it is chosen
+                           from the window length and the points budget.
+        :return: list of dictionaries, mapping a name to each query
         """
         node_name = InfoGraphNode.get_name(node)
         node_layer = InfoGraphNode.get_layer(node)
@@ -85,38 +116,180 @@ class PrometheusAnnotation(GraphTelemetry):
         if node_layer == InfoGraphNodeLayer.SERVICE:
             return queries
 
+        # label selectors -> metrics
+        groups = OrderedDict()
         for metric in self._get_metrics(node):
             try:
-                query = self._build_query(metric, node, ts_from, ts_to)
+                selectors = self._get_query_selectors(metric, node)
             except Exception as e:
                 LOG.error('Exception for metric: {}'.format(metric))
-            queries.append({"{}_{}".format(metric, node_name): query})
+                continue
+            groups.setdefault(selectors, list()).append(metric)
+
+        for i, (selectors, metrics) in enumerate(groups.items()):
+            query = self._build_query(metrics, selectors, ts_from, ts_to,
+                                      resolution)
+            queries.append({"{}_{}".format(node_name, i): query})
 
         return queries
 
-    def _build_query(self, metric, node, ts_from, ts_to):
+    def _build_query(self, metrics, selectors, ts_from, ts_to,
+                     resolution=None):
         """
-        Return queries to use for telemetry for the specific node.
-        :param metric: the metric on which to build this query
-        :param node: the node
+        Return a query retrieving several metrics with the same label
+        selectors.
+        :param metrics: the metrics on which to build this query
+        :param selectors: label selectors of the metrics
         :param ts_from: timestamp from
         :param ts_to: timestamp to
-        :return: an individual query URL string
+        :param resolution: query step, if None it is chosen automatically
+        :return: an individual query, as a dictionary with the selector,
+                 the time range and the step
         """
-        resolution = ts_to - ts_from
-        if resolution > PROMETHEUS_TS_LIMIT:
-            ts_from = ts_to - PROMETHEUS_TS_LIMIT
+        query_selector = '{{__name__=~"{}"{}{}}}'.format(
+            '|'.join(metrics), ',' if selectors else '', selectors)
+
+        query = dict()
+        query['selector'] = query_selector
+        query['ts_from'] = ts_from
+        query['ts_to'] = ts_to
+        query['step'] = resolution or self._step(ts_from, ts_to)
+        query['metrics'] = metrics
+        query['labels'] = selectors
+        query['aggregate'] = self.aggregate
+        return query
 
-        query_head = "http://{}:{}/api/v1/query_range?query=".format(
-            self.tsdb_ip, self.tsdb_port)
-        query_times = "&start={}&end={}&step=1s".format(ts_from, ts_to)
+    def _step(self, ts_from, ts_to):
+        """
+        Returns the step, in seconds, keeping the number of points of each
+        series within the points budget.
+        """
+        return max(1, int(math.ceil(float(ts_to - ts_from) / self.max_points)))
 
-        query_selectors = self._get_query_selectors(metric, node)
-        query_selector = '{}{{{}}}'.format(metric, query_selectors)
+    def _api_url(self, endpoint):
+        """
+        Returns the URL of an endpoint of the Prometheus HTTP API. Queries
+        are passed as request parameters, so that they are URL encoded.
 
-        query = "{}{}{}".format(query_head, query_selector, query_times)
-        return query
+        :param endpoint: 'query' or 'query_range'
+        """
+        return "http://{}:{}/api/v1/{}".format(self.tsdb_ip, self.tsdb_port,
+                                               endpoint)
 
+    def _query_range(self, query):
+        """
+        Runs a query_range request. Only the time ranges not already
+        available in the series cache are requested to Prometheus. Ranges
+        having more points than Prometheus allows per request are split in
+        sub-ranges, fetched concurrently and stitched back together.
+
+        :param query: query as built by _build_query
+        :return: the query_range response, as a dictionary
+        """
+        step = query['step']
+
+        def fetch_range(time_range):
+            ts_from, ts_to = time_range
+            req = self.session.get(
+                self._api_url('query_range'),
+                params={'query': query['selector'], 'start': ts_from,
+                        'end': ts_to, 'step': '{}s'.format(step)},
+                timeout=self.timeout)
+            if req.status_code != 200:
+                raise ValueError("Query failed with status {}".format(
+                    req.status_code))
+            result = req.json()
+            if result['status'] != 'success':
+                raise ValueError("Query failed: {}".format(result))
+            # flattening series as (timestamp, labels, value) points
+            points = list()
+            for result_metric in result['data']['result']:
+                labels = tuple(sorted(result_metric['metric'].items()))
+                for ts, val in result_metric['values']:
+                    points.append((ts, labels, val))
+            return points
+
+        def fetch(ts_from, ts_to):
+            ranges = PrometheusAnnotation._split_range(ts_from, ts_to, step)
+            if len(ranges) == 1:
+                return fetch_range(ranges[0])
+            results = self.subrequest_fetcher.map(fetch_range, ranges)
+            if None in results:
+                raise ValueError("Query failed for some of the ranges "
+                                 "of {}".format(query['selector']))
+            return [point for points in results for point in points]
+
+        # points are evaluated at ts_from + k * step: windows sharing the
+        # grid share the cached points and deltas are fetched on the grid
+        ts_from = int(query['ts_from'])
+        origin = ts_from % step
+        points = get_series_cache('prometheus').get(
+            (query['selector'], step, origin),
+            ts_from, int(query['ts_to']), fetch, step=step, origin=origin)
+        series = dict()
+        for ts, labels, val in points:
+            series.setdefault(labels, list()).append([ts, val])
+        return {'status': 'success',
+                'data': {'resultType': 'matrix',
+                         'result': [{'metric': dict(labels), 'values': values}
+                                    for labels, values in series.items()]}}
+
+    def _query_aggregate(self, query):
+        """
+        Runs an avg_over_time instant query per metric, at the end of the
+        time window. Functions drop the metric name, so metrics are not
+        requested together but concurrently.
+
+        :param query: query as built by _build_query
+        :return: the window averages as a query_range response, with one
+                 point per series
+        """
+        window = max(1, int(query['ts_to']) - int(query['ts_from']))
+        url = self._api_url('query')
+
+        def fetch(metric):
+            expression = 'avg_over_time({}{{{}}}[{}s])'.format(
+                metric, query['labels'], window)
+            req = self.session.get(
+                url, params={'query': expression, 'time': query['ts_to']},
+                timeout=self.timeout)
+            if req.status_code != 200:
+                raise ValueError("Query failed with status {}".format(
+                    req.status_code))
+            result = req.json()
+            if result['status'] != 'success':
+                raise ValueError("Query failed: {}".format(result))
+            return result['data']['result']
+
+        series = list()
+        results = self.subrequest_fetcher.map(fetch, query['metrics'])
+        for metric, result in zip(query['metrics'], results):
+            if result is None:
+                LOG.error("Failed to get metric - {}".format(metric))
+                continue
+            for result_metric in result:
+                labels = dict(result_metric['metric'])
+                labels['__name__'] = metric
+                series.append({'metric': labels,
+                               'values': [result_metric['value']]})
+        return {'status': 'success',
+                'data': {'resultType': 'matrix', 'result': series}}
+
+    @staticmethod
+    def _split_range(ts_from, ts_to, step):
+        """
+        Splits a time range in consecutive sub-ranges, each one having at
+        most PROMETHEUS_TS_LIMIT points.
+        """
+        size = PROMETHEUS_TS_LIMIT * step
+        ranges = list()
+        start = ts_from
+        while True:
+            end = min(start + size - step, ts_to)
+            ranges.append((start, end))
+            if end >= ts_to:
+                return ranges
+            start = end + step
 
     def _get_data(self, queries):
         """
@@ -142,12 +315,14 @@ class PrometheusAnnotation(GraphTelemetry):
                 retries = 0
                 while retries < 3: # Cimarron.RETRIES: # ++++
                     try:
-                        # LOG.info("Query - {}".format(full_request))
-                        req = requests.get(full_request,
-                                           timeout=30) # Cimarron.TIMEOUT) # ++++
-                        if req.status_code == 200:
-                            # LOG.info("Query output size - {}".format(req.content.__sizeof__()))
-                            metrics_data[resource].append(req.json())
+                        if full_request.get('aggregate'):
+                            result = self._query_aggregate(full_request)
+                        else:
+                            result = self._query_range(full_request)
+                        metrics_data[resource].append(result)
+                        break
+                    except ValueError as exc:
+                        LOG.error(exc)
                         break
                     except requests.exceptions.RequestException as exc:
                         LOG.error(exc)
@@ -295,11 +470,9 @@ class PrometheusAnnotation(GraphTelemetry):
         if InfoGraphNode.get_type(node) == NODE_TYPE.INSTANCE_DISK:
             # The machine is the source as this is a libvirt disk.
             disk_name = InfoGraphNode.get_name(node)
-            vm = self.landscape.get_neighbour_by_type(
-                disk_name, NODE_TYPE.VIRTUAL_MACHINE)
-            machine = self.landscape.get_neighbour_by_type(
-                vm, NODE_TYPE.PHYSICAL_MACHINE)
-            return machine
+            return self.landscape.get_neighbour_by_path(
+                disk_name, [NODE_TYPE.VIRTUAL_MACHINE,
+                            NODE_TYPE.PHYSICAL_MACHINE])
         if InfoGraphNode.get_type(node) == NODE_TYPE.PHYSICAL_MACHINE:
             if 'name' in attrs:
                 return attrs['name']
@@ -49,14 +49,33 @@ class PrometheusUtils(object):
         InfoGraphNode.set_network_utilization(machine, pandas.DataFrame())
 
     @staticmethod
-    def utilization(internal_graph, node, telemetry):
+    def utilization(internal_graph, node, telemetry, telemetry_data=None,
+                    aggregate=False):
+        """
+        Derives the utilization of the node from its telemetry data.
+        :param telemetry_data: data already fetched for the node. If None
+        it is requested to the telemetry.
+        :param aggregate: True if telemetry data holds window aggregates.
+        """
+        if telemetry_data is None:
+            telemetry_data = telemetry.get_data(node)
         # machine usage
-        telemetry_data = telemetry.get_data(node)
         return
 
     @staticmethod
-    def saturation(internal_graph, node, telemetry):
-        telemetry_data = telemetry.get_data(node)
+    def batch_utilization(internal_graph, nodes, telemetry, aggregate=False):
+        """
+        Derives the utilization of several nodes.
+        :param nodes: list of (node, telemetry data)
+        """
+        for node, telemetry_data in nodes:
+            PrometheusUtils.utilization(internal_graph, node, telemetry,
+                                        telemetry_data, aggregate)
+
+    @staticmethod
+    def saturation(internal_graph, node, telemetry, telemetry_data=None):
+        if telemetry_data is None:
+            telemetry_data = telemetry.get_data(node)
         return
 
 
@@ -0,0 +1,243 @@
+# Copyright (c) 2017, Intel Research and Development Ireland Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Process wide cache of the time series retrieved from the telemetry backends.
+"""
+
+__author__ = 'Giuliana Carullo'
+__copyright__ = "Copyright (c) 2017, Intel Research and Development Ireland Ltd."
+__license__ = "Apache 2.0"
+__maintainer__ = "Giuliana Carullo"
+__email__ = "giuliana.carullo@intel.com"
+__status__ = "Development"
+
+import bisect
+import calendar
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from analytics_engine import common
+from analytics_engine.infrastructure_manager.config_helper import ConfigHelper
+
+LOG = common.LOG
+
+DEFAULT_CACHE_MB = 64
+
+# Points more recent than SETTLE_TIME seconds may still be written to the
+# backend, so the cache never considers them as covered.
+SETTLE_TIME = 5
+
+# Config sections of the supported backends
+BACKEND_SECTIONS = {'snap': 'SNAP', 'prometheus': 'PROMETHEUS'}
+
+_CACHES = dict()
+_CACHES_LOCK = threading.Lock()
+
+
+def get_series_cache(backend):
+    """
+    Returns the series cache of the given backend, creating it the first
+    time it is requested. The size of the cache is set by the
+    'series_cache_mb' option of the backend config section.
+
+    :param backend: 'snap' or 'prometheus'
+    :return: SeriesCache
+    """
+    with _CACHES_LOCK:
+        if backend not in _CACHES:
+            try:
+                size = int(ConfigHelper.get(BACKEND_SECTIONS[backend],
+                                            'series_cache_mb'))
+            except Exception:
+                size = DEFAULT_CACHE_MB
+            _CACHES[backend] = SeriesCache(max_bytes=size * 1024 * 1024,
+                                           timestamp=point_timestamp)
+        return _CACHES[backend]
+
+
+def point_timestamp(point):
+    """
+    Returns the timestamp of a point as seconds from epoch. Points are
+    tuples having the timestamp as first element, either as a number or as
+    a RFC3339 string.
+    """
+    ts = point[0]
+    if isinstance(ts, basestring):
+        return calendar.timegm(time.strptime(ts[:19], '%Y-%m-%dT%H:%M:%S'))
+    return ts
+
+
+class SeriesCache(object):
+    """
+    Caches a contiguous time range of every series, identified by a key
+    such as (metric, tags). When a request overlaps the cached range only
+    the missing head and/or tail of the window is fetched from the backend.
+    Least recently used series are evicted when the cache exceeds its
+    byte budget.
+
+    Points of a series lie on a grid of step seconds starting at origin,
+    e.g. the buckets of an InfluxQL GROUP BY time(step) or the evaluation
+    times of a Prometheus range query. Cached and fetched ranges are
+    aligned to the grid and half open: fetching [lo, hi] keeps the points
+    from lo up to, but excluding, hi, as the point at hi may only account
+    for part of its interval.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_MB * 1024 * 1024,
+                 timestamp=point_timestamp, settle_time=SETTLE_TIME):
+        self.max_bytes = max_bytes
+        self.timestamp = timestamp
+        self.settle_time = settle_time
+        # key -> (covered_from, covered_to, timestamps, points, size)
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, ts_from, ts_to, fetch, step=1, origin=0):
+        """
+        Returns the points of the series between ts_from and ts_to,
+        fetching from the backend only the ranges not yet cached.
+
+        :param key: series identifier
+        :param ts_from: (int) epoch start time
+        :param ts_to: (int) epoch end time
+        :param fetch: function(ts_from, ts_to) returning the points of the
+                      series in the given range
+        :param step: (int) seconds between two points of the series
+        :param origin: (int) epoch time of any point of the grid
+        :return: list of points, from the grid point at or before ts_from
+                 to the grid point at or before ts_to
+        """
+        fetched = [(lo, hi, fetch(lo, hi))
+                   for lo, hi in self.missing(key, ts_from, ts_to,
+                                              step, origin)]
+        points = self.update(key, ts_from, ts_to, fetched, step, origin)
+        if points is None:
+            # the cached range changed in the meantime
+            lo, hi = SeriesCache._align(ts_from, ts_to, step, origin)
+            points = self.update(key, ts_from, ts_to,
+                                 [(lo, hi, fetch(lo, hi))], step, origin)
+        return points
+
+    def missing(self, key, ts_from, ts_to, step=1, origin=0):
+        """
+        Returns the list of (ts_from, ts_to) ranges not covered by the cache,
+        aligned to the grid of the series.
+        """
+        ts_from, ts_to = SeriesCache._align(ts_from, ts_to, step, origin)
+        with self.lock:
+            entry = self.entries.get(key)
+        if not entry or ts_to <= entry[0] or ts_from >= entry[1]:
+            return [(ts_from, ts_to)]
+        ranges = list()
+        if ts_from < entry[0]:
+            ranges.append((ts_from, entry[0]))
+        if ts_to > entry[1]:
+            ranges.append((entry[1], ts_to))
+        return ranges
+
+    def update(self, key, ts_from, ts_to, fetched, step=1, origin=0):
+        """
+        Merges the fetched ranges into the cached series and returns the
+        points between ts_from and ts_to.
+
+        :param fetched: list of (ts_from, ts_to, points) tuples, with the
+                        ranges aligned to the grid as returned by missing
+        :return: list of points, None if the cached and fetched ranges do
+                 not cover the whole window
+        """
+        window_from, window_to = SeriesCache._align(ts_from, ts_to,
+                                                    step, origin)
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry:
+                self.size -= entry[4]
+                # disjoint windows replace the cached one
+                if window_to <= entry[0] or window_from >= entry[1]:
+                    entry = None
+            ranges = [(lo, hi) for lo, hi, _ in fetched]
+            if entry:
+                ranges.append((entry[0], entry[1]))
+            if not SeriesCache._covers(ranges, window_from, window_to):
+                if entry:
+                    self.entries[key] = entry
+                    self.size += entry[4]
+                return None
+            if entry:
+                covered_from, covered_to, _, points, _ = entry
+            else:
+                covered_from, covered_to = window_from, window_to
+                points = list()
+            for lo, hi, new_points in fetched:
+                points = [point for point in points
+                          if not lo <= self.timestamp(point) < hi]
+                points.extend([point for point in new_points
+                               if lo <= self.timestamp(point) < hi])
+                covered_from = min(covered_from, lo)
+                covered_to = max(covered_to, hi)
+            points.sort(key=self.timestamp)
+            timestamps = [self.timestamp(point) for point in points]
+            settled = int(time.time()) - self.settle_time
+            covered_to = min(covered_to,
+                             settled - (settled - origin) % step)
+            if covered_from < covered_to:
+                size = SeriesCache._size(points)
+                self.entries[key] = (covered_from, covered_to,
+                                     timestamps, points, size)
+                self.size += size
+                self._evict()
+        start = bisect.bisect_left(timestamps, window_from)
+        end = bisect.bisect_left(timestamps, window_to)
+        return points[start:end]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    @staticmethod
+    def _align(ts_from, ts_to, step, origin):
+        # grid points at or before ts_from, and after ts_to
+        ts_from -= (ts_from - origin) % step
+        ts_to += step - (ts_to - origin) % step
+        return ts_from, ts_to
+
+    @staticmethod
+    def _covers(ranges, ts_from, ts_to):
+        covered = ts_from
+        for lo, hi in sorted(ranges):
+            if lo > covered:
+                return False
+            covered = max(covered, hi)
+        return covered >= ts_to
+
+    def _evict(self):
+        while self.size > self.max_bytes and self.entries:
+            key, entry = self.entries.popitem(last=False)
+            self.size -= entry[4]
+            LOG.debug('Evicted series {} from cache'.format(key))
+
+    @staticmethod
+    def _size(points):
+        # estimated on the first point, points of a series look alike
+        if not points:
+            return 0
+        point = points[0]
+        point_size = sys.getsizeof(point) + \
+            sum([sys.getsizeof(value) for value in point])
+        # the list of points and the list of timestamps
+        return len(points) * (point_size + 2 * sys.getsizeof(0))
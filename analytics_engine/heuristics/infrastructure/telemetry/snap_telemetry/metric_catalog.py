@@ -0,0 +1,134 @@
+# Copyright (c) 2017, Intel Research and Development Ireland Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = 'Giuliana Carullo'
+__copyright__ = "Copyright (c) 2017, Intel Research and Development Ireland Ltd."
+__license__ = "Apache 2.0"
+__maintainer__ = "Giuliana Carullo"
+__email__ = "giuliana.carullo@intel.com"
+__status__ = "Development"
+
+import bisect
+import threading
+import time
+
+from analytics_engine import common
+import analytics_engine.infrastructure_manager.telemetry as telemetry
+
+LOG = common.LOG
+
+# seconds between two refreshes of the catalog
+REFRESH_INTERVAL = 120
+# sources not requested for this many seconds are dropped from the catalog
+EXPIRY = 3600
+
+_CATALOG = None
+_CATALOG_LOCK = threading.Lock()
+
+
+def get_metric_catalog(refresh_interval=REFRESH_INTERVAL):
+    """
+    Returns the process wide metric catalog, creating it the first time.
+    """
+    global _CATALOG
+    with _CATALOG_LOCK:
+        if _CATALOG is None:
+            _CATALOG = MetricCatalog(telemetry.get_telemetry("snap"),
+                                     refresh_interval)
+        return _CATALOG
+
+
+class MetricCatalog(object):
+    """
+    Process wide catalog of the metrics available in snap for each source.
+    Metrics of a source are kept sorted, so that the metrics starting with a
+    given prefix are found by bisection. The catalog is refreshed by a
+    background thread, so requests only wait for snap the first time a
+    source is seen.
+    """
+
+    def __init__(self, snap, refresh_interval=REFRESH_INTERVAL,
+                 expiry=EXPIRY):
+        self.snap = snap
+        self.refresh_interval = refresh_interval
+        self.expiry = expiry
+        # identifier -> [query_tags, sorted metrics, last request time]
+        self.sources = dict()
+        self.lock = threading.Lock()
+        self.refresher = None
+
+    def metrics(self, identifier, query_tags):
+        """
+        Returns the sorted list of metrics available for the source.
+
+        :param identifier: identifier of the source
+        :param query_tags: tags used to query snap for the source metrics
+        :return: list of metric names
+        """
+        with self.lock:
+            source = self.sources.get(identifier)
+            if source:
+                source[2] = time.time()
+                return source[1]
+        metrics = sorted(self.snap.show_metrics(query_tags))
+        with self.lock:
+            self.sources[identifier] = [query_tags, metrics, time.time()]
+            self._start_refresher()
+        return metrics
+
+    def with_prefix(self, identifier, query_tags, prefix):
+        """
+        Returns the metrics of the source starting with the given prefix.
+        """
+        metrics = self.metrics(identifier, query_tags)
+        start = bisect.bisect_left(metrics, prefix)
+        end = start
+        while end < len(metrics) and metrics[end].startswith(prefix):
+            end += 1
+        return metrics[start:end]
+
+    def refresh(self):
+        """
+        Refreshes the metrics of every source, dropping the sources which
+        have not been requested recently.
+        """
+        now = time.time()
+        with self.lock:
+            sources = list(self.sources.items())
+        for identifier, (query_tags, _, last_request) in sources:
+            if now - last_request > self.expiry:
+                with self.lock:
+                    self.sources.pop(identifier, None)
+                continue
+            try:
+                metrics = sorted(self.snap.show_metrics(query_tags))
+            except Exception as e:
+                LOG.error('Failed to refresh metrics of {}'.format(identifier))
+                LOG.error(e)
+                continue
+            with self.lock:
+                if identifier in self.sources:
+                    self.sources[identifier][1] = metrics
+
+    def _start_refresher(self):
+        if self.refresher is None:
+            self.refresher = threading.Thread(target=self._refresh_loop,
+                                              name='metric-catalog')
+            self.refresher.daemon = True
+            self.refresher.start()
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            self.refresh()
@@ -129,4 +129,14 @@ METRIC_TAGS = [("intel/iostat/device/", ["device_id", "source"]),
                ("intel/docker/stats/network/tx_bytes", ["docker_id", "source"]),
                ("intel/docker/stats/network/rx_bytes", ["docker_id", "source"]),
                ("intel/docker/stats/cgroups/blkio_stats/io_time_recursive/value", ["docker_id", "source"])
-               ]
\ No newline at end of file
+               ]
+# Monotonic counters: utilizations are derived from their increments, so
+# their aggregate over a time window is the SPREAD rather than the MEAN.
+COUNTER_METRICS = ["intel/psutil/net/bytes_recv",
+                   "intel/psutil/net/bytes_sent",
+                   "intel/procfs/iface/bytes_recv",
+                   "intel/procfs/iface/bytes_sent",
+                   "intel/docker/stats/cgroups/cpu_stats/cpu_usage/total",
+                   "intel/docker/stats/network/tx_bytes",
+                   "intel/docker/stats/network/rx_bytes",
+                   "intel/docker/stats/cgroups/blkio_stats/io_time_recursive/value"]
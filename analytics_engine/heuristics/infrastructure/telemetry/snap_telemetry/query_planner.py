@@ -0,0 +1,112 @@
+# Copyright (c) 2017, Intel Research and Development Ireland Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = 'Giuliana Carullo'
+__copyright__ = "Copyright (c) 2017, Intel Research and Development Ireland Ltd."
+__license__ = "Apache 2.0"
+__maintainer__ = "Giuliana Carullo"
+__email__ = "giuliana.carullo@intel.com"
+__status__ = "Development"
+
+from collections import OrderedDict
+
+from analytics_engine import common
+from snap_query import SnapBatchQuery
+
+LOG = common.LOG
+
+
+class QueryPlanner(object):
+    """
+    Plans the snap queries of a whole graph before they are executed.
+    Identical queries coming from different nodes are merged and the
+    remaining ones are grouped by source host, so that every host is queried
+    with a single request.
+    """
+
+    def __init__(self):
+        self.plan = OrderedDict()
+        self.requested = 0
+
+    @staticmethod
+    def key(query):
+        """
+        Returns the key identifying a query, i.e. the
+        (metric, tags, window, aggregate, resolution) tuple.
+
+        :param query: query as built by SnapAnnotation.get_queries
+        :return: tuple
+        """
+        tags = query.get('tags') or {}
+        return (query['metric'],
+                tuple(sorted(tags.items())),
+                query['ts_from'],
+                query['ts_to'],
+                query.get('aggregate'),
+                query.get('resolution'))
+
+    def add(self, queries):
+        """
+        Adds the queries of a node to the plan.
+
+        :param queries: list of queries
+        """
+        for query in queries or []:
+            self.requested += 1
+            source = (query.get('tags') or {}).get('source')
+            self.plan.setdefault(source, OrderedDict()).setdefault(
+                QueryPlanner.key(query), query)
+
+    def run(self, snap, fetcher=None, deadline=None, hedge_after=None):
+        """
+        Executes the plan, one request per source host.
+
+        :param snap: Snap client
+        :param fetcher: TelemetryFetcher used to query the sources
+                        concurrently. If None sources are queried in turn.
+        :param deadline: epoch time after which sources still running are
+                         given up, used with the fetcher only
+        :param hedge_after: seconds after which slow sources are queried
+                            again, used with the fetcher only
+        :return: dict mapping the key of each query to its series
+        """
+        series = {}
+        planned = sum([len(queries) for queries in self.plan.values()])
+        LOG.debug('Executing {} snap queries out of {} requested, '
+                  'over {} sources'.format(planned, self.requested,
+                                           len(self.plan)))
+        sources = list(self.plan.keys())
+
+        def fetch(source):
+            return SnapBatchQuery(snap, list(self.plan[source].values())).run()
+
+        if fetcher:
+            results = fetcher.map(fetch, sources, deadline=deadline,
+                                  hedge_after=hedge_after)
+        else:
+            results = list()
+            for source in sources:
+                try:
+                    results.append(fetch(source))
+                except Exception as e:
+                    LOG.error(e)
+                    results.append(None)
+        for source, source_results in zip(sources, results):
+            if source_results is None:
+                # nodes of this source will be queried again on get_data
+                LOG.error('Query plan failed for source {}'.format(source))
+                continue
+            for key, res in zip(self.plan[source].keys(), source_results):
+                series[key] = res
+        return series
@@ -19,31 +19,48 @@ __maintainer__ = "Giuliana Carullo"
 __email__ = "giuliana.carullo@intel.com"
 __status__ = "Development"
 
+import math
 import time
-from datetime import datetime
 
-import dateutil.parser as d_parser
+import numpy as np
 import pandas as pd
 
 from analytics_engine import common
 import analytics_engine.infrastructure_manager.telemetry as telemetry
+from analytics_engine.infrastructure_manager.config_helper import ConfigHelper
 from analytics_engine.heuristics.beans.infograph import InfoGraphNode
 from analytics_engine.heuristics.beans.infograph import InfoGraphNodeLayer as GRAPH_LAYER
 from analytics_engine.heuristics.beans.infograph import InfoGraphNodeType as NODE_TYPE
 from analytics_engine.heuristics.infrastructure.telemetry.graph_telemetry import GraphTelemetry
+import analytics_engine.heuristics.infrastructure.telemetry.utils as tm_utils
+from metric_catalog import get_metric_catalog
+from metric_conf import COUNTER_METRICS
 from metric_conf import METRIC_TAGS
 from metric_conf import NODE_METRICS
+from query_planner import QueryPlanner
+from snap_query import SnapBatchQuery
 from snap_query import SnapQuery
 
 LOG = common.LOG
 
+# default maximum number of points per series
+MAX_POINTS = 300
+
 
 class SnapAnnotation(GraphTelemetry):
 
-    def __init__(self, metric_timeout=120):
+    def __init__(self, metric_timeout=120, batch=True, aggregate=False):
         self.snap = telemetry.get_telemetry("snap")
-        self.metrics = {}
-        self.metric_timeout = metric_timeout
+        self.catalog = get_metric_catalog(metric_timeout)
+        self.batch = batch
+        # if True only the window aggregate of each metric is retrieved
+        self.aggregate = aggregate
+        try:
+            self.max_points = int(ConfigHelper.get("SNAP", "max_points"))
+        except Exception:
+            self.max_points = MAX_POINTS
+        self.series = {}
+        self.node_data = {}
         self.landscape = None
         self.vms = []
 
@@ -52,15 +69,22 @@ class SnapAnnotation(GraphTelemetry):
 
     def get_data(self, node):
         """
-        Return telemetry data for the specified node
+        Return telemetry data for the specified node. Data is fetched once
+        per annotation run and memoized.
 
         :param node: InfoGraph node
         :return: pandas.DataFrame
         """
-        data = self._get_data(node)
-        return data
+        name = InfoGraphNode.get_name(node)
+        if name not in self.node_data:
+            self.node_data[name] = self._get_data(node)
+        return self.node_data[name]
+
+    def reset(self):
+        super(SnapAnnotation, self).reset()
+        self.series = {}
 
-    def get_queries(self, landscape, node, ts_from, ts_to):
+    def get_queries(self, landscape, node, ts_from, ts_to, resolution=None):
         """
         Return queries to use for telemetry for the specific node.
 
@@ -68,8 +92,11 @@ class SnapAnnotation(GraphTelemetry):
         :param node:
         :param ts_from:
         :param ts_to:
+        :param resolution: seconds between two points. If None it is chosen
+                           so that series have at most max_points points.
         :return:
         """
+        resolution = resolution or self._resolution(ts_from, ts_to)
 
         queries = []
         self.landscape = landscape
@@ -79,7 +106,8 @@ class SnapAnnotation(GraphTelemetry):
         #    return []
         for metric in self._get_metrics(node):
             try:
-                query = self._build_query(metric, node, ts_from, ts_to)
+                query = self._build_query(metric, node, ts_from, ts_to,
+                                          resolution)
                 queries.append(query)
             except Exception as e:
                 LOG.error('Exception for metric: {}'.format(metric))
@@ -87,7 +115,35 @@ class SnapAnnotation(GraphTelemetry):
 
         return queries
 
-    def _build_query(self, metric, node, ts_from, ts_to):
+    def prefetch(self, queries, fetcher=None, deadline=None,
+                 hedge_after=None):
+        """
+        Retrieves in advance the data for the queries of a whole graph.
+        Duplicated queries are executed once and each source host is
+        queried with a single request. Series are then routed back to the
+        nodes by get_data.
+
+        :param queries: list of queries of all the nodes of the graph
+        :param fetcher: optional TelemetryFetcher running the requests
+        :param deadline: epoch time after which sources still running are
+                         given up
+        :param hedge_after: seconds after which slow sources are queried
+                            again
+        """
+        planner = QueryPlanner()
+        planner.add(queries)
+        self.series.update(planner.run(self.snap, fetcher, deadline,
+                                       hedge_after))
+
+    def _resolution(self, ts_from, ts_to):
+        """
+        Returns the resolution, in seconds, keeping the number of points of
+        each series within max_points.
+        """
+        return max(1, int(math.ceil(
+            float(int(ts_to or time.time()) - int(ts_from)) / self.max_points)))
+
+    def _build_query(self, metric, node, ts_from, ts_to, resolution=1):
         tags = self._tags(metric, node)
         # query = SnapQuery(self.snap, metric, tags, ts_from, ts_to)
         query = dict()
@@ -95,65 +151,103 @@ class SnapAnnotation(GraphTelemetry):
         query['tags'] = tags
         query['ts_from'] = ts_from
         query['ts_to'] = ts_to
+        query['resolution'] = resolution
+        if self.aggregate:
+            query['aggregate'] = \
+                'spread' if metric in COUNTER_METRICS else 'mean'
         return query
 
     def _get_data(self, node):
+        queries = InfoGraphNode.get_queries(node)
+        if self.batch:
+            try:
+                results = self._get_batch_data(queries)
+                if self.aggregate:
+                    self._window_aggregates(results, queries)
+                return self._to_dataframe(results)
+            except Exception as e:
+                LOG.error('Batched query failed for node {}, falling back '
+                          'to single queries'.format(
+                              InfoGraphNode.get_name(node)))
+                LOG.error(e)
         # TODO: Create here the object SnapQuery from the string
         results = {}
-        for query_vars in InfoGraphNode.get_queries(node):
+        for query_vars in queries:
             query = SnapQuery(self.snap,
                               query_vars['metric'],
                               query_vars['tags'],
                               query_vars['ts_from'],
-                              query_vars['ts_to'])
+                              query_vars['ts_to'],
+                              query_vars.get('aggregate'),
+                              query_vars.get('resolution') or 1)
             res = query.run()
             results[query.metric] = res
+        if self.aggregate:
+            self._window_aggregates(results, queries)
         results_dataframe = self._to_dataframe(results)
         return results_dataframe
 
-    def _to_dataframe(self, results):
-        dataframes = []
-        largest_index = 0
-        largest = 0
-        i = 0
+    def _get_batch_data(self, queries):
+        """
+        Retrieves the data of all the given queries with a single round
+        trip and splits it back into per metric series.
+        """
+        results = {}
+        if not queries:
+            return results
+        missing = [query_vars for query_vars in queries
+                   if QueryPlanner.key(query_vars) not in self.series]
+        if missing:
+            query = SnapBatchQuery(self.snap, missing)
+            for query_vars, res in zip(missing, query.run()):
+                self.series[QueryPlanner.key(query_vars)] = res
+        for query_vars in queries:
+            results[query_vars['metric']] = \
+                self.series[QueryPlanner.key(query_vars)]
+        return results
+
+    @staticmethod
+    def _window_aggregates(results, queries):
+        """
+        Sets the aggregate of each query as a single point at the end of its
+        time window. Spreads of counters are divided by the window length,
+        so that they hold the mean increment per second.
 
+        :param results: dict mapping each metric to its (time, value) points
+        :param queries: aggregate queries of the node
+        """
+        for query_vars in queries:
+            points = results.get(query_vars['metric'])
+            if not points:
+                continue
+            ts_to = int(query_vars['ts_to'] or time.time())
+            value = points[0][1]
+            if value is not None and query_vars['aggregate'] == 'spread':
+                value = float(value) / max(1, ts_to - int(query_vars['ts_from']))
+            results[query_vars['metric']] = [(ts_to, value)]
+
+    def _to_dataframe(self, results):
+        """
+        Builds the telemetry data frame of a node. Points are requested from
+        snap with epoch timestamps, so columns are built straight into numpy
+        arrays and timestamps are kept as integers. Metrics are aligned on
+        their timestamps in a single pass.
+
+        :param results: dict mapping each metric to its (time, value) points
+        :return: pandas.DataFrame with a 'timestamp' column and one column
+                 per metric
+        """
+        metrics = list()
+        series = list()
         for metric, result in results.iteritems():
-            times = []
-            vals = []
-            i += 1
-            if len(result) > largest:
-                largest_index = i
-                largest = len(result)
-            for ts, val in result:
-                dt = d_parser.parse(ts[:-1].split(".")[0])
-                unix_time = datetime(1970, 1, 1)
-                if dt.tzinfo is not None:
-                    unix_time.replace(tzinfo=dt.tzinfo)
-                epoch = (dt - unix_time).total_seconds()
-                timestamp = int(round(epoch))
-                times.append(timestamp)
-                vals.append(val)
-
-            result_df = pd.DataFrame()
-            result_df['timestamp'] = pd.Series(times)
-            result_df[metric] = pd.Series(vals)
-            dataframes.append(result_df)
-
-        if len(dataframes) > 0:
-            df_res = pd.DataFrame()
-            df_res['timestamp'] = dataframes[0]['timestamp']
-            for df in dataframes:
-                try:
-                    df = df.drop_duplicates(subset='timestamp')
-                    df_res = pd.merge(df_res, df, on='timestamp', how='outer')
-                except Exception as e:
-                    LOG.error(e)
-                    exit()
-            # df_res = df_res.set_index('timestamp')
-            df_res['timestamp'] = df_res['timestamp'].astype(str)
-            return df_res
-            # return pd.concat(dataframes, axis=1,
-            #                  join_axes=[dataframes[largest_index].index])
+            times = np.fromiter((ts for ts, _ in result), dtype=np.int64,
+                                count=len(result))
+            # null values of empty time buckets become NaN
+            vals = np.array([val for _, val in result], dtype=np.float64)
+            metrics.append(metric)
+            series.append((times, vals))
+        if len(series) > 0:
+            return tm_utils.aligned_dataframe(series, metrics)
         return pd.DataFrame()
 
     def _tags(self, metric, node):
@@ -211,33 +305,24 @@ class SnapAnnotation(GraphTelemetry):
     def _source(self, node):
         attrs = InfoGraphNode.get_attributes(node)
         if InfoGraphNode.get_layer(node) == GRAPH_LAYER.PHYSICAL:
+            # nested attributes of the landscape are already merged
             if 'allocation' in attrs:
                 return attrs['allocation']
-            # fix due to the landscape
-            else:
-                while attrs.get('attributes', None):
-                    attrs = attrs['attributes']
-                if 'allocation' in attrs:
-                    return attrs['allocation']
         if InfoGraphNode.get_type(node) == NODE_TYPE.VIRTUAL_MACHINE:
             if 'vm_name' in attrs:
                 return attrs['vm_name']
         if InfoGraphNode.get_type(node) == NODE_TYPE.INSTANCE_DISK:
             # The machine is the source as this is a libvirt disk.
             disk_name = InfoGraphNode.get_name(node)
-            vm = self.landscape.get_neighbour_by_type(
-                disk_name, NODE_TYPE.VIRTUAL_MACHINE)
-            machine = self.landscape.get_neighbour_by_type(
-                vm, NODE_TYPE.PHYSICAL_MACHINE)
-            return machine
+            return self.landscape.get_neighbour_by_path(
+                disk_name, [NODE_TYPE.VIRTUAL_MACHINE,
+                            NODE_TYPE.PHYSICAL_MACHINE])
         if InfoGraphNode.get_type(node) == NODE_TYPE.PHYSICAL_MACHINE:
             if 'name' in attrs:
                 return attrs['name']
         if InfoGraphNode.get_type(node) == NODE_TYPE.DOCKER_CONTAINER:
-            docker_node = self.landscape.get_neighbour_by_type(InfoGraphNode.get_name(node),'docker_node')
-            if docker_node:
-                machine = self.landscape.get_neighbour_by_type(docker_node,'machine')
-                return machine
+            return self.landscape.get_neighbour_by_path(
+                InfoGraphNode.get_name(node), ['docker_node', 'machine'])
         return None
 
     def _disk(self, node):
@@ -258,12 +343,6 @@ class SnapAnnotation(GraphTelemetry):
         if (InfoGraphNode.get_type(node) == NODE_TYPE.PHYSICAL_PU or
                     InfoGraphNode.get_type(node) == NODE_TYPE.PHYSICAL_MACHINE):
             attrs = InfoGraphNode.get_attributes(node)
-            # fix attributes from landscaper - fixing
-            # permanently on the fly if needed
-
-            while attrs.get('attributes', None):
-                attrs = attrs['attributes']
-
             if 'os_index' in attrs:
                 pu = attrs["os_index"]
         # metric prefix 'cpu' on to the front of the cpu number.
@@ -288,13 +367,12 @@ class SnapAnnotation(GraphTelemetry):
     def _stack(self, node):
         if InfoGraphNode.get_type(node) == NODE_TYPE.VIRTUAL_MACHINE:
             # Taking service node to which the VM is connected
-            predecessors = self.landscape.predecessors(
-                InfoGraphNode.get_name(node))
+            predecessors = self.landscape.get_predecessors_by_type(
+                InfoGraphNode.get_name(node), NODE_TYPE.SERVICE_COMPUTE)
             for predecessor in predecessors:
                 predecessor_node = self.landscape.node[predecessor]
-                if predecessor_node['type'] == NODE_TYPE.SERVICE_COMPUTE:
-                    if 'stack_name' in predecessor_node:
-                        return predecessor_node["stack_name"]
+                if 'stack_name' in predecessor_node:
+                    return predecessor_node["stack_name"]
         return None
 
     def _nova_uuid(self, node):
@@ -307,55 +385,47 @@ class SnapAnnotation(GraphTelemetry):
             return vm
         return None
 
-    def _cached_metrics(self, identifier, query_tags):
-        """
-        Retrieves cached metrics.  Snap is queried using the tags and saved
-        in an object variable, identified by the identifier. Metrics are then
-        retrieved from this variable, rather than making a query each time. If 
-        the last time the metrics were queried exceeds a timeout, then a new
-        query is cached.
-        """
-        # If the metric attribute is empty for a given source then fill it.
-        if identifier not in self.metrics:
-            metrics = self.snap.show_metrics(query_tags)
-            self.metrics[identifier] = (time.time(), metrics)
-        else:
-            # If the timer has elapsed for a given source since then refill it.
-            last_query_timestamp = self.metrics[identifier][0]
-            current_time = time.time()
-            if (current_time - last_query_timestamp) > self.metric_timeout:
-                metrics = self.snap.show_metrics(query_tags)
-                self.metrics[identifier] = (time.time(), metrics)
-
-        return self.metrics[identifier][1]  # just the types not the timestamp
-
     def _get_metrics(self, node):
         """
         Retrieves the metrics for a node based on its type.  This is done by
         checking if the node is in the NODE_METRICS dictionary and then pulling
-        out a list of metric heads for that node type.  If the metric head 
-        matches the metric retrieved from the host then we attach it.
+        out a list of metric heads for that node type.  The metrics of the
+        host starting with each metric head are looked up in the catalog.
         """
         metrics = []
+        nova_uuids = False
         node_type = InfoGraphNode.get_type(node)
 
         if node_type in NODE_METRICS:
-            source_metrics = self._source_metrics(node)
-            for metric in source_metrics:
+            source = self._metrics_source(node)
+            if source is None:
+                return metrics
+            identifier, query_tags = source
+            found = set()
+            try:
                 for metric_start in NODE_METRICS[node_type]:
-                    if metric.startswith(metric_start) \
-                            and not self._exception(node, metric):
+                    for metric in self.catalog.with_prefix(
+                            identifier, query_tags, metric_start):
+                        if metric in found or self._exception(node, metric):
+                            continue
+                        found.add(metric)
                         if metric.startswith("intel/net/"):
-                            nic_id = self._nic(node)
-                            if nic_id in metric:
-                                metrics.append(metric)
-                        if metric.startswith('intel/libvirt/'):
-                            self._get_nova_uuids(node)
-                            for x in range(0, len(self.vms)):
-                                #LOG.info('Adding {}'.format(metric))
+                            nic_id = self._nic(node, None)
+                            if nic_id and nic_id in metric:
                                 metrics.append(metric)
+                        elif metric.startswith('intel/libvirt/'):
+                            # results are collected per metric, so one
+                            # query is enough whatever the number of VMs
+                            if not nova_uuids:
+                                self._get_nova_uuids(node)
+                                nova_uuids = True
+                            metrics.append(metric)
                         else:
                             metrics.append(metric)
+            except Exception as ex:
+                LOG.error('Malformed graph: {}'.format(
+                    InfoGraphNode.get_name(node)))
+                LOG.error(ex)
         return metrics
 
     def _get_nova_uuids(self, node):
@@ -364,54 +434,39 @@ class SnapAnnotation(GraphTelemetry):
             self.vms = self.landscape.get_neighbours_by_type(phy_name, "vm")
             #LOG.info('Collecting nova uuids: {}'.format(self.vms))
 
-    def _source_metrics(self, node):
+    def _metrics_source(self, node):
         """
-        Retrieves metrics associated with a source/host.  The source is 
-        identified by the node and then all metrics types are collected for 
-        that source.  If the node is physical then the metric types are 
-        retrieved using just the machine name as the source, if the node is 
-        virtual then the source (the vm hostname) and the stack name are 
-        required. 
+        Returns the identifier of the source of the node metrics and the tags
+        to query snap for them.  If the node is physical then the metric
+        types are retrieved using just the machine name as the source, if the
+        node is virtual then the source (the vm hostname) and the stack name
+        are required.
         """
-
-        metric_types = []
         node_layer = InfoGraphNode.get_layer(node)
         node_type = InfoGraphNode.get_type(node)
         if node_layer == GRAPH_LAYER.PHYSICAL \
                 or node_type == NODE_TYPE.INSTANCE_DISK:
             try:
                 source = self._source(node)
-                identifier = source
-                query_tags = {"source": source}
-                metric_types = self._cached_metrics(identifier, query_tags)
+                if source is not None:
+                    return source, {"source": source}
             except Exception as ex:
                 LOG.error('Malformed graph: {}'.format(InfoGraphNode.get_name(node)))
                 LOG.error(ex)
 
-
         elif node_layer == GRAPH_LAYER.VIRTUAL:
             source = self._source(node)
             stack = self._stack(node)
-
-            #LOG.info("SOURCE: {}".format(source))
-            #LOG.info("STACK: {}".format(stack))
-
             if stack is not None:
-
                 identifier = "{}-{}".format(source, stack)
-                # query_tags = {"source": source, "stack": stack}
-
-                query_tags = {"stack_name": stack}
-                metric_types = self._cached_metrics(identifier, query_tags)
+                return identifier, {"stack_name": stack}
         elif node_type == NODE_TYPE.DOCKER_CONTAINER:
             source = self._source(node)
             docker_id = InfoGraphNode.get_docker_id(node)
             if docker_id is not None and source is not None:
                 identifier = "{}-{}".format(source, docker_id)
-                query_tags = {"docker_id": docker_id, "source": source}
-                metric_types = self._cached_metrics(identifier, query_tags)
-
-        return metric_types
+                return identifier, {"docker_id": docker_id, "source": source}
+        return None
 
     def _exception(self, node, metric):
         # This metric should be attached to the machine and not nic.
@@ -20,7 +20,10 @@ __email__ = "giuliana.carullo@intel.com"
 __status__ = "Development"
 
 # previously into snap_graph_telemetry Who's the original author?)
+import time
+
 from analytics_engine import common
+from analytics_engine.heuristics.infrastructure.telemetry.series_cache import get_series_cache
 
 LOG = common.LOG
 
@@ -29,12 +32,15 @@ class SnapQuery(object):
     This class hosts the definition of the query object for snap
     """
 
-    def __init__(self, snap, metric, tags, ts_from, ts_to):
+    def __init__(self, snap, metric, tags, ts_from, ts_to, aggregate=None,
+                 resolution=1):
         self.snap = snap
         self.metric = metric
         self.tags = tags
         self.ts_from = ts_from
         self.ts_to = ts_to
+        self.aggregate = aggregate
+        self.resolution = resolution
 
     def run(self):
         LOG.debug('Get Metric "{}" from "{}" to "{}" where {}'.format(
@@ -42,4 +48,86 @@ class SnapQuery(object):
         if self.metric.startswith('intel/libvirt/'):
             LOG.info('Get Metric "{}" from "{}" to "{}" where {}'.format(
                 self.metric, self.ts_from, self.ts_to, self.tags))
-        return self.snap.get_metric(self.metric, self.ts_from, self.ts_to, self.tags)
\ No newline at end of file
+        ts_to = int(self.ts_to or time.time())
+        if self.aggregate:
+            # aggregates are computed by the db and never cached
+            return self.snap.get_metric(self.metric, int(self.ts_from), ts_to,
+                                        self.tags, epoch='s',
+                                        aggregate=self.aggregate)
+
+        def fetch(ts_from, ts_to):
+            return self.snap.get_metric(self.metric, ts_from, ts_to, self.tags,
+                                        epoch='s', resolution=self.resolution)
+        return get_series_cache('snap').get(
+            series_key(self.metric, self.tags, self.resolution),
+            int(self.ts_from), ts_to, fetch, step=self.resolution)
+
+
+class SnapBatchQuery(object):
+    """
+    Groups the queries of a node so that they are sent to snap as a single
+    multi-statement request.
+    """
+
+    def __init__(self, snap, queries):
+        self.snap = snap
+        self.queries = queries
+
+    def run(self):
+        """
+        Runs the queries. Only the time ranges not already available in the
+        series cache are requested to snap. Aggregate queries bypass the
+        cache.
+
+        :return: list of lists of (time, value) tuples, in the same order
+                 as the queries
+        """
+        cache = get_series_cache('snap')
+        windows = list()
+        missing = list()
+        for query in self.queries:
+            resolution = query.get('resolution') or 1
+            key = series_key(query['metric'], query['tags'], resolution)
+            ts_from = int(query['ts_from'])
+            ts_to = int(query['ts_to'] or time.time())
+            aggregate = query.get('aggregate')
+            if aggregate:
+                ranges = [(ts_from, ts_to)]
+            else:
+                ranges = cache.missing(key, ts_from, ts_to, step=resolution)
+            windows.append((key, ts_from, ts_to, ranges))
+            for lo, hi in ranges:
+                missing.append({'metric': query['metric'],
+                                'tags': query['tags'],
+                                'ts_from': lo,
+                                'ts_to': hi,
+                                'aggregate': aggregate,
+                                'resolution': resolution})
+        LOG.debug('Get {} metric ranges in a single request'.format(
+            len(missing)))
+        fetched = self.snap.get_metrics(missing) if missing else list()
+        res = list()
+        i = 0
+        for query, (key, ts_from, ts_to, ranges) in zip(self.queries, windows):
+            if query.get('aggregate'):
+                res.append(fetched[i])
+                i += 1
+                continue
+            points = cache.update(
+                key, ts_from, ts_to,
+                [(lo, hi, fetched[i + j]) for j, (lo, hi) in enumerate(ranges)],
+                step=key[2])
+            i += len(ranges)
+            if points is None:
+                points = SnapQuery(self.snap, query['metric'], query['tags'],
+                                   ts_from, ts_to,
+                                   resolution=key[2]).run()
+            res.append(points)
+        return res
+
+
+def series_key(metric, tags, resolution=1):
+    """
+    Returns the key identifying a snap series in the series cache.
+    """
+    return metric, tuple(sorted((tags or {}).items())), resolution
@@ -21,27 +21,35 @@ __status__ = "Development"
 
 import pandas
 from analytics_engine.heuristics.beans.infograph import InfoGraphNode
+from analytics_engine.heuristics.beans.infograph import InfoGraphNodeProperty
+from analytics_engine.heuristics.infrastructure.telemetry.snap_telemetry import utilization_rules
 from analytics_engine import common
 
 LOG = common.LOG
 
 class SnapUtils(object):
 
+    _SET_UTILIZATION = {
+        InfoGraphNodeProperty.UTILIZATION_COMPUTE:
+            InfoGraphNode.set_compute_utilization,
+        InfoGraphNodeProperty.UTILIZATION_MEMORY:
+            InfoGraphNode.set_memory_utilization,
+        InfoGraphNodeProperty.UTILIZATION_DISK:
+            InfoGraphNode.set_disk_utilization,
+        InfoGraphNodeProperty.UTILIZATION_NETWORK:
+            InfoGraphNode.set_network_utilization}
+
     @staticmethod
     def annotate_machine_pu_util(internal_graph, node):
         source = InfoGraphNode.get_machine_name_of_pu(node)
         machine = InfoGraphNode.get_node(internal_graph, source)
-        machine_util = InfoGraphNode.get_compute_utilization(machine)
-        if 'intel/use/compute/utilization' not in machine_util.columns:
-            sum_util = None
+        kind = InfoGraphNodeProperty.UTILIZATION_COMPUTE
+        if 'intel/use/compute/utilization' not in \
+                InfoGraphNode.get_frame_columns(machine, kind):
             cpu_metric = 'intel/procfs/cpu/utilization_percentage'
-            pu_util_df = InfoGraphNode.get_compute_utilization(node)
-            if cpu_metric in pu_util_df.columns:
-                pu_util = pu_util_df[cpu_metric]
-                pu_util = pu_util.fillna(0)
-                machine_util[InfoGraphNode.get_attributes(node)['name']] = pu_util
-                InfoGraphNode.set_compute_utilization(machine, machine_util)
-            else:
+            node_util = InfoGraphNode.get_frame_view(node, kind)
+            if not SnapUtils._add_machine_util(machine, kind, node, node_util,
+                                               cpu_metric):
                 LOG.info('CPU util not Found use for node {}'.format(InfoGraphNode.get_name(node)))
         else:
             LOG.debug('Found use for node {}'.format(InfoGraphNode.get_name(node)))
@@ -50,16 +58,13 @@ class SnapUtils(object):
     def annotate_machine_disk_util(internal_graph, node):
         source = InfoGraphNode.get_attributes(node)['allocation']
         machine = InfoGraphNode.get_node(internal_graph, source)
-        machine_util = InfoGraphNode.get_disk_utilization(machine)
-        if 'intel/use/disk/utilization' not in machine_util.columns:
+        kind = InfoGraphNodeProperty.UTILIZATION_DISK
+        if 'intel/use/disk/utilization' not in \
+                InfoGraphNode.get_frame_columns(machine, kind):
             disk_metric = 'intel/procfs/disk/utilization_percentage'
-            disk_util_df = InfoGraphNode.get_disk_utilization(node)
-            if disk_metric in disk_util_df.columns:
-                disk_util = disk_util_df[disk_metric]
-                disk_util = disk_util.fillna(0)
-                machine_util[InfoGraphNode.get_attributes(node)['name']] = disk_util
-                InfoGraphNode.set_disk_utilization(machine, machine_util)
-            else:
+            node_util = InfoGraphNode.get_frame_view(node, kind)
+            if not SnapUtils._add_machine_util(machine, kind, node, node_util,
+                                               disk_metric):
                 LOG.info('Disk util not Found use for node {}'.format(InfoGraphNode.get_name(node)))
         else:
             LOG.debug('Found use disk for node {}'.format(InfoGraphNode.get_name(node)))
@@ -68,121 +73,65 @@ class SnapUtils(object):
     def annotate_machine_network_util(internal_graph, node):
         source = InfoGraphNode.get_attributes(node)['allocation']
         machine = InfoGraphNode.get_node(internal_graph, source)
-        machine_util = InfoGraphNode.get_network_utilization(machine)
-        if 'intel/use/network/utilization' not in machine_util.columns:
+        kind = InfoGraphNodeProperty.UTILIZATION_NETWORK
+        if 'intel/use/network/utilization' not in \
+                InfoGraphNode.get_frame_columns(machine, kind):
             net_metric = 'intel/psutil/net/utilization_percentage'
-            net_util_df = InfoGraphNode.get_network_utilization(node)
-            if net_metric in net_util_df.columns:
-                net_util = net_util_df[net_metric]
-                net_util = net_util.fillna(0)
-                machine_util[InfoGraphNode.get_attributes(node)['name']] = net_util
-                InfoGraphNode.set_network_utilization(machine, machine_util)
-            else:
+            node_util = InfoGraphNode.get_frame_view(node, kind)
+            if not SnapUtils._add_machine_util(machine, kind, node, node_util,
+                                               net_metric):
                 LOG.info('Net util not Found use for node {}'.format(InfoGraphNode.get_name(node)))
         else:
             LOG.debug('Found use network for node {}'.format(InfoGraphNode.get_name(node)))
 
     @staticmethod
-    def utilization(internal_graph, node, telemetry):
-        # machine usage
-        telemetry_data = telemetry.get_data(node)
-        if 'intel/use/compute/utilization' in telemetry_data:
-            InfoGraphNode.set_compute_utilization(node,
-                                                  pandas.DataFrame(telemetry_data['intel/use/compute/utilization'],
-                                                                   columns=['intel/use/compute/utilization']))
-        # pu usage
-        if 'intel/procfs/cpu/utilization_percentage' in telemetry_data:
-                InfoGraphNode.set_compute_utilization(node,
-                                                      pandas.DataFrame(
-                                                          telemetry_data['intel/procfs/cpu/utilization_percentage'],
-                                                          columns=['intel/procfs/cpu/utilization_percentage']))
-        if 'intel/use/memory/utilization' in telemetry_data:
-            InfoGraphNode.set_memory_utilization(node, pandas.DataFrame(telemetry_data['intel/use/memory/utilization']))
-        if 'intel/use/disk/utilization' in telemetry_data:
-            InfoGraphNode.set_disk_utilization(node, pandas.DataFrame(telemetry_data['intel/use/disk/utilization']))
-        if 'intel/use/network/utilization' in telemetry_data:
-            InfoGraphNode.set_network_utilization(node,
-                                                  pandas.DataFrame(telemetry_data['intel/use/network/utilization']))
-        # supporting not available /use/ metrics
+    def _add_machine_util(machine, kind, node, node_util, metric):
+        """
+        Adds the utilization metric of the node as a column of the machine
+        utilization, named after the node. Only the column is written, the
+        machine frame is not rebuilt for every node.
+        :return: False if the node has no such metric
+        """
+        if metric not in node_util.columns:
+            return False
+        InfoGraphNode.set_utilization_column(
+            machine, kind, InfoGraphNode.get_attributes(node)['name'],
+            node_util[metric].fillna(0))
+        return True
 
-        if 'intel/procfs/meminfo/mem_total' in telemetry_data and 'intel/procfs/meminfo/mem_used' in telemetry_data:
-            # LOG.info('Found memory utilization procfs')
-            mem_used = telemetry_data['intel/procfs/meminfo/mem_used'].fillna(0)
-            mem_total = telemetry_data['intel/procfs/meminfo/mem_total'].fillna(0)
-            mem_util = mem_used * 100 / mem_total
-            mem_util.name = 'intel/procfs/memory/utilization_percentage'
-            InfoGraphNode.set_memory_utilization(node, pandas.DataFrame(mem_util))
-        if 'intel/procfs/disk/io_time' in telemetry_data:
-            io_time = telemetry_data['intel/procfs/disk/io_time'].fillna(0)
-            disk_util = io_time*100/1000
-            disk_util.name = 'intel/procfs/disk/utilization_percentage'
-            InfoGraphNode.set_disk_utilization(node, pandas.DataFrame(disk_util))
-        if 'intel/psutil/net/bytes_recv' in telemetry_data and 'intel/psutil/net/bytes_sent' in telemetry_data:
-            source=telemetry._source(node)
-            machine = InfoGraphNode.get_node(internal_graph, source)
-            nic_speed = InfoGraphNode.get_nic_speed_mbps(machine) * 1000000
-            net_data = telemetry_data.filter(['timestamp', 'intel/psutil/net/bytes_recv','intel/psutil/net/bytes_sent'], axis=1)
-            net_data.fillna(0)
-            net_data['intel/psutil/net/bytes_total'] = net_data['intel/psutil/net/bytes_recv']+net_data['intel/psutil/net/bytes_sent']
-            net_data_interval = net_data.set_index('timestamp').diff()
-            net_data_interval['intel/psutil/net/utilization_percentage'] = net_data_interval['intel/psutil/net/bytes_total'] * 100 /nic_speed
-            net_data_pct = pandas.DataFrame(net_data_interval['intel/psutil/net/utilization_percentage'])
-            InfoGraphNode.set_network_utilization(node, net_data_pct)
-        elif 'intel/procfs/iface/bytes_recv' in telemetry_data and 'intel/procfs/iface/bytes_recv' in telemetry_data:
-            source=telemetry._source(node)
-            machine = InfoGraphNode.get_node(internal_graph, source)
-            nic_speed = InfoGraphNode.get_nic_speed_mbps(machine) * 1000000
-            net_data = telemetry_data.filter(['timestamp', 'intel/procfs/iface/bytes_recv','intel/procfs/iface/bytes_sent'], axis=1)
-            net_data.fillna(0)
-            net_data['intel/psutil/net/bytes_total'] = net_data['intel/procfs/iface/bytes_recv']+net_data['intel/procfs/iface/bytes_sent']
-            net_data_interval = net_data.set_index('timestamp').diff()
-            net_data_interval['intel/psutil/net/utilization_percentage'] = net_data_interval['intel/psutil/net/bytes_total'] * 100 /nic_speed
-            net_data_pct = pandas.DataFrame(net_data_interval['intel/psutil/net/utilization_percentage'])
-            InfoGraphNode.set_network_utilization(node, net_data_pct)
-        if 'intel/docker/stats/cgroups/cpu_stats/cpu_usage/total' in telemetry_data:
-            # Container node
-            #cpu util
-            cpu_data = telemetry_data.filter(['timestamp', 'intel/docker/stats/cgroups/cpu_stats/cpu_usage/total'], axis=1)
-            cpu_data_interval = cpu_data.set_index('timestamp').diff()
-            #util data in nanoseconds
-            cpu_data_interval['intel/docker/stats/cgroups/cpu_stats/cpu_usage/percentage'] = cpu_data_interval['intel/docker/stats/cgroups/cpu_stats/cpu_usage/total'] / 10000000
-            cpu_data_pct = pandas.DataFrame(cpu_data_interval['intel/docker/stats/cgroups/cpu_stats/cpu_usage/percentage'])
-            InfoGraphNode.set_compute_utilization(node, cpu_data_pct)
-        if "intel/docker/stats/cgroups/memory_stats/usage/usage" in telemetry_data:
-            #container mem util
-            source=telemetry._source(node)
-            machine = InfoGraphNode.get_node(internal_graph, source)
-            local_mem = int(InfoGraphNode.get_attributes(machine).get("local_memory"))
-            mem_data = telemetry_data.filter(['timestamp', "intel/docker/stats/cgroups/memory_stats/usage/usage"], axis=1)
-            mem_data["intel/docker/stats/cgroups/memory_stats/usage/percentage"] = mem_data["intel/docker/stats/cgroups/memory_stats/usage/usage"]/local_mem * 100
-            mem_data_pct = pandas.DataFrame(mem_data["intel/docker/stats/cgroups/memory_stats/usage/percentage"])
-            InfoGraphNode.set_memory_utilization(node, mem_data_pct)
-        if "intel/docker/stats/network/tx_bytes" in telemetry_data:
-            #container network util
-            source=telemetry._source(node)
-            machine = InfoGraphNode.get_node(internal_graph, source)
-            nic_speed = InfoGraphNode.get_nic_speed_mbps(machine) * 1000000
-            net_data = telemetry_data.filter(['timestamp', "intel/docker/stats/network/tx_bytes","intel/docker/stats/network/rx_bytes"], axis=1)
-            net_data.fillna(0)
-            net_data['intel/docker/stats/network/bytes_total'] = net_data["intel/docker/stats/network/tx_bytes"]+net_data["intel/docker/stats/network/rx_bytes"]
-            net_data_interval = net_data.set_index('timestamp').diff()
-            net_data_interval['intel/docker/stats/network/utilization_percentage'] = net_data_interval['intel/docker/stats/network/bytes_total'] * 100 /nic_speed
-            net_data_pct = pandas.DataFrame(net_data_interval['intel/docker/stats/network/utilization_percentage'])
-            InfoGraphNode.set_network_utilization(node, net_data_pct)
-        if "intel/docker/stats/cgroups/blkio_stats/io_time_recursive/value" in telemetry_data:
-            #container disk util
-            disk_data = telemetry_data.filter(['timestamp', "intel/docker/stats/cgroups/blkio_stats/io_time_recursive/value"], axis=1)
-            disk_data_interval = disk_data.set_index('timestamp').diff()
-            #util data in milliseconds
-            disk_data_interval["intel/docker/stats/cgroups/blkio_stats/io_time_recursive/percentage"] = \
-                disk_data_interval["intel/docker/stats/cgroups/blkio_stats/io_time_recursive/value"] / 1000000
-            disk_data_pct = pandas.DataFrame(disk_data_interval["intel/docker/stats/cgroups/blkio_stats/io_time_recursive/percentage"])
-            InfoGraphNode.set_disk_utilization(node, disk_data_pct)
+    @staticmethod
+    def utilization(internal_graph, node, telemetry, telemetry_data=None,
+                    aggregate=False):
+        """
+        Derives the utilization of the node from its telemetry data.
+        :param telemetry_data: data already fetched for the node. If None
+        it is requested to the telemetry.
+        :param aggregate: True if telemetry data holds window aggregates,
+        where counters already are increments per second.
+        """
+        if telemetry_data is None:
+            telemetry_data = telemetry.get_data(node)
+        SnapUtils.batch_utilization(internal_graph, [(node, telemetry_data)],
+                                    telemetry, aggregate)
 
+    @staticmethod
+    def batch_utilization(internal_graph, nodes, telemetry, aggregate=False):
+        """
+        Derives the utilization of several nodes, evaluating the
+        utilization rules once for all the nodes of the same type.
+        :param nodes: list of (node, telemetry data)
+        :param aggregate: True if telemetry data holds window aggregates.
+        """
+        results = utilization_rules.derive(internal_graph, nodes, telemetry,
+                                           aggregate)
+        for (node, _), utilization in zip(nodes, results):
+            for kind, data in utilization.items():
+                SnapUtils._SET_UTILIZATION[kind](node, data)
 
     @staticmethod
-    def saturation(internal_graph, node, telemetry):
-        telemetry_data = telemetry.get_data(node)
+    def saturation(internal_graph, node, telemetry, telemetry_data=None):
+        if telemetry_data is None:
+            telemetry_data = telemetry.get_data(node)
         if 'intel/use/compute/saturation' in telemetry_data:
             InfoGraphNode.set_compute_saturation(node,
                                                  pandas.DataFrame(telemetry_data['intel/use/compute/saturation']))
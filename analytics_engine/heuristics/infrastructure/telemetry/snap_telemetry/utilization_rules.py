@@ -0,0 +1,254 @@
+# Copyright (c) 2017, Intel Research and Development Ireland Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Rules deriving the utilization of the nodes from their snap telemetry.
+Each rule maps some input metrics, through a formula, to an utilization
+metric. Rules are evaluated at once, as numpy operations, over all the
+nodes of the same type having the same metrics, rather than node by node.
+"""
+
+__author__ = 'Giuliana Carullo'
+__copyright__ = "Copyright (c) 2017, Intel Research and Development Ireland Ltd."
+__license__ = "Apache 2.0"
+__maintainer__ = "Giuliana Carullo"
+__email__ = "giuliana.carullo@intel.com"
+__status__ = "Development"
+
+from collections import namedtuple
+
+import numpy
+import pandas
+
+from analytics_engine.heuristics.beans.infograph import InfoGraphNode
+from analytics_engine.heuristics.beans.infograph import InfoGraphNodeProperty as PROPERTY
+from analytics_engine import common
+
+LOG = common.LOG
+
+TIMESTAMP = 'timestamp'
+
+# kind: utilization of the node set by the rule
+# inputs: metrics needed by the rule
+# output: name of the utilization metric
+# formula: f(inputs, constant) of the stacked inputs, one row per node
+# increments: if True inputs are converted to increments per second,
+#             unless the telemetry holds window aggregates
+# constant: per node constant used by the formula, see CONSTANTS
+# unless: metrics which, if all available, make the rule not apply
+Rule = namedtuple('Rule', 'kind inputs output formula increments constant '
+                          'unless')
+
+
+def _rule(kind, inputs, output=None, formula=None, increments=False,
+          constant=None, unless=None):
+    return Rule(kind, inputs, output or inputs[0],
+                formula or (lambda x, c: x[0]), increments, constant,
+                unless)
+
+
+def _fillna(values):
+    return numpy.where(numpy.isnan(values), 0, values)
+
+
+# Rules are applied in order: for each kind the last matching rule wins.
+RULES = [
+    # /use/ metrics
+    _rule(PROPERTY.UTILIZATION_COMPUTE, ['intel/use/compute/utilization']),
+    _rule(PROPERTY.UTILIZATION_COMPUTE,
+          ['intel/procfs/cpu/utilization_percentage']),
+    _rule(PROPERTY.UTILIZATION_MEMORY, ['intel/use/memory/utilization']),
+    _rule(PROPERTY.UTILIZATION_DISK, ['intel/use/disk/utilization']),
+    _rule(PROPERTY.UTILIZATION_NETWORK, ['intel/use/network/utilization']),
+    # supporting not available /use/ metrics
+    _rule(PROPERTY.UTILIZATION_MEMORY,
+          ['intel/procfs/meminfo/mem_used', 'intel/procfs/meminfo/mem_total'],
+          'intel/procfs/memory/utilization_percentage',
+          lambda x, c: _fillna(x[0]) * 100 / _fillna(x[1])),
+    _rule(PROPERTY.UTILIZATION_DISK, ['intel/procfs/disk/io_time'],
+          'intel/procfs/disk/utilization_percentage',
+          lambda x, c: _fillna(x[0]) * 100 / 1000),
+    _rule(PROPERTY.UTILIZATION_NETWORK,
+          ['intel/psutil/net/bytes_recv', 'intel/psutil/net/bytes_sent'],
+          'intel/psutil/net/utilization_percentage',
+          lambda x, c: (x[0] + x[1]) * 100 / c,
+          increments=True, constant='nic_speed'),
+    _rule(PROPERTY.UTILIZATION_NETWORK,
+          ['intel/procfs/iface/bytes_recv', 'intel/procfs/iface/bytes_sent'],
+          'intel/psutil/net/utilization_percentage',
+          lambda x, c: (x[0] + x[1]) * 100 / c,
+          increments=True, constant='nic_speed',
+          unless=['intel/psutil/net/bytes_recv',
+                  'intel/psutil/net/bytes_sent']),
+    # docker containers
+    # cpu usage in nanoseconds
+    _rule(PROPERTY.UTILIZATION_COMPUTE,
+          ['intel/docker/stats/cgroups/cpu_stats/cpu_usage/total'],
+          'intel/docker/stats/cgroups/cpu_stats/cpu_usage/percentage',
+          lambda x, c: x[0] / 10000000, increments=True),
+    _rule(PROPERTY.UTILIZATION_MEMORY,
+          ['intel/docker/stats/cgroups/memory_stats/usage/usage'],
+          'intel/docker/stats/cgroups/memory_stats/usage/percentage',
+          lambda x, c: x[0] / c * 100, constant='local_memory'),
+    _rule(PROPERTY.UTILIZATION_NETWORK,
+          ['intel/docker/stats/network/tx_bytes',
+           'intel/docker/stats/network/rx_bytes'],
+          'intel/docker/stats/network/utilization_percentage',
+          lambda x, c: (x[0] + x[1]) * 100 / c,
+          increments=True, constant='nic_speed'),
+    # io time in milliseconds
+    _rule(PROPERTY.UTILIZATION_DISK,
+          ['intel/docker/stats/cgroups/blkio_stats/io_time_recursive/value'],
+          'intel/docker/stats/cgroups/blkio_stats/io_time_recursive/'
+          'percentage',
+          lambda x, c: x[0] / 1000000, increments=True),
+]
+
+
+def _machine(graph, node, telemetry):
+    return InfoGraphNode.get_node(graph, telemetry._source(node))
+
+
+def _nic_speed(graph, node, telemetry):
+    """
+    Speed in bits per second of the NICs of the machine hosting the node.
+    """
+    speed = InfoGraphNode.get_nic_speed_mbps(_machine(graph, node, telemetry))
+    return speed * 1000000 if speed else None
+
+
+def _local_memory(graph, node, telemetry):
+    attrs = InfoGraphNode.get_attributes(_machine(graph, node, telemetry))
+    local_memory = attrs.get('local_memory')
+    return int(local_memory) if local_memory else None
+
+
+CONSTANTS = {'nic_speed': _nic_speed,
+             'local_memory': _local_memory}
+
+
+def derive(graph, nodes, telemetry, aggregate=False, rules=None):
+    """
+    Derives the utilization of the nodes from their telemetry data.
+
+    :param graph: (InfoGraph) graph of the nodes
+    :param nodes: list of (node, telemetry data)
+    :param telemetry: telemetry annotation the data come from
+    :param aggregate: True if telemetry data holds window aggregates,
+                      where counters already are increments per second
+    :param rules: rules to be applied, RULES by default
+    :return: list of {kind: DataFrame}, one per node
+    """
+    rules = RULES if rules is None else rules
+    res = [dict() for _ in nodes]
+    # nodes with the same metrics and number of points are stacked
+    groups = dict()
+    for pos, (node, telemetry_data) in enumerate(nodes):
+        if telemetry_data is None or telemetry_data.empty:
+            continue
+        key = (InfoGraphNode.get_type(node), tuple(telemetry_data.columns),
+               len(telemetry_data))
+        groups.setdefault(key, list()).append(pos)
+    for (node_type, columns, length), positions in groups.items():
+        group = [nodes[pos] for pos in positions]
+        try:
+            results = _derive_group(graph, group, set(columns), telemetry,
+                                    aggregate, rules)
+        except Exception as e:
+            LOG.error('Utilization of {} nodes not derived: {}'.format(
+                node_type, e))
+            continue
+        for pos, utilization in zip(positions, results):
+            res[pos] = utilization
+    return res
+
+
+def _derive_group(graph, group, columns, telemetry, aggregate, rules):
+    frames = [telemetry_data for _, telemetry_data in group]
+    res = [dict() for _ in group]
+    stacked = dict()
+    constants = dict()
+    timestamps = None
+    if TIMESTAMP in columns:
+        timestamps = numpy.array([frame[TIMESTAMP].values
+                                  for frame in frames], dtype=numpy.float64)
+
+    def stack(metric, increments):
+        key = (metric, increments)
+        if key not in stacked:
+            if increments:
+                stacked[key] = _increments(stack(metric, False), timestamps)
+            else:
+                stacked[key] = numpy.array([frame[metric].values
+                                            for frame in frames],
+                                           dtype=numpy.float64)
+        return stacked[key]
+
+    for rule in rules:
+        if not columns.issuperset(rule.inputs):
+            continue
+        if rule.unless and columns.issuperset(rule.unless):
+            continue
+        if rule.increments and timestamps is None:
+            continue
+        constant = None
+        valid = numpy.ones(len(group), dtype=bool)
+        if rule.constant:
+            if rule.constant not in constants:
+                constants[rule.constant] = _constants(
+                    CONSTANTS[rule.constant], graph, group, telemetry)
+            constant = constants[rule.constant]
+            valid = ~numpy.isnan(constant[:, 0])
+            if not valid.any():
+                continue
+        increments = rule.increments and not aggregate
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            values = rule.formula([stack(metric, increments)
+                                   for metric in rule.inputs], constant)
+        for row in numpy.flatnonzero(valid):
+            if rule.increments:
+                index = pandas.Index(frames[row][TIMESTAMP].values,
+                                     name=TIMESTAMP)
+            else:
+                index = frames[row].index
+            res[row][rule.kind] = pandas.DataFrame(
+                values[row][:, numpy.newaxis], index=index,
+                columns=[rule.output])
+    return res
+
+
+def _constants(constant, graph, group, telemetry):
+    values = list()
+    for node, _ in group:
+        try:
+            value = constant(graph, node, telemetry)
+        except Exception as e:
+            LOG.debug('No constant for node {}: {}'.format(
+                InfoGraphNode.get_name(node), e))
+            value = None
+        values.append(numpy.nan if value is None else value)
+    return numpy.array(values, dtype=numpy.float64)[:, numpy.newaxis]
+
+
+def _increments(values, timestamps):
+    """
+    Returns the increments per second of counters, whatever the
+    resolution of the data. The first point has no increment.
+    """
+    res = numpy.empty_like(values)
+    res[:, 0] = numpy.nan
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        res[:, 1:] = numpy.diff(values, axis=1) / \
+            numpy.diff(timestamps, axis=1)
+    return res
@@ -1,5 +1,8 @@
 import re
 
+import numpy as np
+import pandas as pd
+
 EXP_INST_PATTERN = r'exported_instance:+?[A-Za-z0-9-]+;'
 LIBVIRT_TAP_PATTERN = r'libvirt:tap+?[A-Za-z0-9-]+;'
 LIBVIRT_TAP_REPL_TXT = 'libvirt:tap_'
@@ -14,3 +17,48 @@ def clean_vm_telemetry_colnames(names):
         names_str = names_str.replace(tap, LIBVIRT_TAP_REPL_TXT+str(i)+';')
     return names_str.split(sep)
 
+
+def align_series(series):
+    """
+    Aligns several time series on the union of their timestamps in a single
+    pass, instead of merging them two at a time.
+    When a series has duplicated timestamps the first value is kept.
+
+    :param series: list of (timestamps, values) tuples, where values is
+                   either a 1-D array or a 2-D array with one column per
+                   metric
+    :return: (index, matrix) tuple: the sorted union of the timestamps and
+             a float matrix with one row per timestamp, NaN where a series
+             has no value
+    """
+    if not series:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0))
+    series = [(np.asarray(ts), np.asarray(vals, dtype=np.float64))
+              for ts, vals in series]
+    index = np.unique(np.concatenate([ts for ts, _ in series]))
+    widths = [1 if vals.ndim == 1 else vals.shape[1] for _, vals in series]
+    matrix = np.empty((len(index), sum(widths)))
+    matrix.fill(np.nan)
+    col = 0
+    for (ts, vals), width in zip(series, widths):
+        # indexes of the first occurrence of each timestamp
+        uniq, first = np.unique(ts, return_index=True)
+        rows = np.searchsorted(index, uniq)
+        matrix[rows, col:col + width] = vals.reshape(len(ts), width)[first]
+        col += width
+    return index, matrix
+
+
+def aligned_dataframe(series, columns):
+    """
+    Returns a data frame having a 'timestamp' column and the aligned
+    series as the other columns.
+
+    :param series: list of (timestamps, values) tuples, see align_series
+    :param columns: names of the value columns, in order
+    :return: pandas.DataFrame
+    """
+    index, matrix = align_series(series)
+    res = pd.DataFrame(matrix, columns=columns)
+    res.insert(0, 'timestamp', index)
+    return res
@@ -21,12 +21,9 @@ __status__ = "Development"
 
 from analytics_engine import common
 from analytics_engine.heuristics.beans.infograph import InfoGraphNode, InfoGraphUtilities
-from analytics_engine.heuristics.filters import telemetry_annotation as ta
 from analytics_engine.heuristics.filters import parallelized_telemetry_annotation as pta
 from analytics_engine.infrastructure_manager import graphs
 from analytics_engine.infrastructure_manager.config_helper import ConfigHelper
-import threading
-import multiprocessing
 
 # ApexLake dependencies
 from analytics_engine.infrastructure_manager import landscape
@@ -40,8 +37,6 @@ TELEMETRY_TYPE_SNAP = "snap"
 MILLISECONDS = 10
 MINUTES_TF = 1
 
-PARALLEL = False
-
 class SubGraphExtraction(object):
 
     def __init__(self, landscape_ip=None, landscape_port=None):
@@ -282,45 +277,17 @@ class SubgraphUtilities(object):
         #     workload_name, int(ts_from), int(ts_to),
         #     name_filtering_support=True)
         res = landscape.get_graph()
-        #PARALLEL = True
-        if PARALLEL:
-            i = 0
-            threads = []
-            cpu_count = multiprocessing.cpu_count()
-            all_node = res.nodes(data=True)
-            no_node_thread = len(res.nodes()) / cpu_count
-            node_pool = []
-
-            for node in all_node:
-                if i < no_node_thread:
-                    node_pool.append(node)
-                    i = i + 1
-                else:
-                    thread1 = ParallelLandscape(i, "Thread-{}".format(InfoGraphNode.get_name(node)), i,
-                                                          node_pool)
-                    # thread1 = ParallelTelemetryAnnotation(i, "Thread-{}".format(InfoGraphNode.get_name(node)), i,
-                    #                                       node_pool, internal_graph, self.telemetry, ts_to, ts_from)
-                    thread1.start()
-                    threads.append(thread1)
-                    i = 0
-                    node_pool = []
-            if len(node_pool) != 0:
-                thread1 = ParallelLandscape(i, "Thread-{}".format(InfoGraphNode.get_name(node)), i,
-                                            node_pool)
-                thread1.start()
-                threads.append(thread1)
-
-            [t.join() for t in threads]
-        else:
-            for node in res.nodes(data=True):
-                attrs = InfoGraphNode.get_attributes(node)
-                attrs = InfoGraphUtilities.str_to_dict(attrs)
-                InfoGraphNode.set_attributes(node, attrs)
+        for node in res.nodes(data=True):
+            attrs = InfoGraphNode.get_attributes(node)
+            attrs = InfoGraphUtilities.str_to_dict(attrs)
+            InfoGraphNode.set_attributes(node, attrs)
         return res
 
 
     @staticmethod
-    def graph_telemetry_annotation(graph, ts_from, ts_to, telemetry_type='snap'):
+    def graph_telemetry_annotation(graph, ts_from, ts_to, telemetry_type='snap',
+                                   aggregate=False, resolution=None,
+                                   latency_budget=None):
         """
         Annotates the provided graph with telemetry information
 
@@ -329,6 +296,12 @@ class SubgraphUtilities(object):
                         time window)
         :param ts_to: (int) epoch end time of the experiment (or of the
                         time window)
+        :param aggregate: (bool) if True nodes are annotated only with the
+                          time window aggregates of their metrics
+        :param resolution: (int) seconds between two telemetry points, if
+                           None it is chosen from the time window
+        :param latency_budget: (int) seconds allowed to retrieve telemetry,
+                               nodes retrieved late are left without data
         :return: TBD
         """
         # TODO - P5: Validate Graph
@@ -344,17 +317,12 @@ class SubgraphUtilities(object):
         if ts_from == 0 and ts_to == 0:
             ts_to = int(time.time())
             ts_from = ts_to - (MILLISECONDS*MINUTES_TF)
-        #PARALLEL = True
-        if PARALLEL and telemetry_type=='snap':
-            annotation = \
-                pta.TelemetryAnnotation(
-                    telemetry_system=telemetry_type)
-        else:
-            annotation = \
-                ta.TelemetryAnnotation(
-                    telemetry_system=telemetry_type)
+        annotation = \
+            pta.TelemetryAnnotation(
+                telemetry_system=telemetry_type, aggregate=aggregate)
         res = annotation.get_annotated_graph(
-            graph, ts_from, ts_to, utilization=True, saturation=True)
+            graph, ts_from, ts_to, utilization=True, saturation=True,
+            resolution=resolution, latency_budget=latency_budget)
         return res
 
 
@@ -374,25 +342,3 @@ class LandscapeUtils(object):
             tf = 0
         res = landscape.get_node_by_properties(properties, from_ts, tf)
         return res
-
-class ParallelLandscape(threading.Thread):
-
-    def __init__(self, threadID, name, counter, node):
-        threading.Thread.__init__(self)
-        self.threadID = threadID
-        self.name = name
-        self.counter = counter
-        self.node_pool = node
-
-    def run(self):
-        for node in self.node_pool:
-            attrs = InfoGraphNode.get_attributes(node)
-            attrs = InfoGraphUtilities.str_to_dict(attrs)
-            InfoGraphNode.set_attributes(node, attrs)
-
-
-
-
-
-
-
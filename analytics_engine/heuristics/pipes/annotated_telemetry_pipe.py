@@ -36,9 +36,11 @@ class AnnotatedTelemetryPipe(Pipe):
     """
     Returns a workload annotated with telemetry information.
     :param workload
+    :param aggregate: if True nodes are annotated only with the time window
+    aggregates of their metrics, for pipes which do not need full series.
     :return: workload decorated with the annotated graph (landscape and telemetry).
     """
-    def run(self, workload):
+    def run(self, workload, aggregate=False):
         telemetry_system = ConfigHelper.get("DEFAULT","telemetry")
         if not telemetry_system:
             telemetry_system = 'snap'
@@ -59,7 +61,7 @@ class AnnotatedTelemetryPipe(Pipe):
             graph_filter = GraphFilter()
             graph_filter.run(workload)
         sub_filter_ann = SubgraphAnnotatedFilter()
-        sub_filter_ann.run(workload, telemetry_system)
+        sub_filter_ann.run(workload, telemetry_system, aggregate)
         # sub_filter_ann_filtered = SubgraphFilteredTelemetryFilter()
         # sub_filter_ann_filtered.run(workload)
         fs = FileSink()
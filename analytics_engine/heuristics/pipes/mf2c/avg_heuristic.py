@@ -39,7 +39,8 @@ class AvgHeuristicPipe(AnnotatedTelemetryPipe):
     def run(self, workload):
         if not workload:
             raise IOError('A workload needs to be specified')
-        super(AvgHeuristicPipe, self).run(workload)
+        # ranking only needs the average utilization of each node
+        super(AvgHeuristicPipe, self).run(workload, aggregate=True)
         avg_filter = AvgHeuristicFilter()
         avg_filter.run(workload)
         influx_sink = InfluxSink()
@@ -39,7 +39,8 @@ class OptimalPipe(AnnotatedTelemetryPipe):
     def run(self, workload, optimal_node_type='machine'):
         if not workload:
             raise IOError('A workload needs to be specified')
-        super(OptimalPipe, self).run(workload)
+        # ranking only needs the average utilization of each node
+        super(OptimalPipe, self).run(workload, aggregate=True)
         if workload.get_latest_graph() is None:
             return workload
         avg_filter = OptimalFilter()
@@ -22,7 +22,7 @@ __status__ = "Development"
 from analytics_engine.heuristics.sinks.base import Sink
 from analytics_engine import common as common
 from analytics_engine.infrastructure_manager.config_helper import ConfigHelper
-from influxdb import InfluxDBClient
+from analytics_engine.infrastructure_manager import clients
 from networkx.readwrite import json_graph
 from analytics_engine.heuristics.beans.workload import Workload
 import analytics_engine.infrastructure_manager.infograph as infograph
@@ -78,13 +78,10 @@ class InfluxSink(Sink):
         Connects with the specified Influx DB
         :return:
         """
-        self.client = InfluxDBClient(self.INFLUX_IP, self.INFLUX_PORT, self.INFLUX_USER, self.INFLUX_PASSWD)
-        dbs = self.client.get_list_database()
-        db_names = [db['name'] for db in dbs]
-        if self.INFLUX_DATABASE not in db_names:
-            LOG.info('creating DB: {}'.format(self.INFLUX_DATABASE))
-            self.client.create_database(self.INFLUX_DATABASE)
-        self.client.switch_database(self.INFLUX_DATABASE)
+        # the client is shared, the database is only checked the first time
+        self.client = clients.get_influxdb(
+            self.INFLUX_IP, self.INFLUX_PORT, self.INFLUX_USER,
+            self.INFLUX_PASSWD, self.INFLUX_DATABASE)
 
     @staticmethod
     def _workload_to_json(workload):
@@ -85,7 +85,10 @@ def get_optimal():
         config['telemetry_filter'] = recipe['telemetry_filter']
     else:
         config['telemetry_filter'] = False
-    workload = Workload(workload_name, workload_config=config)
+    latency_budget = recipe.get('latency_budget')
+    workload = Workload(workload_name, workload_config=config,
+                        latency_budget=float(latency_budget)
+                        if latency_budget else None)
     # storing initial recipe
     # TODO: validate recipe format
     recipe_bean = Recipe()
@@ -135,7 +138,9 @@ def analyse():
         recipe = request.get_json()
         recipe_bean = Recipe()
         recipe_bean.from_json(recipe)
-        workload = Workload(id, int(params['ts_from']), int(params['ts_to']))
+        resolution = params.get('resolution')
+        workload = Workload(id, int(params['ts_from']), int(params['ts_to']),
+                            resolution=int(resolution) if resolution else None)
         workload.add_recipe(
             int("{}{}".format(int(round(time.time())), '000000000')), recipe_bean)
     else:
@@ -21,6 +21,7 @@ __status__ = "Development"
 
 import requests
 from analytics_engine.infrastructure_manager.config_helper import ConfigHelper as config
+from analytics_engine.infrastructure_manager import clients
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
 from analytics_engine import common
 import json
@@ -59,7 +60,8 @@ def update_service(service_id, service_def):
 
 
 def _get(path):
-    req = requests.get(path, headers=HEADERS, verify=SSL_VERIFY)
+    req = clients.get_session('cimi').get(path, headers=HEADERS,
+                                          verify=SSL_VERIFY)
     if req.status_code == 200:
         return req.json()
 
@@ -67,7 +69,8 @@ def _get(path):
 def _put(path, content, params=None):
     if isinstance(content, dict):
         content = json.dumps(content)
-    req = requests.put(path, content, headers=HEADERS,  verify=SSL_VERIFY)
+    req = clients.get_session('cimi').put(path, content, headers=HEADERS,
+                                          verify=SSL_VERIFY)
     if req.status_code == 200:
         return True
     else:
@@ -0,0 +1,133 @@
+# Copyright (c) 2017, Intel Research and Development Ireland Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Process wide registry of the backend clients. HTTP sessions are kept alive
+and their connection pools are sized to the fetch concurrency of the
+backend, so requests do not set up a new connection each time.
+"""
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+import influxdb
+from config_helper import ConfigHelper
+from snap import Snap
+import analytics_engine.common as common
+
+LOG = common.LOG
+
+DEFAULT_CONCURRENCY = 8
+
+# Config sections of the backends
+BACKEND_SECTIONS = {'snap': 'SNAP', 'prometheus': 'PROMETHEUS',
+                    'landscape': 'LANDSCAPE', 'cimi': 'CIMI',
+                    'influxdb': 'INFLUXDB'}
+
+# Every backend is served by a fetch pool and a pool for its subrequests
+POOLS_PER_BACKEND = 2
+
+_SESSIONS = dict()
+_SNAP_CLIENTS = dict()
+_INFLUX_CLIENTS = dict()
+_LOCK = threading.Lock()
+
+
+def get_session(backend):
+    """
+    Returns the keep-alive HTTP session of the backend.
+    :param backend: 'landscape', 'cimi', 'prometheus', ...
+    :return: requests.Session
+    """
+    with _LOCK:
+        if backend not in _SESSIONS:
+            session = requests.Session()
+            mount_pool(session, pool_size(backend))
+            _SESSIONS[backend] = session
+        return _SESSIONS[backend]
+
+
+def get_snap(host, port, username, password, db_name, timeout=None):
+    """
+    Returns the Snap client of the given db, shared by all the annotations.
+    """
+    key = (host, port, username, db_name, timeout)
+    with _LOCK:
+        if key not in _SNAP_CLIENTS:
+            snap = Snap(host, port, username, password, db_name, timeout)
+            mount_pool(snap.influxdbclient._session, pool_size('snap'))
+            _SNAP_CLIENTS[key] = snap
+        return _SNAP_CLIENTS[key]
+
+
+def get_influxdb(host, port, username, password, database):
+    """
+    Returns the InfluxDB client of the given database. The database is
+    created, if missing, only the first time the client is requested.
+    """
+    key = (host, port, username, database)
+    with _LOCK:
+        client = _INFLUX_CLIENTS.get(key)
+    if client is not None:
+        return client
+    # the db is queried outside the lock, not to hold up the other clients
+    client = influxdb.InfluxDBClient(host, port, username, password, database)
+    mount_pool(client._session, pool_size('influxdb'))
+    db_names = [db['name'] for db in client.get_list_database()]
+    if database not in db_names:
+        LOG.info('creating DB: {}'.format(database))
+        client.create_database(database)
+    with _LOCK:
+        shared = _INFLUX_CLIENTS.setdefault(key, client)
+    if shared is not client:
+        # another thread bootstrapped the same database in the meantime
+        client._session.close()
+    return shared
+
+
+def pool_size(backend):
+    """
+    Returns the number of connections kept by the pool of the backend.
+    """
+    try:
+        concurrency = int(ConfigHelper.get(BACKEND_SECTIONS[backend],
+                                           'concurrency'))
+    except Exception:
+        concurrency = DEFAULT_CONCURRENCY
+    return concurrency * POOLS_PER_BACKEND
+
+
+def mount_pool(session, size):
+    """
+    Mounts on the session an adapter keeping up to size connections per
+    host.
+    """
+    adapter = HTTPAdapter(pool_maxsize=size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+
+def reset():
+    """
+    Closes and forgets all the clients, e.g. when the config changes.
+    """
+    with _LOCK:
+        for session in _SESSIONS.values():
+            session.close()
+        for snap in _SNAP_CLIENTS.values():
+            snap.influxdbclient._session.close()
+        for client in _INFLUX_CLIENTS.values():
+            client._session.close()
+        _SESSIONS.clear()
+        _SNAP_CLIENTS.clear()
+        _INFLUX_CLIENTS.clear()
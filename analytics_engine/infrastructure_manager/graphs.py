@@ -22,6 +22,73 @@ import analytics_engine.common as common
 LOG = common.LOG
 
 
+class UndirectedView(object):
+    """
+    Undirected view of a directed graph, which is not copied: the
+    neighbours of a node are its successors and predecessors. Nodes and
+    their attributes are the ones of the graph.
+
+    Neighbours are cached while the version of the graph, if any, does
+    not change.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.node = graph.node
+        self._neighbours = dict()
+        self._version = None
+
+    def __contains__(self, n):
+        return n in self.graph
+
+    def __iter__(self):
+        return iter(self.graph)
+
+    def __len__(self):
+        return len(self.graph)
+
+    def is_directed(self):
+        return False
+
+    def has_node(self, n):
+        return n in self.graph
+
+    def nodes(self, data=False):
+        return self.graph.nodes(data=data)
+
+    def neighbors(self, n):
+        version = getattr(self.graph, 'version', None)
+        if version is None or version != self._version:
+            self._neighbours = dict()
+            self._version = version
+        res = self._neighbours.get(n)
+        if res is None:
+            res = list(self.graph.succ[n])
+            res.extend(pred for pred in self.graph.pred[n]
+                       if pred not in self.graph.succ[n])
+            if version is not None:
+                self._neighbours[n] = res
+        return list(res)
+
+    def neighbors_iter(self, n):
+        return iter(self.neighbors(n))
+
+
+def undirected_view(graph):
+    """
+    Returns an undirected view of the graph, without copying it.
+    InfoGraphs keep their view, so its neighbours stay cached.
+
+    :param graph: networkx graph
+    :return: UndirectedView, or the graph itself if it is undirected
+    """
+    if not graph.is_directed():
+        return graph
+    if hasattr(graph, 'undirected_view'):
+        return graph.undirected_view()
+    return UndirectedView(graph)
+
+
 def _node_match(node_a_attr, node_b_attr):
     """
     Compares attributes of the nodes for equality.
@@ -180,13 +247,16 @@ def get_allocation_graph(graph, lower_type='machine', higher_layer=None,
         lower_layer = ['physical']
 
     tmp1 = nx.DiGraph()
-    for machine in filter_graph(graph, layers=lower_layer).nodes(
-            data=True):
+    undirected = undirected_view(graph)
+    for machine in graph.nodes(data=True):
+        if machine[1]['layer'] not in lower_layer:
+            continue
         if machine[1]['type'] == lower_type:
             filtr = [machine[0]]
-            filtr.extend(graph.to_undirected().neighbors(machine[0]))
-            for node in graph.nodes(data=True):
-                if node[0] in filtr and node[1]['layer'] in higher_layer:
+            filtr.extend(undirected.neighbors(machine[0]))
+            for name in set(filtr):
+                node = (name, graph.node[name])
+                if node[1]['layer'] in higher_layer:
                     tmp1.add_node(machine[0], machine[1])
                     tmp1.add_node(node[0], node[1])
                     tmp1.add_edge(node[0], machine[0])
@@ -318,8 +388,7 @@ def merge_graph(graph_1, graph_2):
     graph = graph_1.copy()
     graph.add_nodes_from(graph_2.nodes(data=True))
     graph.add_edges_from(graph_2.edges(data=True))
-    graph_undirected = graph.to_undirected()
-    if nx.is_connected(graph_undirected):
+    if nx.is_weakly_connected(graph):
         return graph
     else:
         raise ValueError("Trying to merge graphs with no nodes in common!")
@@ -19,6 +19,7 @@ import time
 import json
 import networkx as nx
 from config_helper import ConfigHelper
+import graphs
 import telemetry
 import analytics_engine.common as common
 
@@ -26,6 +27,8 @@ LOG = common.LOG
 
 PROPS = ['name', 'layer', 'category', 'type', 'attributes']
 EOT = 1924905600.0
+# properties the nodes are indexed by
+INDEXED_PROPS = ['type', 'layer', 'allocation']
 
 
 def get_info_graph(info_graph=None, landscape=None):
@@ -47,11 +50,105 @@ def get_info_graph(info_graph=None, landscape=None):
         raise AttributeError(msg)
 
 
+def _attributes(attributes):
+    """
+    Returns the attributes of a node as a dictionary: JSON is parsed only
+    if they are still a string.
+    """
+    if isinstance(attributes, basestring):
+        try:
+            attributes = json.loads(attributes)
+        except ValueError:
+            return None
+    if not isinstance(attributes, dict):
+        return None
+    return attributes
+
+
+def _allocation(attrs):
+    """
+    Returns the host of a node, looking into its nested attributes.
+    """
+    attributes = _attributes(attrs.get('attributes'))
+    while attributes:
+        if 'allocation' in attributes:
+            return attributes['allocation']
+        attributes = _attributes(attributes.get('attributes'))
+    return None
+
+
+class NodeIndex(object):
+    """
+    Nodes of a graph by type, layer and allocation host.
+    """
+
+    def __init__(self, graph):
+        self._nodes = dict((prop, dict()) for prop in INDEXED_PROPS)
+        self._keys = dict()
+        for node, attrs in graph.node.items():
+            self.add(node, attrs)
+
+    def add(self, node, attrs):
+        """
+        Indexes the node, replacing its previous entries.
+        """
+        self.remove(node)
+        keys = (attrs.get('type'), attrs.get('layer'), _allocation(attrs))
+        self._keys[node] = keys
+        for prop, value in zip(INDEXED_PROPS, keys):
+            try:
+                self._nodes[prop].setdefault(value, set()).add(node)
+            except TypeError:
+                # unhashable values are not indexed
+                pass
+
+    def remove(self, node):
+        keys = self._keys.pop(node, None)
+        if keys is None:
+            return
+        for prop, value in zip(INDEXED_PROPS, keys):
+            try:
+                nodes = self._nodes[prop].get(value)
+            except TypeError:
+                continue
+            if nodes is not None:
+                nodes.discard(node)
+                if not nodes:
+                    del self._nodes[prop][value]
+
+    def get(self, prop, value):
+        """
+        Returns the set of the nodes having the value, do not modify it.
+        """
+        try:
+            return self._nodes[prop].get(value, frozenset())
+        except TypeError:
+            return frozenset()
+
+
 class InfoGraph(nx.DiGraph):
     """
     Graph object representing a (sub)graph of the landscape.
+
+    Nodes are indexed by type, layer and allocation. The index is built
+    on the first lookup and kept up to date when nodes are added or
+    removed; nodes whose properties are changed in place need to be added
+    again.
+
+    The version of the graph changes with its nodes and edges: the
+    neighbours of the nodes by type are cached for the current version.
     """
 
+    # graphs pickled without the index build it when needed
+    _node_index = None
+    _version = 0
+    # {node: ({type: predecessors}, {type: successors})}
+    _typed_neighbours = None
+    # {(node, types): neighbour}
+    _typed_paths = None
+    _typed_version = None
+    _undirected_view = None
+
     def __init__(self):
         """
         Initializes the InfoGraph.
@@ -59,6 +156,116 @@ class InfoGraph(nx.DiGraph):
         super(InfoGraph, self).__init__()
         #self.telemetry = telemetry.get_telemetry()
 
+    def _index(self):
+        if self._node_index is None:
+            self._node_index = NodeIndex(self)
+        return self._node_index
+
+    @property
+    def version(self):
+        """
+        Number of changes of the nodes and edges of the graph.
+        """
+        return self._version
+
+    def _changed(self):
+        self._version += 1
+
+    def add_node(self, n, attr_dict=None, **attr):
+        super(InfoGraph, self).add_node(n, attr_dict, **attr)
+        self._changed()
+        if self._node_index is not None:
+            self._node_index.add(n, self.node[n])
+
+    def add_nodes_from(self, nodes, **attr):
+        nodes = list(nodes)
+        super(InfoGraph, self).add_nodes_from(nodes, **attr)
+        self._changed()
+        if self._node_index is not None:
+            for n in nodes:
+                try:
+                    if n not in self.node:
+                        n = n[0]
+                except TypeError:
+                    # (node, attributes) tuple
+                    n = n[0]
+                self._node_index.add(n, self.node[n])
+
+    def remove_node(self, n):
+        super(InfoGraph, self).remove_node(n)
+        self._changed()
+        if self._node_index is not None:
+            self._node_index.remove(n)
+
+    def remove_nodes_from(self, nbunch):
+        nbunch = list(nbunch)
+        super(InfoGraph, self).remove_nodes_from(nbunch)
+        self._changed()
+        if self._node_index is not None:
+            for n in nbunch:
+                self._node_index.remove(n)
+
+    def add_edge(self, u, v, attr_dict=None, **attr):
+        new_nodes = [n for n in (u, v) if n not in self.node]
+        super(InfoGraph, self).add_edge(u, v, attr_dict, **attr)
+        self._changed()
+        self._index_new_nodes(new_nodes)
+
+    def add_edges_from(self, ebunch, attr_dict=None, **attr):
+        ebunch = list(ebunch)
+        new_nodes = set()
+        for e in ebunch:
+            new_nodes.update([n for n in e[:2] if n not in self.node])
+        super(InfoGraph, self).add_edges_from(ebunch, attr_dict, **attr)
+        self._changed()
+        self._index_new_nodes(new_nodes)
+
+    def _index_new_nodes(self, nodes):
+        # endpoints of the edges missing from the graph are added to it
+        if self._node_index is not None:
+            for n in nodes:
+                self._node_index.add(n, self.node[n])
+
+    def remove_edge(self, u, v):
+        super(InfoGraph, self).remove_edge(u, v)
+        self._changed()
+
+    def remove_edges_from(self, ebunch):
+        super(InfoGraph, self).remove_edges_from(ebunch)
+        self._changed()
+
+    def clear(self):
+        super(InfoGraph, self).clear()
+        self._changed()
+        self._node_index = None
+
+    def undirected_view(self):
+        """
+        Returns the undirected view of the graph, see graphs.UndirectedView.
+        """
+        if self._undirected_view is None:
+            self._undirected_view = graphs.UndirectedView(self)
+        return self._undirected_view
+
+    def _neighbours(self, node_id):
+        """
+        Returns the predecessors and the successors of the node by type.
+        """
+        if self._typed_version != self._version:
+            self._typed_neighbours = dict()
+            self._typed_paths = dict()
+            self._typed_version = self._version
+        res = self._typed_neighbours.get(node_id)
+        if res is None:
+            res = (dict(), dict())
+            for relations, by_type in [(self.pred[node_id], res[0]),
+                                       (self.succ[node_id], res[1])]:
+                for relation in relations:
+                    by_type.setdefault(self.node[relation].get('type'),
+                                       list()).append(relation)
+            self._typed_neighbours[node_id] = res
+        return res
+
     def add_landscape(self, graph):
         """
         replace all nodes and edges in the graph.
@@ -76,19 +283,30 @@ class InfoGraph(nx.DiGraph):
         :param qtype: The type you are looking for
         :return: List of nodes
         """
-        res = []
-        for node in self.nodes():
-            if qtype == self.node[node].get('type'):
-                res.append(node)
-        return res
+        return list(self._index().get('type', qtype))
+
+    def get_nodes_by_layer(self, layer):
+        """
+        Get a set of nodes by a give layer.
+
+        :param layer: The layer you are looking for
+        :return: List of nodes
+        """
+        return list(self._index().get('layer', layer))
+
+    def get_nodes_by_allocation(self, host):
+        """
+        Get the nodes allocated on a host.
+
+        :param host: Name of the host
+        :return: List of nodes
+        """
+        return list(self._index().get('allocation', host))
 
     def get_machine_cores(self, machine):
-        cores = []
-        for node in self.nodes(data=True):
-            if node[1]["type"] == "core":
-                if node[1]["attributes"]["allocation"] == machine:
-                    cores.append(node[0])
-        return cores
+        index = self._index()
+        return list(index.get('type', 'core') &
+                    index.get('allocation', machine))
 
     def get_neighbour_by_type(self, node_id, ntype):
         """
@@ -98,9 +316,10 @@ class InfoGraph(nx.DiGraph):
         :param ntype: Type the neighbour node should have
         :return: The neighbour.
         """
-        for relation in nx.all_neighbors(self, node_id):
-            if self.node[relation].get('type') == ntype:
-                return relation
+        predecessors, successors = self._neighbours(node_id)
+        neighbours = predecessors.get(ntype) or successors.get(ntype)
+        if neighbours:
+            return neighbours[0]
 
     def get_neighbours_by_type(self, node_id, ntype):
         """
@@ -110,11 +329,38 @@ class InfoGraph(nx.DiGraph):
         :param ntype: Type the neighbour node should have
         :return: The neighbours.
         """
-        neighbours = []
-        for relation in nx.all_neighbors(self, node_id):
-            if self.node[relation].get('type') == ntype:
-                neighbours.append(relation)
-        return neighbours
+        predecessors, successors = self._neighbours(node_id)
+        return predecessors.get(ntype, []) + successors.get(ntype, [])
+
+    def get_predecessors_by_type(self, node_id, ntype):
+        """
+        Return all predecessors of a certain type.
+
+        :param node_id: Id for a node
+        :param ntype: Type the predecessor node should have
+        :return: The predecessors.
+        """
+        return list(self._neighbours(node_id)[0].get(ntype, []))
+
+    def get_neighbour_by_path(self, node_id, ntypes):
+        """
+        Return the node reached following the first neighbour of each
+        type in turn, e.g. ['vm', 'machine'] from a disk.
+
+        :param node_id: Id for a node
+        :param ntypes: Types of the neighbours along the path
+        :return: The last neighbour, None if the path is broken.
+        """
+        self._neighbours(node_id)
+        key = (node_id, tuple(ntypes))
+        if key not in self._typed_paths:
+            relation = node_id
+            for ntype in ntypes:
+                relation = self.get_neighbour_by_type(relation, ntype)
+                if relation is None:
+                    break
+            self._typed_paths[key] = relation
+        return self._typed_paths[key]
 
     def get_neighbours_by_layer(self, node_id, nlayer):
         """
@@ -163,10 +409,7 @@ class InfoGraph(nx.DiGraph):
         :return: List of nodes
         """
         res = []
-        tmp = self.copy()
-        if not directed:
-            tmp = tmp.to_undirected()
-
+        tmp = self if directed else self.undirected_view()
         for relation in tmp.neighbors(node_id):
             if self.node[relation]['layer'] != self.node[node_id]['layer']:
                 res.append(relation)
@@ -181,10 +424,7 @@ class InfoGraph(nx.DiGraph):
         :return: List of nodes
         """
         res = []
-        tmp = self.copy()
-        if not directed:
-            tmp = tmp.to_undirected()
-
+        tmp = self if directed else self.undirected_view()
         for relation in tmp.neighbors(node_id):
             if self.node[relation]['layer'] == self.node[node_id]['layer']:
                 res.append(relation)
@@ -197,9 +437,45 @@ class InfoGraph(nx.DiGraph):
         connections are maintained.
         """
         if key is not None and val is not None:
-            nodes_to_filter = self.select_nodes(key, val)
-            for node in nodes_to_filter:
-                self._filter_node(node)
+            self.contract_nodes(self.select_nodes(key, val))
+
+    def contract_nodes(self, nodes):
+        """
+        Removes the nodes at once, keeping the connections of the others:
+        an edge is added between two remaining nodes if they were linked
+        through removed nodes only. The result is the one of removing the
+        nodes one by one, but the graph is only traversed once.
+
+        :param nodes: Nodes to be removed
+        """
+        removed = set(node for node in nodes if node in self.succ)
+        if not removed:
+            return
+        # paths through removed nodes, by strongly connected component
+        inner = nx.DiGraph()
+        inner.add_nodes_from(removed)
+        inner.add_edges_from((node, succ) for node in removed
+                             for succ in self.succ[node] if succ in removed)
+        components = nx.condensation(inner)
+        mapping = components.graph['mapping']
+        exits = dict()
+        for component in reversed(nx.topological_sort(components)):
+            res = set()
+            for node in components.node[component]['members']:
+                res.update(succ for succ in self.succ[node]
+                           if succ not in removed)
+            for succ in components.successors(component):
+                res.update(exits[succ])
+            exits[component] = res
+        edges = set()
+        for node in removed:
+            for pred in self.pred[node]:
+                if pred in removed:
+                    continue
+                edges.update((pred, succ) for succ in exits[mapping[node]]
+                             if succ not in self.succ[pred])
+        self.remove_nodes_from(removed)
+        self.add_edges_from(edges)
 
     def select_nodes(self, key, val):
         """
@@ -214,23 +490,41 @@ class InfoGraph(nx.DiGraph):
         :param val: The key value. If selected then the value and key must
         match before the node is added to the returned list.(Optional)
         """
+        if val and key in INDEXED_PROPS:
+            return list(self._index().get(key, val))
+        if val:
+            return self.select_nodes_in(key, [val])
+        return self.select_nodes_where(lambda props: key in props,
+                                       key in PROPS)
+
+    def select_nodes_in(self, key, values):
+        """
+        Return list of nodes whose value of the key is one of the values,
+        searched as in select_nodes.
+
+        :param key: The key to be searched for.
+        :param values: The accepted values.
+        """
+        values = set(values)
+        return self.select_nodes_where(
+            lambda props: key in props and props[key] in values,
+            key in PROPS)
+
+    def select_nodes_where(self, predicate, properties=False):
+        """
+        Return list of nodes satisfying the predicate. Attributes are
+        only parsed if they are still JSON strings.
+
+        :param predicate: function of the attributes of a node
+        :param properties: If True the predicate is applied to the node
+        properties rather than to its attributes.
+        """
         nodes = []
         for node, attr in self.nodes(data=True):
-            if key in PROPS:
-                if val:
-                    if key in attr and attr[key] == val:
-                        nodes.append(node)
-                else:
-                    if key in attr:
-                        nodes.append(node)
-            else:
-                attributes = json.loads(attr['attributes'])
-                if val:
-                    if key in attributes and attributes[key] == val:
-                        nodes.append(node)
-                else:
-                    if key in attributes:
-                        nodes.append(node)
+            if not properties:
+                attr = _attributes(attr.get('attributes')) or {}
+            if predicate(attr):
+                nodes.append(node)
         return nodes
 
     def _filter_node(self, node):
@@ -238,20 +532,7 @@ class InfoGraph(nx.DiGraph):
         Removes a node but maintains the connections between the neighbouring
         nodes.
         """
-        self._connect_neighbours(node)
-        self.remove_node(node)
-
-    def _connect_neighbours(self, node):
-        """
-        Connect all of a node's neighbours together so that the node can be
-        removed without losing the node connections.
-
-        This is done by connecting all incoming connections of a nodeto the
-        outgoing connections of the same node.
-        """
-        for in_edge in self.in_edges([node]):
-            for out_edge in self.out_edges([node]):
-                self.add_edge(in_edge[0], out_edge[1])
+        self.contract_nodes([node])
 
     def get_nominal_capacity(self, node):
         """
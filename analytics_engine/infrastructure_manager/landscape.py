@@ -16,10 +16,10 @@
 Graph Database Base class and factory.
 """
 import time
-import requests
 from networkx.readwrite import json_graph
 from config_helper import ConfigHelper as config
 import infograph
+import clients
 import json
 import os
 import analytics_engine.common as common
@@ -159,7 +159,7 @@ def _get(path, params=None):
             uri += "{}={}&".format(param_name, param)
         uri = uri[:len(uri)]  # Remove ? or & from the  end of query string
         LOG.debug(uri)
-    return requests.get(uri)
+    return clients.get_session('landscape').get(uri)
 
 
 def error_message(response):
@@ -22,18 +22,23 @@ import analytics_engine.common as common
 
 LOG = common.LOG
 
+# Maximum number of statements sent in a single multi-statement query
+MAX_STATEMENTS = 100
+
 
 class Snap(object):
     """
     Snap telemetry retrieval class.
     """
-    def __init__(self, host, port, username, password, db_name):
+    def __init__(self, host, port, username, password, db_name,
+                 timeout=None):
         # TODO: Remove Influxdb client.
         self.influxdbclient = influxdb.InfluxDBClient(host, port, username,
-                                                      password, db_name)
+                                                      password, db_name,
+                                                      timeout=timeout)
 
     def get_metric(self, metric, start=0, end=None, tags=None,
-                   all_tags=False):
+                   all_tags=False, epoch=None, aggregate=None, resolution=1):
         """
         Retrieves a list data points for a metric between the start and end
         time specified.
@@ -44,18 +49,65 @@ class Snap(object):
         data.
         :param all_tags: Flag, if set to true all tags are returned in the
         results, if set to False then just the timestamp & value are returned.
+        :param epoch: Precision of the returned timestamps (e.g. 's' for
+        seconds from epoch). If None timestamps are returned as RFC3339
+        strings.
+        :param aggregate: InfluxQL function (e.g. 'mean') aggregating the
+        whole time range into a single data point. If None data points are
+        returned every resolution seconds.
+        :param resolution: Seconds between two data points; values are
+        averaged over each interval.
         :return: Metric data.
         """
         end = end or time()
-        grouping = {"time(1s)"}
+        grouping = None if aggregate else {"time({}s)".format(resolution)}
         snap = Extract(db_client=self.influxdbclient, measurement_name=metric,
                        start_date=start, end_date=end, tags=tags,
-                       grouping=grouping, output_json=True)
+                       grouping=grouping, output_json=True, epoch=epoch,
+                       aggregate=aggregate or 'mean')
         result = snap.retrieve_date_range()
         if all_tags:
             return list(result)
         return [(m["time"], m["value"]) for m in result]
 
+    def get_metrics(self, queries):
+        """
+        Retrieves the data points of several metrics, sending the queries to
+        the db as multi-statement InfluxQL requests instead of one request
+        per metric.
+        :param queries: List of dictionaries with 'metric', 'tags', 'ts_from'
+        and 'ts_to' keys. An optional 'aggregate' key sets the InfluxQL
+        function aggregating the whole time range into a single data point,
+        an optional 'resolution' key the seconds between two data points.
+        :return: List of lists of (time, value) tuples, in the same order as
+        the queries. Times are seconds from epoch.
+        """
+        res = []
+        for i in range(0, len(queries), MAX_STATEMENTS):
+            extracts = []
+            for query in queries[i:i + MAX_STATEMENTS]:
+                aggregate = query.get('aggregate')
+                extracts.append(Extract(db_client=self.influxdbclient,
+                                        measurement_name=query['metric'],
+                                        start_date=query['ts_from'],
+                                        end_date=query['ts_to'] or time(),
+                                        tags=query['tags'],
+                                        grouping=None if aggregate
+                                        else {"time({}s)".format(
+                                            query.get('resolution') or 1)},
+                                        output_json=True,
+                                        aggregate=aggregate or 'mean'))
+            statements = ";".join([extract.date_range_statement()
+                                   for extract in extracts])
+            results = self.influxdbclient.query(statements, epoch='s')
+            # the client returns a list only for multi-statement queries
+            if not isinstance(results, list):
+                results = [results]
+            for extract, result in zip(extracts, results):
+                res.append([(m["time"], m["value"])
+                            for m in extract.get_values(result)])
+        return res
+
     def get_last_metric(self, metric, tags=None, with_tags=False):
         """
         Retrieves the last metric value.
@@ -52,6 +52,12 @@ class Extract:
 
         Derivative: Set derivative metric as required, set interval as sample time and set
         time unit s, h, d.
+
+        Epoch: Set epoch to a time precision (e.g. 's') to retrieve date range points with
+        epoch timestamps instead of RFC3339 strings.
+
+        Aggregate: Set the InfluxQL function (e.g. 'mean', 'spread') applied to the values,
+        per grouping interval or, with no grouping, over the whole date range.
         :param kwargs:
         """
 
@@ -67,6 +73,8 @@ class Extract:
         self.derivative_time_unit = kwargs.get('derivative_time_unit', None)
         self.mean_metric = kwargs.get('mean_metric', None)
         self.panda_dataframe = kwargs.get('panda_dataframe', False)
+        self.epoch = kwargs.get('epoch', None)
+        self.aggregate = kwargs.get('aggregate', 'mean')
 
         self._setup_client()
 
@@ -101,9 +109,21 @@ class Extract:
         return self._get_values(result)
 
     def retrieve_date_range(self):
-        result = self.db_client.query(self._build_query(self._build_date_range_query()))
+        result = self.db_client.query(self._build_query(self._build_date_range_query()),
+                                      epoch=self.epoch)
         return self._get_values(result)
 
+    def date_range_statement(self):
+        """
+        Returns the date range query as a standalone InfluxQL statement, so
+        that it can be sent to the db together with other statements.
+        :return: InfluxQL statement.
+        """
+        return self._build_query(self._build_date_range_query())
+
+    def get_values(self, query_result):
+        return self._get_values(query_result)
+
     def retrieve_tags(self):
         result = self.db_client.query(self._build_query(self._build_tag_query()))
         return self._get_values(result)
@@ -218,7 +238,8 @@ class Extract:
             else:
                 clauses += self._build_tag_query()
 
-        query = 'SELECT mean(value) as value FROM "{}" WHERE {}'.format(metric, clauses + query_range)
+        query = 'SELECT {}(value) as value FROM "{}" WHERE {}'.format(self.aggregate, metric,
+                                                                    clauses + query_range)
 
         if lwt == "lwt":
             query = 'SELECT * FROM "{}" WHERE {}'.format(metric, clauses + query_range)
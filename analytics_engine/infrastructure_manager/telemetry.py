@@ -27,6 +27,7 @@ import requests
 import pandas as pd
 from config_helper import ConfigHelper
 from snap import Snap
+import clients
 import analytics_engine.common as common
 
 LOG = common.LOG
@@ -51,7 +52,11 @@ def get_telemetry(telemetry=None, host=None, port=None):
         user = ConfigHelper.get('SNAP', 'user')
         password = ConfigHelper.get('SNAP', 'password')
         dbname = ConfigHelper.get('SNAP', 'dbname')
-        return Snap(host, port, user, password, dbname)
+        try:
+            timeout = int(ConfigHelper.get('SNAP', 'request_timeout'))
+        except Exception:
+            timeout = None
+        return clients.get_snap(host, port, user, password, dbname, timeout)
     elif telemetry == "prometheus":
         LOG.debug('prometheus telemetry')
         host = ConfigHelper.get('PROMETHEUS', 'PROMETHEUS_HOST')
@@ -0,0 +1,27 @@
+# Copyright (c) 2017, Intel Research and Development Ireland Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+The engine modules read the configuration when imported: tests use the
+one of the repository.
+"""
+
+import os
+
+from analytics_engine.infrastructure_manager.config_helper import ConfigHelper
+
+ConfigHelper.CONF_FILE_LOCATION = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'analytics_engine.conf')
+ConfigHelper._CONFIG = None
@@ -0,0 +1,92 @@
+# Copyright (c) 2017, Intel Research and Development Ireland Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+import numpy
+
+from analytics_engine.data_analytics.accumulators import Accumulator
+from analytics_engine.data_analytics.accumulators import QuantileSketch
+
+
+class TestAccumulator(unittest.TestCase):
+
+    def setUp(self):
+        self.random = numpy.random.RandomState(7)
+
+    def assertMatches(self, acc, values):
+        values = values[~numpy.isnan(values)]
+        self.assertEqual(acc.count, values.size)
+        self.assertAlmostEqual(acc.sum / values.sum(), 1.0, places=9)
+        self.assertAlmostEqual(acc.mean / numpy.mean(values), 1.0, places=9)
+        self.assertAlmostEqual(acc.var / numpy.var(values, ddof=1), 1.0,
+                               places=6)
+        self.assertEqual(acc.min, values.min())
+        self.assertEqual(acc.max, values.max())
+
+    def test_chunks(self):
+        values = self.random.normal(50, 10, 1000)
+        acc = Accumulator()
+        for chunk in numpy.array_split(values, 7):
+            acc.add(chunk)
+        self.assertMatches(acc, values)
+
+    def test_merge(self):
+        series = [self.random.normal(mean, 5, size)
+                  for mean, size in [(10, 100), (1000, 3), (-20, 500)]]
+        acc = Accumulator()
+        for values in series:
+            acc.merge(Accumulator().add(values))
+        self.assertMatches(acc, numpy.concatenate(series))
+
+    def test_large_counters(self):
+        # counters far from 0 with a small variance
+        values = 1e12 + self.random.normal(0, 1, 1000)
+        acc = Accumulator()
+        acc.merge(Accumulator().add(values[:400]))
+        acc.merge(Accumulator().add(values[400:]))
+        self.assertMatches(acc, values)
+
+    def test_nan_skipped(self):
+        values = self.random.normal(0, 1, 100)
+        values[::3] = numpy.nan
+        self.assertMatches(Accumulator().add(values), values)
+
+    def test_empty(self):
+        acc = Accumulator().add([]).merge(Accumulator())
+        self.assertEqual(acc.count, 0)
+        self.assertTrue(numpy.isnan(acc.mean))
+        self.assertTrue(numpy.isnan(acc.var))
+        self.assertEqual(acc.statistics()['mean'], 0)
+
+
+class TestQuantileSketch(unittest.TestCase):
+
+    def test_relative_accuracy(self):
+        random = numpy.random.RandomState(7)
+        values = numpy.concatenate([random.lognormal(0, 2, 5000),
+                                    -random.lognormal(0, 1, 1000),
+                                    numpy.zeros(100)])
+        sketch = QuantileSketch(0.01)
+        for chunk in numpy.array_split(values, 4):
+            sketch.merge(QuantileSketch(0.01).add(chunk))
+        for q in [0.05, 0.25, 0.5, 0.75, 0.99]:
+            expected = numpy.percentile(values, q * 100,
+                                        interpolation='lower')
+            self.assertLessEqual(abs(sketch.quantile(q) - expected),
+                                 0.01 * abs(expected) + 1e-9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+# Copyright (c) 2017, Intel Research and Development Ireland Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+import unittest
+
+from analytics_engine.heuristics.infrastructure.telemetry.fetcher import \
+    TelemetryFetcher, DEFAULT_CONCURRENCY
+
+
+class Calls(object):
+
+    def __init__(self):
+        self.items = list()
+        self.lock = threading.Lock()
+
+    def add(self, item):
+        with self.lock:
+            self.items.append(item)
+
+
+class TestTelemetryFetcher(unittest.TestCase):
+
+    def _fetcher(self, name):
+        return TelemetryFetcher('snap', name='{}_{}'.format(
+            name, time.time()))
+
+    def test_results_in_order_and_failures_are_none(self):
+        def func(item):
+            if item == 3:
+                raise ValueError('failed')
+            return item * 2
+
+        results = self._fetcher('order').map(func, range(20))
+        self.assertEqual(results[:3], [0, 2, 4])
+        self.assertIsNone(results[3])
+        self.assertEqual(results[4:], [i * 2 for i in range(4, 20)])
+
+    def test_deadline_gives_up_and_skips_queued_requests(self):
+        fetcher = self._fetcher('deadline')
+        calls = Calls()
+
+        def slow(item):
+            calls.add(item)
+            time.sleep(0.3)
+            return item
+
+        start = time.time()
+        results = fetcher.map(slow, range(3 * DEFAULT_CONCURRENCY),
+                              deadline=time.time() + 0.1)
+        self.assertLess(time.time() - start, 0.25)
+        self.assertEqual(results, [None] * 3 * DEFAULT_CONCURRENCY)
+        # only the requests holding a thread ran, the others were dropped
+        results = fetcher.map(lambda item: item, range(3))
+        self.assertEqual(results, [0, 1, 2])
+        self.assertEqual(len(calls.items), DEFAULT_CONCURRENCY)
+
+    def test_request_timeout(self):
+        start = time.time()
+        results = self._fetcher('timeout').map(
+            lambda item: time.sleep(0.5), [1], timeout=0.1)
+        self.assertEqual(results, [None])
+        self.assertLess(time.time() - start, 0.4)
+
+    def test_hedged_request_answers_first(self):
+        calls = Calls()
+
+        def func(item):
+            calls.add(item)
+            if len(calls.items) == 1:
+                time.sleep(0.5)
+                return 'slow'
+            return 'fast'
+
+        start = time.time()
+        results = self._fetcher('hedge').map(func, ['a'], hedge_after=0.05)
+        self.assertEqual(results, ['fast'])
+        self.assertLess(time.time() - start, 0.4)
+        self.assertEqual(calls.items, ['a', 'a'])
+
+    def test_no_hedge_for_fast_requests(self):
+        calls = Calls()
+
+        def func(item):
+            calls.add(item)
+            return item
+
+        results = self._fetcher('no_hedge').map(func, range(5),
+                                                hedge_after=1)
+        self.assertEqual(results, range(5))
+        self.assertEqual(sorted(calls.items), range(5))
+
+
+if __name__ == '__main__':
+    unittest.main()
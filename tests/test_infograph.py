@@ -0,0 +1,217 @@
+# Copyright (c) 2017, Intel Research and Development Ireland Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+import random
+import unittest
+
+import networkx as nx
+
+from analytics_engine.heuristics.beans.infograph import InfoGraphNode
+from analytics_engine.infrastructure_manager import graphs
+from analytics_engine.infrastructure_manager.infograph import InfoGraph
+from analytics_engine.infrastructure_manager.infograph import NodeIndex
+
+
+def landscape():
+    graph = InfoGraph()
+    graph.add_node('machine', type='machine', layer='physical')
+    for i in range(3):
+        graph.add_node('core{}'.format(i), type='core', layer='physical',
+                       attributes='{"allocation": "machine"}')
+        graph.add_edge('core{}'.format(i), 'machine')
+    graph.add_node('vm', type='vm', layer='virtual',
+                   attributes={'attributes': {'allocation': 'machine'}})
+    graph.add_edge('vm', 'machine')
+    return graph
+
+
+class TestNodeIndex(unittest.TestCase):
+
+    def assertIndexed(self, graph):
+        self.assertEqual(graph._index()._nodes, NodeIndex(graph)._nodes)
+
+    def test_lookups(self):
+        graph = landscape()
+        self.assertEqual(sorted(graph.get_nodes_by_type('core')),
+                         ['core0', 'core1', 'core2'])
+        self.assertEqual(graph.get_nodes_by_layer('virtual'), ['vm'])
+        self.assertEqual(sorted(graph.get_nodes_by_allocation('machine')),
+                         ['core0', 'core1', 'core2', 'vm'])
+        self.assertEqual(sorted(graph.get_machine_cores('machine')),
+                         ['core0', 'core1', 'core2'])
+
+    def test_index_follows_node_changes(self):
+        graph = landscape()
+        graph.get_nodes_by_type('core')
+        graph.add_node('core3', type='core', layer='physical')
+        graph.add_nodes_from([('disk', {'type': 'disk'}), 'nic'])
+        graph.remove_node('core0')
+        graph.remove_nodes_from(['vm'])
+        self.assertIndexed(graph)
+        graph.add_node('core1', type='pu')
+        self.assertIndexed(graph)
+        self.assertEqual(sorted(graph.get_nodes_by_type('core')),
+                         ['core2', 'core3'])
+
+    def test_edges_index_the_nodes_they_add(self):
+        graph = landscape()
+        graph.get_nodes_by_type('core')
+        graph.add_edge('vm', 'stack')
+        graph.add_edges_from([('nic', 'machine'), ('nic', 'switch', {})])
+        graph.add_edges_from((e for e in [('port', 'switch')]))
+        self.assertIndexed(graph)
+        self.assertEqual(sorted(graph.get_nodes_by_type(None)),
+                         ['nic', 'port', 'stack', 'switch'])
+        graph.remove_node('switch')
+        self.assertIndexed(graph)
+
+
+def random_graph(seed, nodes=30, edges=70):
+    rand = random.Random(seed)
+    graph = InfoGraph()
+    for n in range(nodes):
+        graph.add_node(n, type=rand.choice(['vm', 'core', 'nic']))
+    for _ in range(edges):
+        graph.add_edge(rand.randrange(nodes), rand.randrange(nodes),
+                       weight=rand.randrange(3))
+    return graph
+
+
+def remove_one_by_one(graph, nodes):
+    # the way nodes were filtered before contract_nodes
+    graph = nx.DiGraph(graph)
+    for node in nodes:
+        for in_edge in graph.in_edges([node]):
+            for out_edge in graph.out_edges([node]):
+                graph.add_edge(in_edge[0], out_edge[1])
+        graph.remove_node(node)
+    return graph
+
+
+class TestContractNodes(unittest.TestCase):
+
+    def test_same_as_removing_nodes_one_by_one(self):
+        for seed in range(20):
+            graph = random_graph(seed)
+            rand = random.Random(seed)
+            nodes = rand.sample(graph.nodes(), rand.randrange(1, 20))
+            expected = remove_one_by_one(graph, nodes)
+            graph.contract_nodes(nodes)
+            self.assertEqual(sorted(graph.nodes()), sorted(expected.nodes()))
+            self.assertEqual(sorted(graph.edges(data=True)),
+                             sorted(expected.edges(data=True)))
+
+    def test_filter_nodes(self):
+        graph = random_graph(1)
+        vms = graph.get_nodes_by_type('vm')
+        expected = remove_one_by_one(graph, vms)
+        graph.filter_nodes('type', 'vm')
+        self.assertEqual(sorted(graph.edges(data=True)),
+                         sorted(expected.edges(data=True)))
+        self.assertEqual(graph.get_nodes_by_type('vm'), [])
+
+    def test_missing_nodes_are_ignored(self):
+        graph = random_graph(2)
+        edges = sorted(graph.edges())
+        graph.contract_nodes(['missing'])
+        self.assertEqual(sorted(graph.edges()), edges)
+
+
+class TestUndirectedView(unittest.TestCase):
+
+    def test_neighbours_match_undirected_copy(self):
+        graph = random_graph(3)
+        view = graphs.undirected_view(graph)
+        undirected = graph.to_undirected()
+        self.assertFalse(view.is_directed())
+        self.assertEqual(len(view), len(undirected))
+        for node in graph:
+            self.assertEqual(sorted(view.neighbors(node)),
+                             sorted(undirected.neighbors(node)))
+
+    def test_neighbours_follow_graph_changes(self):
+        graph = random_graph(4)
+        view = graphs.undirected_view(graph)
+        self.assertIs(view, graphs.undirected_view(graph))
+        view.neighbors(0)
+        graph.add_edge(0, 'new')
+        self.assertIn('new', view.neighbors(0))
+        graph.remove_edge(0, 'new')
+        self.assertNotIn('new', view.neighbors(0))
+
+    def test_nodes_are_the_graph_ones(self):
+        graph = random_graph(5)
+        view = graphs.undirected_view(graph)
+        self.assertIs(view.node, graph.node)
+        self.assertIn(0, view)
+        self.assertNotIn('missing', view)
+        self.assertEqual(sorted(view.nodes()), sorted(graph.nodes()))
+
+    def test_plain_graphs(self):
+        graph = nx.DiGraph([(1, 2), (3, 2)])
+        self.assertEqual(sorted(graphs.undirected_view(graph).neighbors(2)),
+                         [1, 3])
+        undirected = nx.Graph(graph)
+        self.assertIs(graphs.undirected_view(undirected), undirected)
+
+
+class TestNodeAttributes(unittest.TestCase):
+
+    def _node(self, graph, name, **attrs):
+        graph.add_node(name, type='nic', layer='physical', **attrs)
+        return InfoGraphNode.get_node(graph, name)
+
+    def test_nodes_do_not_share_parsed_attributes(self):
+        graph = InfoGraph()
+        attributes = '{"allocation": "machine", "nics": ["eth0"]}'
+        first = self._node(graph, 'first', attributes=attributes)
+        second = self._node(graph, 'second', attributes=attributes)
+        nics = InfoGraphNode.get_attributes(first)['nics']
+        self.assertEqual(nics, ['eth0'])
+        with self.assertRaises(TypeError):
+            nics.append('eth1')
+        self.assertIsNot(InfoGraphNode.get_attributes(second)['nics'], nics)
+        self.assertEqual(copy.deepcopy(nics) + ['eth1'], ['eth0', 'eth1'])
+
+    def test_attributes_are_built_once(self):
+        graph = InfoGraph()
+        node = self._node(graph, 'nic',
+                          attributes='{"allocation": "machine"}')
+        attrs = InfoGraphNode.get_attributes(node)
+        self.assertIs(InfoGraphNode.get_attributes(node), attrs)
+        self.assertEqual(attrs['allocation'], 'machine')
+        self.assertNotIn('layer', attrs)
+        with self.assertRaises(TypeError):
+            attrs['allocation'] = 'other'
+
+    def test_attributes_follow_node_changes(self):
+        graph = InfoGraph()
+        node = self._node(graph, 'nic', attributes={'name': 'eth0'})
+        self.assertEqual(InfoGraphNode.get_attributes(node)['name'], 'eth0')
+        InfoGraphNode.set_attribute(node, 'name', 'eth1')
+        self.assertEqual(InfoGraphNode.get_attributes(node)['name'], 'eth1')
+        graph.add_node('nic', speed=10)
+        self.assertEqual(InfoGraphNode.get_attributes(node)['speed'], 10)
+        node[1]['attributes'] = '{"name": "eth2"}'
+        self.assertEqual(InfoGraphNode.get_attributes(node)['name'], 'eth2')
+        other = graph.copy()
+        attrs = InfoGraphNode.get_attributes(
+            InfoGraphNode.get_node(other, 'nic'))
+        self.assertEqual(attrs['name'], 'eth2')
+        self.assertNotIn('attributes_view', attrs)
+
+
+if __name__ == '__main__':
+    unittest.main()
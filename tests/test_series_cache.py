@@ -0,0 +1,114 @@
+# Copyright (c) 2017, Intel Research and Development Ireland Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+import unittest
+
+from analytics_engine.heuristics.infrastructure.telemetry.series_cache import \
+    SeriesCache
+
+# far enough in the past for every point to be settled
+START = 1500000000
+
+
+class Backend(object):
+    """
+    Averages a raw point per second over buckets of step seconds, as
+    InfluxDB does for a GROUP BY time(step) query between two times.
+    """
+
+    def __init__(self, step, origin=0):
+        self.step = step
+        self.origin = origin
+        self.calls = list()
+
+    def fetch(self, ts_from, ts_to):
+        self.calls.append((ts_from, ts_to))
+        buckets = dict()
+        for ts in range(ts_from, ts_to + 1):
+            bucket = ts - (ts - self.origin) % self.step
+            buckets.setdefault(bucket, list()).append(float(ts % 17))
+        return [(bucket, sum(values) / len(values))
+                for bucket, values in sorted(buckets.items())]
+
+
+class TestSeriesCache(unittest.TestCase):
+
+    def _uncached(self, step, ts_from, ts_to, origin=0):
+        # whole buckets from the one holding ts_from to the one holding ts_to
+        ts_from -= (ts_from - origin) % step
+        ts_to += step - 1 - (ts_to - origin) % step
+        return Backend(step, origin).fetch(ts_from, ts_to)
+
+    def test_overlapping_windows_match_uncached_fetch(self):
+        step = 10
+        backend = Backend(step)
+        cache = SeriesCache()
+        for ts_from, ts_to in [(START + 3, START + 97),
+                               (START + 45, START + 163),
+                               (START - 22, START + 51)]:
+            points = cache.get('key', ts_from, ts_to, backend.fetch,
+                               step=step)
+            timestamps = [ts for ts, _ in points]
+            self.assertEqual(len(timestamps), len(set(timestamps)))
+            self.assertEqual(points, self._uncached(step, ts_from, ts_to))
+
+    def test_fetched_ranges_are_aligned_to_the_grid(self):
+        step = 10
+        backend = Backend(step)
+        cache = SeriesCache()
+        cache.get('key', START + 3, START + 97, backend.fetch, step=step)
+        cache.get('key', START + 45, START + 163, backend.fetch, step=step)
+        cache.get('key', START - 22, START + 51, backend.fetch, step=step)
+        self.assertEqual(backend.calls, [(START, START + 100),
+                                         (START + 100, START + 170),
+                                         (START - 30, START)])
+
+    def test_grid_origin(self):
+        step = 15
+        origin = 7
+        backend = Backend(step, origin)
+        cache = SeriesCache()
+        cache.get('key', START + 7, START + 67, backend.fetch,
+                  step=step, origin=origin)
+        points = cache.get('key', START + 37, START + 100, backend.fetch,
+                           step=step, origin=origin)
+        for lo, hi in backend.calls:
+            self.assertEqual((lo - origin) % step, 0)
+            self.assertEqual((hi - origin) % step, 0)
+        self.assertEqual(points, self._uncached(step, START + 37, START + 100,
+                                                origin))
+        self.assertEqual(points[0][0], START + 37)
+        self.assertEqual(points[-1][0], START + 97)
+
+    def test_disjoint_window_replaces_cached_one(self):
+        backend = Backend(1)
+        cache = SeriesCache()
+        cache.get('key', START, START + 10, backend.fetch)
+        cache.get('key', START + 100, START + 110, backend.fetch)
+        self.assertEqual(cache.missing('key', START, START + 10),
+                         [(START, START + 11)])
+        self.assertEqual(cache.missing('key', START + 100, START + 110), [])
+
+    def test_recent_points_are_not_covered(self):
+        now = int(time.time())
+        backend = Backend(1)
+        cache = SeriesCache(settle_time=3600)
+        cache.get('key', now - 100, now - 10, backend.fetch)
+        self.assertEqual(cache.missing('key', now - 100, now - 10),
+                         [(now - 100, now - 9)])
+
+
+if __name__ == '__main__':
+    unittest.main()
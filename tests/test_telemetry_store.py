@@ -0,0 +1,158 @@
+# Copyright (c) 2017, Intel Research and Development Ireland Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+import unittest
+
+import numpy
+import pandas
+from pandas.util.testing import assert_frame_equal
+
+from analytics_engine.heuristics.beans.infograph import InfoGraphNode
+from analytics_engine.heuristics.beans.infograph import InfoGraphUtilities
+from analytics_engine.heuristics.beans.telemetry_store import TelemetryStore
+from analytics_engine.infrastructure_manager.infograph import InfoGraph
+
+KIND = 'utilization_compute'
+
+
+def frame(columns, rows=6, start=0):
+    index = pandas.Index(range(start, start + rows), name='time')
+    data = dict([(column, numpy.arange(rows, dtype=float) * (i + 1))
+                 for i, column in enumerate(columns)])
+    return pandas.DataFrame(data, index=index, columns=columns)
+
+
+class TestTelemetryStoreColumns(unittest.TestCase):
+
+    def test_set_column_matches_frame_assignment(self):
+        store = TelemetryStore()
+        expected = frame(['machine'])
+        store.set('machine', KIND, expected)
+        for i in range(10):
+            pu = 'pu{}'.format(i)
+            values = pandas.Series(numpy.arange(4, dtype=float) + i,
+                                   index=pandas.Index(range(2, 6)))
+            self.assertTrue(store.set_column('machine', KIND, pu, values,
+                                             fill_value=0))
+            expected[pu] = values
+            expected = expected.fillna(0)
+        assert_frame_equal(store.get('machine', KIND), expected)
+        self.assertEqual(store.columns('machine', KIND),
+                         list(expected.columns))
+
+    def test_view_shares_the_stored_values(self):
+        store = TelemetryStore()
+        expected = frame(['a', 'b'])
+        expected.insert(1, 'timestamp', numpy.arange(6) * 10)
+        store.set('machine', KIND, expected)
+        view = store.view('machine', KIND)
+        assert_frame_equal(view, expected)
+        self.assertTrue(numpy.shares_memory(
+            view['a'].values, store._entries[('machine', KIND)].values))
+        with self.assertRaises(ValueError):
+            view.iloc[0, 0] = -1.0
+        with self.assertRaises(ValueError):
+            view['b'].values[0] = -1.0
+        assert_frame_equal(store.get('machine', KIND), expected)
+        self.assertIsNone(store.view('missing', KIND))
+
+    def test_set_column_replaces_existing_column(self):
+        store = TelemetryStore()
+        store.set('machine', KIND, frame(['a', 'b']))
+        values = pandas.Series(numpy.ones(6), index=range(6))
+        store.set_column('machine', KIND, 'a', values)
+        res = store.get('machine', KIND)
+        self.assertEqual(list(res.columns), ['a', 'b'])
+        self.assertEqual(list(res['a']), [1.0] * 6)
+
+    def test_set_column_without_frame(self):
+        store = TelemetryStore()
+        values = pandas.Series(numpy.ones(6))
+        self.assertFalse(store.set_column('machine', KIND, 'a', values))
+        self.assertNotIn(('machine', KIND), store)
+
+    def test_copies_append_their_own_columns(self):
+        store = TelemetryStore()
+        store.set('machine', KIND, frame(['a']))
+        store.set_column('machine', KIND, 'b', pandas.Series(numpy.ones(6)))
+        other = copy.deepcopy(store)
+        store.set_column('machine', KIND, 'c', pandas.Series(numpy.ones(6)))
+        other.set_column('machine', KIND, 'd',
+                         pandas.Series(numpy.zeros(6)))
+        self.assertEqual(list(store.get('machine', KIND).columns),
+                         ['a', 'b', 'c'])
+        res = other.get('machine', KIND)
+        self.assertEqual(list(res.columns), ['a', 'b', 'd'])
+        self.assertEqual(list(res['d']), [0.0] * 6)
+        self.assertEqual(list(store.get('machine', KIND)['c']), [1.0] * 6)
+
+
+class TestTelemetryStoreCopies(unittest.TestCase):
+
+    def _graph(self):
+        graph = InfoGraph()
+        for name in ['a', 'b']:
+            graph.add_node(name, type='machine', layer='physical')
+            InfoGraphNode.set_telemetry_data(
+                InfoGraphNode.get_node(graph, name), frame(['x', 'y']))
+        InfoGraphUtilities.add_telemetry_store(graph)
+        return graph
+
+    def test_frames_move_to_the_store(self):
+        graph = self._graph()
+        node = InfoGraphNode.get_node(graph, 'a')
+        self.assertNotIn('telemetry_data', node[1])
+        assert_frame_equal(InfoGraphNode.get_telemetry_data(node),
+                           frame(['x', 'y']))
+        self.assertTrue(InfoGraphNode.has_telemetry_data(node))
+
+    def test_copies_share_the_store(self):
+        graph = self._graph()
+        other = graph.copy()
+        stores = set(id(attrs['telemetry_store'])
+                     for _, attrs in other.nodes(data=True))
+        self.assertEqual(len(stores), 1)
+        store = other.node['a']['telemetry_store']
+        self.assertIsNot(store, graph.node['a']['telemetry_store'])
+        self.assertIs(store._entries, graph.node['a']['telemetry_store']._entries)
+
+    def test_writes_to_a_copy_are_isolated(self):
+        graph = self._graph()
+        other = graph.copy()
+        InfoGraphNode.set_telemetry_data(InfoGraphNode.get_node(other, 'a'),
+                                         frame(['z']))
+        other.node['b']['telemetry_store'].remove('b')
+        assert_frame_equal(
+            InfoGraphNode.get_telemetry_data(InfoGraphNode.get_node(graph, 'a')),
+            frame(['x', 'y']))
+        self.assertTrue(InfoGraphNode.has_telemetry_data(
+            InfoGraphNode.get_node(graph, 'b')))
+        self.assertEqual(list(InfoGraphNode.get_telemetry_data(
+            InfoGraphNode.get_node(other, 'a')).columns), ['z'])
+        self.assertFalse(InfoGraphNode.has_telemetry_data(
+            InfoGraphNode.get_node(other, 'b')))
+
+    def test_returned_frames_are_copies(self):
+        graph = self._graph()
+        node = InfoGraphNode.get_node(graph, 'a')
+        data = InfoGraphNode.get_telemetry_data(node)
+        data['x'] = -1.0
+        data.index.name = 'changed'
+        assert_frame_equal(InfoGraphNode.get_telemetry_data(node),
+                           frame(['x', 'y']))
+
+
+if __name__ == '__main__':
+    unittest.main()